@@ -1,12 +1,33 @@
+# Início da execução do script, para o orçamento de tempo (ver registrar_execucao)
+import time
+INICIO_EXECUCAO = time.perf_counter()
+
+# plotly e openpyxl são importados apenas nas páginas que os usam (numpy já vem carregado com o pandas)
 import streamlit as st
+import os
+import sys
 import sqlite3
+import queue
+import logging
+import concurrent.futures
+import functools
+import hmac
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, date
 import numpy as np
 import io
-import openpyxl
+# Esquema, consultas e gravações ficam em avaliamotora_dados, importável sem o Streamlit
+from avaliamotora_dados import (COLUNAS_EXCEL_AVALIACOES, COLUNAS_EXCEL_VEICULOS, CRITERIOS, DIMENSOES_SEGMENTO,
+    ID_FROTA, MODOS_IMPORTACAO, adicionar_avaliacao, atualizar_motorista, buscar_motoristas, buscar_posicoes_ranking,
+    buscar_veiculos, cadastrar_motorista, cadastrar_veiculo, calcular_estatisticas_motorista, chave_importacao,
+    contar_motoristas, estimar_avaliacoes, excluir_motorista, executar_comando, importar_avaliacoes_excel,
+    importar_veiculos_excel, importar_veiculos_excel_streaming, inicializar_banco, ler_cabecalho_excel,
+    listar_avaliacoes_pagina, listar_avaliadores_motorista, listar_motoristas_pagina, listar_veiculos,
+    motor_analitico, obter_checkpoint_importacao, obter_dashboard_motorista, obter_motorista_por_id,
+    obter_cache, obter_fila_avaliacoes, obter_metricas, obter_nomes_motoristas, obter_ranking_pagina,
+    obter_resumo_sistema, obter_segmentos, obter_tendencia)
+
+# Tempos desta execução do script por parte (dados, gráficos, Streamlit), fechados em registrar_execucao
+obter_metricas().iniciar_execucao()
 
 # Configuração da página
 st.set_page_config(
@@ -64,294 +85,175 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Inicialização do banco de dados
-def init_database():
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    cursor = conn.cursor()
+# Bootstrap do banco uma vez por processo: as reexecuções recebem só o relatório (ver a página Métricas)
+inicializar_banco()
 
-    # Tabela de motoristas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS motoristas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            veiculo_id INTEGER,
-            data_cadastro DATE NOT NULL,
-            FOREIGN KEY (veiculo_id) REFERENCES veiculos (id)
-        )
-    ''')
-
-    # Tabela de veículos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS veiculos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            placa TEXT NOT NULL UNIQUE,
-            modelo TEXT NOT NULL,
-            tipo_veiculo TEXT NOT NULL,
-            proprio_alugado TEXT NOT NULL,
-            cidade TEXT NOT NULL,
-            ano INTEGER NOT NULL
-        )
-    ''')
-
-    # Tabela de avaliações
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS avaliacoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            motorista_id INTEGER,
-            custo_manutencao INTEGER NOT NULL,
-            disponibilidade_frota INTEGER NOT NULL,
-            metas_producao INTEGER NOT NULL,
-            seguranca_trabalho INTEGER NOT NULL,
-            realizacao_checklist INTEGER NOT NULL,
-            conhecimento_manutencao INTEGER NOT NULL,
-            comunicacao_assertiva INTEGER NOT NULL,
-            comentario TEXT,
-            avaliador TEXT,
-            data_avaliacao DATETIME NOT NULL,
-            FOREIGN KEY (motorista_id) REFERENCES motoristas (id)
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-
-
-# Funções do banco de dados
-def cadastrar_motorista(nome, veiculo_id):
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO motoristas (nome, veiculo_id, data_cadastro)
-        VALUES (?, ?, ?)
-    ''', (nome, veiculo_id, date.today()))
-    conn.commit()
-    conn.close()
-
-
-def listar_motoristas():
-    conn = sqlite3.connect('motoristas.db')
-    df = pd.read_sql_query('''
-        SELECT m.id, m.nome, v.placa, v.modelo, v.tipo_veiculo, v.cidade, m.data_cadastro
-        FROM motoristas m
-        LEFT JOIN veiculos v ON m.veiculo_id = v.id
-        ORDER BY m.nome
-    ''', conn)
-    conn.close()
-    return df
-
-
-def listar_veiculos():
-    conn = sqlite3.connect('motoristas.db')
-    df = pd.read_sql_query('SELECT * FROM veiculos ORDER BY placa', conn)
-    conn.close()
-    return df
-
-
-def cadastrar_veiculo(placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano):
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO veiculos (placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
-
-
-def importar_veiculos_excel(df_excel):
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    cursor = conn.cursor()
-
-    sucessos = 0
-    erros = []
-
-    for index, row in df_excel.iterrows():
-        try:
-            cursor.execute('''
-                INSERT INTO veiculos (placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                str(row['Placa']).upper().strip(),
-                str(row['Modelo']).strip(),
-                str(row['Tipo de veículo']).strip(),
-                str(row['Próprio ou alugado']).strip(),
-                str(row['Cidade']).strip(),
-                int(row['Ano'])
-            ))
-            sucessos += 1
-        except Exception as e:
-            erros.append(f"Linha {index + 2}: {str(e)}")
-
-    conn.commit()
-    conn.close()
-    return sucessos, erros
-
-
-def obter_motorista_por_id(motorista_id):
-    conn = sqlite3.connect('motoristas.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT m.id, m.nome, m.veiculo_id, v.placa, v.modelo, m.data_cadastro
-        FROM motoristas m
-        LEFT JOIN veiculos v ON m.veiculo_id = v.id
-        WHERE m.id = ?
-    ''', (motorista_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result
-
-
-def atualizar_motorista(motorista_id, nome, veiculo_id):
-    conn = sqlite3.connect('motoristas.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE motoristas 
-        SET nome = ?, veiculo_id = ?
-        WHERE id = ?
-    ''', (nome, veiculo_id, motorista_id))
-    conn.commit()
-    conn.close()
-
-
-def excluir_motorista(motorista_id):
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    cursor = conn.cursor()
-    # Primeiro exclui todas as avaliações do motorista
-    cursor.execute('DELETE FROM avaliacoes WHERE motorista_id = ?', (motorista_id,))
-    # Depois exclui o motorista
-    cursor.execute('DELETE FROM motoristas WHERE id = ?', (motorista_id,))
-    conn.commit()
-    conn.close()
-
-
-def adicionar_avaliacao(motorista_id, custo_manutencao, disponibilidade_frota, metas_producao, seguranca_trabalho,
-                        realizacao_checklist, conhecimento_manutencao, comunicacao_assertiva, comentario, avaliador):
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO avaliacoes (motorista_id, custo_manutencao, disponibilidade_frota, metas_producao, seguranca_trabalho, realizacao_checklist, conhecimento_manutencao, comunicacao_assertiva, comentario, avaliador, data_avaliacao)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-    motorista_id, custo_manutencao, disponibilidade_frota, metas_producao, seguranca_trabalho, realizacao_checklist,
-    conhecimento_manutencao, comunicacao_assertiva, comentario, avaliador, datetime.now()))
-    conn.commit()
-    conn.close()
-
-
-def obter_avaliacoes_motorista(motorista_id):
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    df = pd.read_sql_query('''
-        SELECT * FROM avaliacoes 
-        WHERE motorista_id = ? 
-        ORDER BY data_avaliacao DESC
-    ''', conn, params=[motorista_id])
-    conn.close()
-    return df
-
-
-def calcular_estatisticas_motorista(motorista_id):
-    df = obter_avaliacoes_motorista(motorista_id)
-    if df.empty:
+# Comandos de manutenção fora do servidor Streamlit, ex.: `python avaliamotora.py --explicar`
+if not st.runtime.exists() and executar_comando(sys.argv):
+    sys.exit(0)
+
+LIMITE_BUSCA = 20
+
+
+def seletor_com_busca(rotulo, buscar, chave, placeholder_busca, incluir_id=None, obrigatorio=False):
+    # Busca conforme o usuário digita; só as primeiras correspondências (id, rótulo) vão para o navegador
+    termo = st.text_input(f"🔎 Buscar — {rotulo}", key=f"busca_{chave}", placeholder=placeholder_busca)
+    opcoes = buscar(termo, LIMITE_BUSCA, incluir_id)
+    if not opcoes:
+        st.caption("Nenhum resultado para a busca.")
         return None
+    rotulos = dict(opcoes)
+    ids = list(rotulos)
+    indice = 0 if obrigatorio else None
+    if incluir_id is not None:
+        indice = ids.index(incluir_id)
+    return st.selectbox(rotulo, options=ids, index=indice, format_func=rotulos.get, placeholder="Selecione...",
+                        key=chave)
+
+
+GRANULARIDADES_TELA = {"Mensal": 'mes', "Semanal": 'semana'}
+
+
+def grafico_tendencia(tendencia_df, titulo):
+    # Linhas da média geral e de cada critério por período. Usa graph_objects, bem mais leve de importar que
+    # plotly.express, pois o gráfico aparece na página inicial.
+    import plotly.graph_objects as go
+    nomes = {'media_geral': 'Média Geral',
+             **{f'media_{criterio}': nome for nome, criterio in COLUNAS_EXCEL_AVALIACOES.items()}}
+    fig = go.Figure([go.Scatter(x=tendencia_df['periodo'], y=tendencia_df[coluna], name=nome, mode='lines+markers')
+                     for coluna, nome in nomes.items()])
+    fig.update_layout(title=titulo, xaxis_title='Período', yaxis_title='Nota Média', legend_title_text='Critério',
+                      yaxis_range=[1, 5], height=450)
+    return fig
+
+
+@st.cache_data
+def template_veiculos_excel():
+    # Planilha de exemplo da importação de veículos, gerada uma vez por processo
+    template_df = pd.DataFrame({
+        'Placa': ['ABC-1234', 'DEF-5678'],
+        'Modelo': ['Volkswagen Delivery', 'Mercedes Sprinter'],
+        'Tipo de veículo': ['Caminhão', 'Van'],
+        'Próprio ou alugado': ['Próprio', 'Alugado'],
+        'Cidade': ['São Paulo', 'Rio de Janeiro'],
+        'Ano': [2020, 2019]
+    })
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        template_df.to_excel(writer, index=False, sheet_name='Veiculos')
+    return output.getvalue()
+
+
+# Orçamento de tempo do script (ms): a primeira execução no processo inclui os imports das páginas e o
+# bootstrap do banco; as demais são as reexecuções a cada interação
+ORCAMENTO_PRIMEIRA_EXECUCAO_MS = 2000
+ORCAMENTO_EXECUCAO_MS = 500
+
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource
+def obter_tempos_execucao():
+    return {'primeira_ms': None}
+
+
+def registrar_execucao(pagina, duracao_ms):
+    # As reexecuções ficam nas métricas da página (ver a página Métricas)
+    tempos = obter_tempos_execucao()
+    primeira = tempos['primeira_ms'] is None
+    if primeira:
+        tempos['primeira_ms'] = duracao_ms
+    obter_metricas().concluir_execucao(pagina, duracao_ms)
+    orcamento = ORCAMENTO_PRIMEIRA_EXECUCAO_MS if primeira else ORCAMENTO_EXECUCAO_MS
+    if duracao_ms > orcamento:
+        logger.warning("%s execução de %s: %.0f ms (orçamento %d ms)",
+                       "Primeira" if primeira else "Reexecução", pagina, duracao_ms, orcamento)
+
+
+# Fragmentos: formulários, listas e gráficos de cada página são reexecutados sozinhos quando o usuário interage
+# com eles. A chave identifica o fragmento para reexecutar_fragmentos e nas métricas.
+def fragmento(chave):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            metricas = obter_metricas()
+            if metricas.em_execucao():
+                # Parte da execução completa do script, já medida por registrar_execucao
+                return funcao(*args, **kwargs)
+            inicio = time.perf_counter()
+            metricas.iniciar_execucao()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                registrar_execucao(f"fragmento {chave}", 1000 * (time.perf_counter() - inicio))
+        return st.fragment(key=chave)(executar)
+    return decorador
+
+
+def reexecutar_fragmentos(*chaves):
+    # Callback dos botões que gravam: em vez do script inteiro, reexecuta o fragmento do formulário e os que
+    # exibem os dados alterados, na ordem dada (o formulário primeiro, para a gravação acontecer antes da leitura)
+    st.rerun(list(chaves))
 
-    stats = {
-        'media_geral': df[['custo_manutencao', 'disponibilidade_frota', 'metas_producao', 'seguranca_trabalho',
-                           'realizacao_checklist', 'conhecimento_manutencao', 'comunicacao_assertiva']].mean().mean(),
-        'media_custo_manutencao': df['custo_manutencao'].mean(),
-        'media_disponibilidade_frota': df['disponibilidade_frota'].mean(),
-        'media_metas_producao': df['metas_producao'].mean(),
-        'media_seguranca_trabalho': df['seguranca_trabalho'].mean(),
-        'media_realizacao_checklist': df['realizacao_checklist'].mean(),
-        'media_conhecimento_manutencao': df['conhecimento_manutencao'].mean(),
-        'media_comunicacao_assertiva': df['comunicacao_assertiva'].mean(),
-        'total_avaliacoes': len(df),
-        'ultima_avaliacao': df['data_avaliacao'].iloc[0] if not df.empty else None
-    }
-    return stats
-
-
-def obter_ranking_geral():
-    conn = sqlite3.connect('motoristas.db',check_same_thread=False)
-    df = pd.read_sql_query('''
-        SELECT 
-            m.nome,
-            v.placa,
-            v.modelo,
-            AVG((a.custo_manutencao + a.disponibilidade_frota + a.metas_producao + a.seguranca_trabalho + a.realizacao_checklist + a.conhecimento_manutencao + a.comunicacao_assertiva) / 7.0) as media_geral,
-            COUNT(a.id) as total_avaliacoes
-        FROM motoristas m
-        LEFT JOIN veiculos v ON m.veiculo_id = v.id
-        LEFT JOIN avaliacoes a ON m.id = a.motorista_id
-        GROUP BY m.id, m.nome, v.placa, v.modelo
-        HAVING COUNT(a.id) > 0
-        ORDER BY media_geral DESC
-    ''', conn)
-    conn.close()
-    return df
-
-
-# Inicializar banco
-init_database()
 
 # Interface principal
 st.markdown('<div class="main-header"><h1>🚗 Sistema de Avaliação de Motoristas</h1></div>', unsafe_allow_html=True)
 
+# Página de métricas oculta: entra no menu com ?admin=<token>, em que o token é a variável de ambiente
+# AVALIAMOTORA_ADMIN. Sem a variável a página fica desativada (ela expõe SQL e grava arquivos no servidor)
+TOKEN_ADMIN = os.environ.get('AVALIAMOTORA_ADMIN')
+admin = bool(TOKEN_ADMIN) and hmac.compare_digest(st.query_params.get('admin', '').encode(), TOKEN_ADMIN.encode())
+
 # Menu lateral
 menu = st.sidebar.selectbox(
     "📋 Menu",
     ["🏠 Início", "🚛 Cadastrar Veículos", "➕ Cadastrar Motorista", "✏️ Editar Motorista", "⭐ Avaliar Motorista",
-     "📊 Dashboard", "🏆 Ranking"]
+     "📊 Dashboard", "🏆 Ranking", "🗺️ Segmentos", "🧮 Análises"] + (["🛠️ Métricas"] if admin else [])
 )
 
 # Página Início
 if menu == "🏠 Início":
     st.markdown("### 👋 Bem-vindo ao Sistema de Avaliação!")
 
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
 
-    motoristas_df = listar_motoristas()
-    total_motoristas = len(motoristas_df)
+    resumo = obter_resumo_sistema()
 
     with col1:
         st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-        st.metric("🚗 Motoristas Cadastrados", total_motoristas)
+        st.metric("🚗 Motoristas Cadastrados", resumo['total_motoristas'])
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # Calcular total de avaliações
-    conn = sqlite3.connect('motoristas.db')
-    try:
-        total_avaliacoes = pd.read_sql_query('SELECT COUNT(*) as total FROM avaliacoes', conn)['total'].iloc[0]
-    except:
-        total_avaliacoes = 0
-    conn.close()
-
     with col2:
         st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-        st.metric("⭐ Total de Avaliações", total_avaliacoes)
+        st.metric("🚛 Veículos Cadastrados", resumo['total_veiculos'])
         st.markdown('</div>', unsafe_allow_html=True)
 
     with col3:
-        media_sistema = 0
-        if total_avaliacoes > 0:
-            conn = sqlite3.connect('motoristas.db')
-            try:
-                media_sistema = pd.read_sql_query('''
-                    SELECT AVG((custo_manutencao + disponibilidade_frota + metas_producao + seguranca_trabalho + realizacao_checklist + conhecimento_manutencao + comunicacao_assertiva) / 7.0) as media 
-                    FROM avaliacoes
-                ''', conn)['media'].iloc[0]
-            except:
-                media_sistema = 0
-            conn.close()
+        st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+        st.metric("⭐ Total de Avaliações", resumo['total_avaliacoes'])
+        st.markdown('</div>', unsafe_allow_html=True)
 
+    with col4:
         st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-        st.metric("📈 Média do Sistema", f"{media_sistema:.2f}")
+        st.metric("📈 Média do Sistema", f"{resumo['media_sistema']:.2f}")
         st.markdown('</div>', unsafe_allow_html=True)
 
+    @fragmento("tendencia_frota")
+    def secao_tendencia_frota():
+        tendencia_frota_df = obter_tendencia(ID_FROTA, 'mes')
+        if len(tendencia_frota_df) > 1:
+            st.markdown("---")
+            granularidade_frota = st.radio("📈 Tendência da frota", list(GRANULARIDADES_TELA), horizontal=True,
+                                           key="granularidade_frota")
+            if GRANULARIDADES_TELA[granularidade_frota] != 'mes':
+                tendencia_frota_df = obter_tendencia(ID_FROTA, GRANULARIDADES_TELA[granularidade_frota])
+            with obter_metricas().medir('grafico', 'tendencia_frota'):
+                st.plotly_chart(grafico_tendencia(tendencia_frota_df, "📈 Evolução das notas da frota"),
+                                use_container_width=True)
+
+    secao_tendencia_frota()
+
     st.markdown("---")
     st.markdown("### 🎯 Como usar o sistema:")
     st.markdown("""
@@ -361,6 +263,8 @@ if menu == "🏠 Início":
     4. **Avaliar Motorista**: Dê notas de 1 a 5 em diferentes critérios
     5. **Dashboard**: Veja o desempenho individual dos motoristas
     6. **Ranking**: Compare todos os motoristas do sistema
+    7. **Segmentos**: Compare as médias por cidade, tipo de veículo e próprio/alugado
+    8. **Análises**: Monte rankings com pesos próprios e veja a correlação entre os critérios
     """)
 
 # Página Cadastrar Veículos
@@ -369,7 +273,9 @@ elif menu == "🚛 Cadastrar Veículos":
 
     tab1, tab2, tab3 = st.tabs(["📤 Importar Excel", "➕ Cadastro Individual", "📋 Veículos Cadastrados"])
 
-    with tab1:
+    # A importação e o cadastro individual reexecutam, além do próprio fragmento, só a lista de veículos
+    @fragmento("importar_veiculos")
+    def secao_importar_veiculos():
         st.markdown("#### 📤 Importar Veículos via Excel")
 
         # Template para download
@@ -383,31 +289,20 @@ elif menu == "🚛 Cadastrar Veículos":
             """)
 
         with col2:
-            # Criar template para download
-            template_data = {
-                'Placa': ['ABC-1234', 'DEF-5678'],
-                'Modelo': ['Volkswagen Delivery', 'Mercedes Sprinter'],
-                'Tipo de veículo': ['Caminhão', 'Van'],
-                'Próprio ou alugado': ['Próprio', 'Alugado'],
-                'Cidade': ['São Paulo', 'Rio de Janeiro'],
-                'Ano': [2020, 2019]
-            }
-            template_df = pd.DataFrame(template_data)
-
-            # Converter para Excel
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                template_df.to_excel(writer, index=False, sheet_name='Veiculos')
-
             st.download_button(
                 label="📥 Baixar Template Excel",
-                data=output.getvalue(),
+                data=template_veiculos_excel(),
                 file_name="template_veiculos.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
         st.markdown("---")
 
+        streaming = st.toggle(
+            "⚡ Modo streaming (planilhas grandes)",
+            help="Lê o arquivo em lotes, sem carregá-lo inteiro na memória, e retoma importações interrompidas"
+        )
+
         # Upload do arquivo
         uploaded_file = st.file_uploader(
             "📁 Selecione o arquivo Excel com os veículos:",
@@ -417,39 +312,88 @@ elif menu == "🚛 Cadastrar Veículos":
 
         if uploaded_file is not None:
             try:
-                # Ler o arquivo Excel
-                df_excel = pd.read_excel(uploaded_file)
+                usar_streaming = streaming and uploaded_file.name.lower().endswith('.xlsx')
+                if streaming and not usar_streaming:
+                    st.warning("⚠️ O modo streaming aceita apenas arquivos .xlsx. Usando a leitura padrão.")
+
+                # Ler o arquivo Excel (no modo streaming, apenas cabeçalho e preview)
+                if usar_streaming:
+                    df_excel = None
+                    colunas, preview = ler_cabecalho_excel(uploaded_file)
+                else:
+                    df_excel = pd.read_excel(uploaded_file)
+                    colunas, preview = list(df_excel.columns), df_excel.head(10)
 
                 # Verificar se as colunas obrigatórias estão presentes
-                colunas_obrigatorias = ['Placa', 'Modelo', 'Tipo de veículo', 'Próprio ou alugado', 'Cidade', 'Ano']
-                colunas_faltando = [col for col in colunas_obrigatorias if col not in df_excel.columns]
+                colunas_faltando = [col for col in COLUNAS_EXCEL_VEICULOS if col not in colunas]
 
                 if colunas_faltando:
                     st.error(f"❌ Colunas faltando no arquivo: {', '.join(colunas_faltando)}")
                 else:
                     st.success("✅ Arquivo válido! Preview dos dados:")
-                    st.dataframe(df_excel.head(10))
-
-                    col1, col2, col3 = st.columns([1, 1, 1])
+                    st.dataframe(preview)
 
-                    with col2:
-                        if st.button("📥 Importar Veículos", use_container_width=True, type="primary"):
-                            sucessos, erros = importar_veiculos_excel(df_excel)
+                    modo = st.radio(
+                        "🔁 Placas já cadastradas",
+                        options=list(MODOS_IMPORTACAO.keys()),
+                        format_func=lambda m: MODOS_IMPORTACAO[m]
+                    )
 
-                            if sucessos > 0:
-                                st.success(f"✅ {sucessos} veículos importados com sucesso!")
+                    if usar_streaming:
+                        checkpoint = obter_checkpoint_importacao(chave_importacao(uploaded_file, modo))
+                        if checkpoint:
+                            st.info(f"🔄 Importação interrompida encontrada: {checkpoint['linhas_processadas']} linhas "
+                                    f"já gravadas. Ela será retomada da linha {checkpoint['linhas_processadas'] + 2}.")
 
-                            if erros:
-                                st.error("❌ Erros encontrados:")
-                                for erro in erros:
-                                    st.write(f"• {erro}")
+                    col1, col2, col3 = st.columns([1, 1, 1])
 
-                            st.rerun()
+                    with col2:
+                        importar = st.button("📥 Importar Veículos", use_container_width=True, type="primary",
+                                             on_click=reexecutar_fragmentos,
+                                             args=("importar_veiculos", "lista_veiculos"))
+
+                    if importar:
+                        if usar_streaming:
+                            barra = st.progress(0.0, text="⏳ Importando...")
+                            resultado = importar_veiculos_excel_streaming(
+                                uploaded_file, modo,
+                                progresso=lambda feitas, total: barra.progress(
+                                    min(feitas / total, 1.0), text=f"⏳ {feitas} de ~{total} linhas processadas")
+                            )
+                            total_erros = resultado['total_erros']
+                        else:
+                            resultado = importar_veiculos_excel(df_excel, modo)
+                            total_erros = len(resultado['erros'])
+                        sucessos = resultado['inseridos'] + resultado['atualizados']
+
+                        if sucessos > 0:
+                            st.success(f"✅ {resultado['inseridos']} veículos importados e "
+                                       f"{resultado['atualizados']} atualizados com sucesso!")
+
+                        if resultado['ignorados']:
+                            st.info(f"ℹ️ {resultado['ignorados']} placas já cadastradas foram ignoradas.")
+
+                        erros = resultado['erros']
+                        if total_erros:
+                            st.error(f"❌ {total_erros} linhas com erro:")
+                            for erro in erros[:100]:
+                                st.write(f"• {erro}")
+                            if len(erros) > 100:
+                                st.download_button(
+                                    label="📥 Baixar lista de erros",
+                                    data='\n'.join(erros).encode('utf-8'),
+                                    file_name="erros_importacao.txt",
+                                    mime="text/plain"
+                                )
 
             except Exception as e:
                 st.error(f"❌ Erro ao processar arquivo: {str(e)}")
 
-    with tab2:
+    with tab1:
+        secao_importar_veiculos()
+
+    @fragmento("cadastro_veiculo")
+    def secao_cadastro_veiculo():
         st.markdown("#### ➕ Cadastro Individual de Veículo")
 
         with st.form("cadastro_veiculo"):
@@ -470,17 +414,21 @@ elif menu == "🚛 Cadastrar Veículos":
 
             st.markdown('</div>', unsafe_allow_html=True)
 
-            if st.form_submit_button("✅ Cadastrar Veículo", use_container_width=True):
+            if st.form_submit_button("✅ Cadastrar Veículo", use_container_width=True, on_click=reexecutar_fragmentos,
+                                     args=("cadastro_veiculo", "lista_veiculos")):
                 if placa and modelo and cidade:
                     if cadastrar_veiculo(placa.upper(), modelo, tipo_veiculo, proprio_alugado, cidade, ano):
                         st.success(f"✅ Veículo {placa.upper()} cadastrado com sucesso!")
-                        st.rerun()
                     else:
                         st.error("❌ Erro: Esta placa já está cadastrada!")
                 else:
                     st.error("❌ Por favor, preencha todos os campos obrigatórios!")
 
-    with tab3:
+    with tab2:
+        secao_cadastro_veiculo()
+
+    @fragmento("lista_veiculos")
+    def secao_lista_veiculos():
         st.markdown("#### 📋 Veículos Cadastrados")
 
         veiculos_df = listar_veiculos()
@@ -522,315 +470,402 @@ elif menu == "🚛 Cadastrar Veículos":
         else:
             st.info("📝 Nenhum veículo cadastrado ainda. Use as abas acima para cadastrar!")
 
+    with tab3:
+        secao_lista_veiculos()
+
 # Página Cadastrar Motorista
 elif menu == "➕ Cadastrar Motorista":
     st.markdown("### ➕ Cadastrar Novo Motorista")
 
     # Verificar se há veículos cadastrados
-    veiculos_df = listar_veiculos()
-
-    if veiculos_df.empty:
+    if obter_resumo_sistema()['total_veiculos'] == 0:
         st.warning("⚠️ Nenhum veículo cadastrado! Cadastre veículos primeiro na seção 'Cadastrar Veículos'.")
     else:
-        with st.form("cadastro_motorista"):
-            st.markdown('<div class="evaluation-form">', unsafe_allow_html=True)
-
-            col1, col2 = st.columns([2, 1])
+        # O cadastro reexecuta só o próprio fragmento e a lista de motoristas
+        @fragmento("cadastro_motorista")
+        def secao_cadastro_motorista():
+            # A busca fica fora do formulário para atualizar as opções enquanto se digita
+            veiculo_id = seletor_com_busca("🚛 Selecione o Veículo", buscar_veiculos, "veiculo_cadastro_motorista",
+                                           "Placa, modelo ou cidade")
+
+            with st.form("cadastro_motorista"):
+                st.markdown('<div class="evaluation-form">', unsafe_allow_html=True)
 
-            with col1:
                 nome = st.text_input("👤 Nome Completo", placeholder="Digite o nome do motorista")
 
-            with col2:
-                # Criar opções de veículos
-                veiculo_opcoes = {}
-                for _, veiculo in veiculos_df.iterrows():
-                    label = f"{veiculo['placa']} - {veiculo['modelo']} ({veiculo['cidade']})"
-                    veiculo_opcoes[label] = veiculo['id']
-
-                veiculo_selecionado = st.selectbox(
-                    "🚛 Selecione o Veículo",
-                    options=["Selecione um veículo..."] + list(veiculo_opcoes.keys())
-                )
+                st.markdown('</div>', unsafe_allow_html=True)
 
-            st.markdown('</div>', unsafe_allow_html=True)
+                if st.form_submit_button("✅ Cadastrar Motorista", use_container_width=True,
+                                         on_click=reexecutar_fragmentos,
+                                         args=("cadastro_motorista", "lista_motoristas")):
+                    if nome and veiculo_id is not None:
+                        cadastrar_motorista(nome, veiculo_id)
+                        st.success(f"✅ Motorista {nome} cadastrado com sucesso!")
+                    else:
+                        st.error("❌ Por favor, preencha todos os campos!")
+
+        secao_cadastro_motorista()
+
+    # Listar motoristas cadastrados, uma página por vez; filtros e paginação reexecutam só a lista
+    @fragmento("lista_motoristas")
+    def secao_lista_motoristas():
+        st.markdown("### 📋 Motoristas Cadastrados")
+
+        col_f1, col_f2, col_f3, col_f4 = st.columns([3, 2, 2, 1])
+        with col_f1:
+            filtro_nome = st.text_input("🔎 Nome", key="filtro_motorista_nome")
+        with col_f2:
+            filtro_cidade = st.text_input("🏙️ Cidade", key="filtro_motorista_cidade")
+        with col_f3:
+            filtro_placa = st.text_input("🚛 Placa", key="filtro_motorista_placa")
+        with col_f4:
+            tamanho_pagina = st.selectbox("Por página", [10, 20, 50, 100], index=1, key="tamanho_pagina_motoristas")
+
+        # Pilha com o cursor de início de cada página visitada; filtros novos voltam para a primeira
+        filtros = (filtro_nome, filtro_cidade, filtro_placa, tamanho_pagina)
+        if st.session_state.get('filtros_motoristas') != filtros:
+            st.session_state.filtros_motoristas = filtros
+            st.session_state.cursores_motoristas = [None]
+        cursores = st.session_state.cursores_motoristas
+
+        motoristas_df, proximo_cursor = listar_motoristas_pagina(cursores[-1], tamanho_pagina, filtro_nome,
+                                                                  filtro_cidade, filtro_placa)
+
+        if not motoristas_df.empty:
+            total_encontrados = contar_motoristas(filtro_nome, filtro_cidade, filtro_placa)
+            st.caption(f"{total_encontrados} motorista(s) encontrado(s) • página {len(cursores)}")
+
+            for _, motorista in motoristas_df.iterrows():
+                veiculo_info = f"{motorista['placa']} - {motorista['modelo']}" if motorista[
+                    'placa'] else "Veículo não encontrado"
+
+                st.markdown(f'''
+                <div class="driver-card">
+                    <h4>👤 {motorista['nome']}</h4>
+                    <p><strong>🚛 Veículo:</strong> {veiculo_info}</p>
+                    <p><strong>🏙️ Cidade:</strong> {motorista['cidade'] if motorista['cidade'] else 'N/A'}</p>
+                    <p><strong>📅 Cadastrado em:</strong> {motorista['data_cadastro']}</p>
+                </div>
+                ''', unsafe_allow_html=True)
+
+            # A pilha muda no callback, antes da reexecução do fragmento, que já exibe a nova página
+            col_anterior, _, col_proxima = st.columns([1, 3, 1])
+            with col_anterior:
+                st.button("⬅️ Anterior", disabled=len(cursores) == 1, key="pagina_anterior_motoristas",
+                          on_click=cursores.pop)
+            with col_proxima:
+                st.button("Próxima ➡️", disabled=proximo_cursor is None, key="pagina_proxima_motoristas",
+                          on_click=cursores.append, args=(proximo_cursor,))
+        elif any(f.strip() for f in (filtro_nome, filtro_cidade, filtro_placa)):
+            st.info("🔎 Nenhum motorista encontrado com esses filtros.")
+        elif len(cursores) > 1:
+            # A página atual ficou vazia (ex.: exclusões); volta ao início
+            st.session_state.cursores_motoristas = [None]
+            st.rerun()
+        else:
+            st.info("👆 Nenhum motorista cadastrado ainda. Use o formulário acima!")
 
-            if st.form_submit_button("✅ Cadastrar Motorista", use_container_width=True):
-                if nome and veiculo_selecionado != "Selecione um veículo...":
-                    veiculo_id = veiculo_opcoes[veiculo_selecionado]
-                    cadastrar_motorista(nome, veiculo_id)
-                    st.success(f"✅ Motorista {nome} cadastrado com sucesso!")
-                    st.rerun()
-                else:
-                    st.error("❌ Por favor, preencha todos os campos!")
-
-    # Listar motoristas cadastrados
-    st.markdown("### 📋 Motoristas Cadastrados")
-    motoristas_df = listar_motoristas()
-
-    if not motoristas_df.empty:
-        for _, motorista in motoristas_df.iterrows():
-            veiculo_info = f"{motorista['placa']} - {motorista['modelo']}" if motorista[
-                'placa'] else "Veículo não encontrado"
-
-            st.markdown(f'''
-            <div class="driver-card">
-                <h4>👤 {motorista['nome']}</h4>
-                <p><strong>🚛 Veículo:</strong> {veiculo_info}</p>
-                <p><strong>🏙️ Cidade:</strong> {motorista['cidade'] if motorista['cidade'] else 'N/A'}</p>
-                <p><strong>📅 Cadastrado em:</strong> {motorista['data_cadastro']}</p>
-            </div>
-            ''', unsafe_allow_html=True)
-    else:
-        st.info("👆 Nenhum motorista cadastrado ainda. Use o formulário acima!")
+    secao_lista_motoristas()
 
 # Página Editar Motorista
 elif menu == "✏️ Editar Motorista":
     st.markdown("### ✏️ Editar Motorista")
 
-    motoristas_df = listar_motoristas()
-
-    if motoristas_df.empty:
+    if obter_resumo_sistema()['total_motoristas'] == 0:
         st.warning("⚠️ Nenhum motorista cadastrado. Cadastre um motorista primeiro!")
     else:
-        # Seleção do motorista para editar
-        motorista_opcoes = {f"{row['nome']} - {row['placa']} {row['modelo']}": row['id']
-                            for _, row in motoristas_df.iterrows()}
-
-        motorista_selecionado = st.selectbox(
-            "🚗 Selecione o motorista para editar:",
-            options=["Selecione um motorista..."] + list(motorista_opcoes.keys())
-        )
-
-        if motorista_selecionado != "Selecione um motorista...":
-            motorista_id = motorista_opcoes[motorista_selecionado]
-
-            # Buscar dados atuais do motorista
-            motorista_atual = obter_motorista_por_id(motorista_id)
-            veiculos_df = listar_veiculos()
-
-            if motorista_atual:
-                col1, col2 = st.columns([3, 1])
-
-                with col1:
-                    st.markdown("#### 📝 Editar Informações")
-
-                    with st.form("editar_motorista"):
-                        st.markdown('<div class="evaluation-form">', unsafe_allow_html=True)
-
-                        nome_novo = st.text_input(
-                            "👤 Nome Completo",
-                            value=motorista_atual[1],
-                            placeholder="Digite o nome do motorista"
-                        )
-
-                        # Seleção de veículo
-                        veiculo_opcoes = {}
-                        veiculo_atual_label = None
-
-                        for _, veiculo in veiculos_df.iterrows():
-                            label = f"{veiculo['placa']} - {veiculo['modelo']} ({veiculo['cidade']})"
-                            veiculo_opcoes[label] = veiculo['id']
-                            if veiculo['id'] == motorista_atual[2]:  # veiculo_id atual
-                                veiculo_atual_label = label
+        # Seleção, formulário, informações atuais e confirmação de exclusão são reexecutados juntos
+        @fragmento("editar_motorista")
+        def secao_editar_motorista():
+            # Mensagem da gravação anterior: guardada na sessão porque o st.rerun logo após a gravação apagaria
+            # um st.success escrito antes dele
+            mensagem = st.session_state.pop('mensagem_edicao_motorista', None)
+            if mensagem:
+                st.success(mensagem)
+
+            # Seleção do motorista para editar
+            motorista_id = seletor_com_busca("🚗 Selecione o motorista para editar:", buscar_motoristas,
+                                             "motorista_edicao", "Nome, placa ou modelo")
+
+            if motorista_id is not None:
+                # Buscar dados atuais do motorista
+                motorista_atual = obter_motorista_por_id(motorista_id)
+
+                if motorista_atual:
+                    col1, col2 = st.columns([3, 1])
+
+                    with col1:
+                        st.markdown("#### 📝 Editar Informações")
+
+                        # Veículo atual sempre entre as opções
+                        veiculo_id_novo = seletor_com_busca("🚛 Veículo", buscar_veiculos,
+                                                            f"veiculo_edicao_{motorista_id}", "Placa, modelo ou cidade",
+                                                            incluir_id=motorista_atual[2])
+
+                        with st.form("editar_motorista"):
+                            st.markdown('<div class="evaluation-form">', unsafe_allow_html=True)
+
+                            nome_novo = st.text_input(
+                                "👤 Nome Completo",
+                                value=motorista_atual[1],
+                                placeholder="Digite o nome do motorista"
+                            )
+
+                            st.markdown('</div>', unsafe_allow_html=True)
+
+                            col_btn1, col_btn2 = st.columns(2)
+
+                            with col_btn1:
+                                if st.form_submit_button("✅ Salvar Alterações", use_container_width=True):
+                                    if nome_novo and veiculo_id_novo is not None:
+                                        atualizar_motorista(motorista_id, nome_novo, veiculo_id_novo)
+                                        st.session_state.mensagem_edicao_motorista = (
+                                            f"✅ Motorista {nome_novo} atualizado com sucesso!")
+                                        st.rerun(scope="fragment")
+                                    else:
+                                        st.error("❌ Por favor, preencha todos os campos!")
+
+                            with col_btn2:
+                                if st.form_submit_button("🗑️ Excluir Motorista", use_container_width=True,
+                                                         type="secondary"):
+                                    st.session_state.confirmar_exclusao = True
 
-                        # Index do veículo atual
-                        opcoes_lista = list(veiculo_opcoes.keys())
-                        index_atual = opcoes_lista.index(veiculo_atual_label) if veiculo_atual_label else 0
-
-                        veiculo_novo = st.selectbox(
-                            "🚛 Veículo",
-                            options=opcoes_lista,
-                            index=index_atual
-                        )
-
-                        st.markdown('</div>', unsafe_allow_html=True)
-
-                        col_btn1, col_btn2 = st.columns(2)
-
-                        with col_btn1:
-                            if st.form_submit_button("✅ Salvar Alterações", use_container_width=True):
-                                if nome_novo and veiculo_novo:
-                                    veiculo_id_novo = veiculo_opcoes[veiculo_novo]
-                                    atualizar_motorista(motorista_id, nome_novo, veiculo_id_novo)
-                                    st.success(f"✅ Motorista {nome_novo} atualizado com sucesso!")
-                                    st.rerun()
-                                else:
-                                    st.error("❌ Por favor, preencha todos os campos!")
-
-                        with col_btn2:
-                            if st.form_submit_button("🗑️ Excluir Motorista", use_container_width=True,
-                                                     type="secondary"):
-                                st.session_state.confirmar_exclusao = True
-
-                with col2:
-                    st.markdown("#### ℹ️ Informações Atuais")
-                    veiculo_info = f"{motorista_atual[3]} - {motorista_atual[4]}" if motorista_atual[
-                        3] else "Sem veículo"
-
-                    st.markdown(f'''
-                    <div class="driver-card">
-                        <p><strong>👤 Nome:</strong><br>{motorista_atual[1]}</p>
-                        <p><strong>🚛 Veículo:</strong><br>{veiculo_info}</p>
-                        <p><strong>📅 Cadastrado:</strong><br>{motorista_atual[5]}</p>
-                    </div>
-                    ''', unsafe_allow_html=True)
-
-                    # Mostrar estatísticas do motorista
-                    stats = calcular_estatisticas_motorista(motorista_id)
-                    if stats:
-                        st.markdown("#### 📊 Estatísticas")
-                        st.metric("⭐ Nota Média", f"{stats['media_geral']:.2f}")
-                        st.metric("📊 Avaliações", stats['total_avaliacoes'])
-
-                # Confirmação de exclusão
-                if st.session_state.get('confirmar_exclusao', False):
-                    st.markdown("---")
-                    st.error("⚠️ **ATENÇÃO:** Esta ação não pode ser desfeita!")
-                    st.warning(
-                        f"Tem certeza que deseja excluir o motorista **{motorista_atual[1]}** e todas as suas avaliações?")
-
-                    col_conf1, col_conf2, col_conf3 = st.columns([1, 1, 1])
-
-                    with col_conf1:
-                        if st.button("✅ SIM, Excluir", use_container_width=True, type="primary"):
-                            excluir_motorista(motorista_id)
-                            st.success(f"✅ Motorista {motorista_atual[1]} excluído com sucesso!")
-                            st.session_state.confirmar_exclusao = False
-                            st.rerun()
-
-                    with col_conf3:
-                        if st.button("❌ Cancelar", use_container_width=True):
-                            st.session_state.confirmar_exclusao = False
-                            st.rerun()
+                    with col2:
+                        st.markdown("#### ℹ️ Informações Atuais")
+                        veiculo_info = f"{motorista_atual[3]} - {motorista_atual[4]}" if motorista_atual[
+                            3] else "Sem veículo"
+
+                        st.markdown(f'''
+                        <div class="driver-card">
+                            <p><strong>👤 Nome:</strong><br>{motorista_atual[1]}</p>
+                            <p><strong>🚛 Veículo:</strong><br>{veiculo_info}</p>
+                            <p><strong>📅 Cadastrado:</strong><br>{motorista_atual[5]}</p>
+                        </div>
+                        ''', unsafe_allow_html=True)
+
+                        # Mostrar estatísticas do motorista
+                        stats = calcular_estatisticas_motorista(motorista_id)
+                        if stats:
+                            st.markdown("#### 📊 Estatísticas")
+                            st.metric("⭐ Nota Média", f"{stats['media_geral']:.2f}")
+                            st.metric("📊 Avaliações", stats['total_avaliacoes'])
+
+                    # Confirmação de exclusão
+                    if st.session_state.get('confirmar_exclusao', False):
+                        st.markdown("---")
+                        st.error("⚠️ **ATENÇÃO:** Esta ação não pode ser desfeita!")
+                        st.warning(
+                            f"Tem certeza que deseja excluir o motorista **{motorista_atual[1]}** e todas as suas avaliações?")
+
+                        col_conf1, col_conf2, col_conf3 = st.columns([1, 1, 1])
+
+                        with col_conf1:
+                            if st.button("✅ SIM, Excluir", use_container_width=True, type="primary"):
+                                excluir_motorista(motorista_id)
+                                st.session_state.mensagem_edicao_motorista = (
+                                    f"✅ Motorista {motorista_atual[1]} excluído com sucesso!")
+                                st.session_state.confirmar_exclusao = False
+                                st.rerun(scope="fragment")
+
+                        with col_conf3:
+                            if st.button("❌ Cancelar", use_container_width=True):
+                                st.session_state.confirmar_exclusao = False
+                                st.rerun(scope="fragment")
+
+        secao_editar_motorista()
 
 # Página Avaliar Motorista
 elif menu == "⭐ Avaliar Motorista":
     st.markdown("### ⭐ Avaliar Motorista")
 
-    motoristas_df = listar_motoristas()
-
-    if motoristas_df.empty:
+    if obter_resumo_sistema()['total_motoristas'] == 0:
         st.warning("⚠️ Nenhum motorista cadastrado. Cadastre um motorista primeiro!")
     else:
-        # Seleção do motorista
-        motorista_opcoes = {f"{row['nome']} - {row['placa']} {row['modelo']}": row['id']
-                            for _, row in motoristas_df.iterrows()}
-
-        motorista_selecionado = st.selectbox(
-            "🚗 Selecione o motorista:",
-            options=list(motorista_opcoes.keys())
-        )
-
-        if motorista_selecionado:
-            motorista_id = motorista_opcoes[motorista_selecionado]
-
-            with st.form("avaliacao_form"):
-                st.markdown('<div class="evaluation-form">', unsafe_allow_html=True)
-
-                st.markdown("#### 📊 Avalie os critérios de 1 a 5:")
+        # O envio reexecuta só a seleção e o formulário: nada mais na página depende das avaliações
+        @fragmento("avaliacao")
+        def secao_avaliacao():
+            # Seleção do motorista
+            motorista_id = seletor_com_busca("🚗 Selecione o motorista:", buscar_motoristas, "motorista_avaliacao",
+                                             "Nome, placa ou modelo", obrigatorio=True)
+
+            if motorista_id is not None:
+                with st.form("avaliacao_form"):
+                    st.markdown('<div class="evaluation-form">', unsafe_allow_html=True)
+
+                    st.markdown("#### 📊 Avalie os critérios de 1 a 5:")
+
+                    col1, col2 = st.columns(2)
+
+                    with col1:
+                        custo_manutencao = st.select_slider(
+                            "💰 Custo de Manutenção",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                col1, col2 = st.columns(2)
+                        disponibilidade_frota = st.select_slider(
+                            "🚛 Disponibilidade de Frota",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                with col1:
-                    custo_manutencao = st.select_slider(
-                        "💰 Custo de Manutenção",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
-                    )
+                        metas_producao = st.select_slider(
+                            "🎯 Metas de Produção",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                    disponibilidade_frota = st.select_slider(
-                        "🚛 Disponibilidade de Frota",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
-                    )
+                        seguranca_trabalho = st.select_slider(
+                            "🛡️ Segurança do Trabalho",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                    metas_producao = st.select_slider(
-                        "🎯 Metas de Produção",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
-                    )
+                    with col2:
+                        realizacao_checklist = st.select_slider(
+                            "📋 Realização de Checklist",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                    seguranca_trabalho = st.select_slider(
-                        "🛡️ Segurança do Trabalho",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
-                    )
+                        conhecimento_manutencao = st.select_slider(
+                            "🔧 Conhecimento Básico de Manutenção",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                with col2:
-                    realizacao_checklist = st.select_slider(
-                        "📋 Realização de Checklist",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
-                    )
+                        comunicacao_assertiva = st.select_slider(
+                            "💬 Comunicação Assertiva",
+                            options=[1, 2, 3, 4, 5],
+                            value=5,
+                            format_func=lambda x: "⭐" * x
+                        )
 
-                    conhecimento_manutencao = st.select_slider(
-                        "🔧 Conhecimento Básico de Manutenção",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
+                    comentario = st.text_area(
+                        "💬 Comentários (opcional)",
+                        placeholder="Deixe um comentário sobre a experiência...",
+                        height=100
                     )
 
-                    comunicacao_assertiva = st.select_slider(
-                        "💬 Comunicação Assertiva",
-                        options=[1, 2, 3, 4, 5],
-                        value=5,
-                        format_func=lambda x: "⭐" * x
+                    avaliador = st.text_input(
+                        "👤 Seu nome (opcional)",
+                        placeholder="Digite seu nome"
                     )
 
-                comentario = st.text_area(
-                    "💬 Comentários (opcional)",
-                    placeholder="Deixe um comentário sobre a experiência...",
-                    height=100
-                )
-
-                avaliador = st.text_input(
-                    "👤 Seu nome (opcional)",
-                    placeholder="Digite seu nome"
+                    st.markdown('</div>', unsafe_allow_html=True)
+
+                    # Preview da nota
+                    media_preview = (
+                                                custo_manutencao + disponibilidade_frota + metas_producao + seguranca_trabalho + realizacao_checklist + conhecimento_manutencao + comunicacao_assertiva) / 7
+                    st.markdown(f"**📊 Nota Geral: {media_preview:.1f}/5.0** {'⭐' * int(media_preview)}")
+
+                    if st.form_submit_button("✅ Enviar Avaliação", use_container_width=True):
+                        try:
+                            adicionar_avaliacao(
+                                motorista_id, custo_manutencao, disponibilidade_frota, metas_producao,
+                                seguranca_trabalho, realizacao_checklist, conhecimento_manutencao,
+                                comunicacao_assertiva, comentario, avaliador or "Anônimo"
+                            )
+                        except (queue.Full, concurrent.futures.TimeoutError):
+                            st.error("❌ Sistema sobrecarregado: a avaliação não foi gravada. Tente novamente.")
+                        except sqlite3.IntegrityError:
+                            # O escritor repassa pelo futuro o erro da gravação, ex.: motorista excluído enquanto isso
+                            st.error("❌ Motorista não encontrado (pode ter sido excluído): a avaliação não foi gravada.")
+                        except sqlite3.Error as e:
+                            st.error(f"❌ Erro ao gravar a avaliação: {str(e)}")
+                        else:
+                            st.success("✅ Avaliação enviada com sucesso!")
+                            st.balloons()
+
+        secao_avaliacao()
+
+        # Importação do histórico de avaliações
+        @fragmento("importar_avaliacoes")
+        def secao_importar_avaliacoes():
+            st.markdown("---")
+            with st.expander("📤 Importar histórico de avaliações (Excel/CSV)"):
+                st.markdown(f"""
+                **📋 Formato do arquivo:**
+                - **Motorista** (nome) e/ou **Placa** do veículo do motorista
+                - Notas de 1 a 5: {', '.join(f'**{c}**' for c in COLUNAS_EXCEL_AVALIACOES)}
+                - **Data** da avaliação original (ex.: 31/12/2023 14:30)
+                - Opcionais: **Comentário**, **Avaliador**
+                """)
+
+                arquivo_historico = st.file_uploader(
+                    "📁 Selecione o arquivo com as avaliações:",
+                    type=['xlsx', 'xls', 'csv'],
+                    key="upload_historico"
                 )
 
-                st.markdown('</div>', unsafe_allow_html=True)
-
-                # Preview da nota
-                media_preview = (
-                                            custo_manutencao + disponibilidade_frota + metas_producao + seguranca_trabalho + realizacao_checklist + conhecimento_manutencao + comunicacao_assertiva) / 7
-                st.markdown(f"**📊 Nota Geral: {media_preview:.1f}/5.0** {'⭐' * int(media_preview)}")
-
-                if st.form_submit_button("✅ Enviar Avaliação", use_container_width=True):
-                    adicionar_avaliacao(
-                        motorista_id, custo_manutencao, disponibilidade_frota, metas_producao,
-                        seguranca_trabalho, realizacao_checklist, conhecimento_manutencao, comunicacao_assertiva,
-                        comentario, avaliador or "Anônimo"
-                    )
-                    st.success("✅ Avaliação enviada com sucesso!")
-                    st.balloons()
-                    st.rerun()
+                if arquivo_historico is not None:
+                    try:
+                        if arquivo_historico.name.lower().endswith('.csv'):
+                            df_historico = pd.read_csv(arquivo_historico, sep=None, engine='python')
+                        else:
+                            df_historico = pd.read_excel(arquivo_historico)
+
+                        colunas_faltando = [col for col in [*COLUNAS_EXCEL_AVALIACOES, 'Data']
+                                            if col not in df_historico.columns]
+                        if 'Motorista' not in df_historico.columns and 'Placa' not in df_historico.columns:
+                            colunas_faltando.insert(0, 'Motorista ou Placa')
+
+                        if colunas_faltando:
+                            st.error(f"❌ Colunas faltando no arquivo: {', '.join(colunas_faltando)}")
+                        else:
+                            st.success(f"✅ Arquivo válido com {len(df_historico)} avaliações! Preview dos dados:")
+                            st.dataframe(df_historico.head(10))
+
+                            if st.button("📥 Importar Avaliações", type="primary"):
+                                barra = st.progress(0.0, text="⏳ Importando...")
+                                resultado = importar_avaliacoes_excel(
+                                    df_historico,
+                                    progresso=lambda feitas, total: barra.progress(
+                                        feitas / total, text=f"⏳ {feitas} de {total} avaliações gravadas")
+                                )
+
+                                if resultado['inseridos'] > 0:
+                                    st.success(f"✅ {resultado['inseridos']} avaliações importadas com sucesso!")
+
+                                erros = resultado['erros']
+                                if erros:
+                                    st.error(f"❌ {len(erros)} linhas com erro:")
+                                    for erro in erros[:100]:
+                                        st.write(f"• {erro}")
+                                    if len(erros) > 100:
+                                        st.download_button(
+                                            label="📥 Baixar lista de erros",
+                                            data='\n'.join(erros).encode('utf-8'),
+                                            file_name="erros_importacao_avaliacoes.txt",
+                                            mime="text/plain"
+                                        )
+
+                    except Exception as e:
+                        st.error(f"❌ Erro ao processar arquivo: {str(e)}")
+
+        secao_importar_avaliacoes()
 
 # Página Dashboard
 elif menu == "📊 Dashboard":
-    st.markdown("### 📊 Dashboard do Motorista")
+    import plotly.graph_objects as go
 
-    motoristas_df = listar_motoristas()
+    st.markdown("### 📊 Dashboard do Motorista")
 
-    if motoristas_df.empty:
+    if obter_resumo_sistema()['total_motoristas'] == 0:
         st.warning("⚠️ Nenhum motorista cadastrado.")
     else:
         # Seleção do motorista
-        motorista_opcoes = {f"{row['nome']} - {row['placa']} {row['modelo']}": row['id']
-                            for _, row in motoristas_df.iterrows()}
+        motorista_id = seletor_com_busca("🚗 Selecione o motorista:", buscar_motoristas, "motorista_dashboard",
+                                         "Nome, placa ou modelo", obrigatorio=True)
 
-        motorista_selecionado = st.selectbox(
-            "🚗 Selecione o motorista:",
-            options=list(motorista_opcoes.keys())
-        )
-
-        if motorista_selecionado:
-            motorista_id = motorista_opcoes[motorista_selecionado]
-            stats = calcular_estatisticas_motorista(motorista_id)
+        if motorista_id is not None:
+            stats, avaliacoes_df = obter_dashboard_motorista(motorista_id)
 
             if stats is None:
                 st.info("📝 Este motorista ainda não possui avaliações.")
@@ -865,26 +900,26 @@ elif menu == "📊 Dashboard":
                     stats['media_comunicacao_assertiva']
                 ]
 
-                fig_radar = go.Figure()
-                fig_radar.add_trace(go.Scatterpolar(
-                    r=valores,
-                    theta=categorias,
-                    fill='toself',
-                    name='Desempenho',
-                    line_color='#1f77b4'
-                ))
-
-                fig_radar.update_layout(
-                    polar=dict(
-                        radialaxis=dict(visible=True, range=[0, 5])
-                    ),
-                    title="📊 Desempenho por Categoria",
-                    height=400
-                )
-
                 col1, col2 = st.columns([2, 1])
 
-                with col1:
+                with col1, obter_metricas().medir('grafico', 'radar_motorista'):
+                    fig_radar = go.Figure()
+                    fig_radar.add_trace(go.Scatterpolar(
+                        r=valores,
+                        theta=categorias,
+                        fill='toself',
+                        name='Desempenho',
+                        line_color='#1f77b4'
+                    ))
+
+                    fig_radar.update_layout(
+                        polar=dict(
+                            radialaxis=dict(visible=True, range=[0, 5])
+                        ),
+                        title="📊 Desempenho por Categoria",
+                        height=400
+                    )
+
                     st.plotly_chart(fig_radar, use_container_width=True)
 
                 with col2:
@@ -895,11 +930,23 @@ elif menu == "📊 Dashboard":
                     for categoria, valor in zip(categorias_completas, valores):
                         st.markdown(f"**{categoria}:** {valor:.2f} {'⭐' * int(valor)}")
 
+                # Evolução por período a partir dos agregados; a granularidade reexecuta só o gráfico
+                @fragmento("tendencia_motorista")
+                def secao_tendencia_motorista(motorista_id):
+                    granularidade = st.radio("📈 Evolução", list(GRANULARIDADES_TELA), horizontal=True,
+                                             key="granularidade_motorista")
+                    tendencia_df = obter_tendencia(motorista_id, GRANULARIDADES_TELA[granularidade])
+                    if len(tendencia_df) > 1:
+                        with obter_metricas().medir('grafico', 'tendencia_motorista'):
+                            st.plotly_chart(grafico_tendencia(tendencia_df, "📈 Evolução das notas"),
+                                            use_container_width=True)
+
+                secao_tendencia_motorista(motorista_id)
+
                 # Histórico de avaliações
                 st.markdown("#### 📝 Últimas Avaliações")
-                avaliacoes_df = obter_avaliacoes_motorista(motorista_id)
 
-                for _, avaliacao in avaliacoes_df.head(5).iterrows():
+                for _, avaliacao in avaliacoes_df.iterrows():
                     media_avaliacao = (avaliacao['custo_manutencao'] + avaliacao['disponibilidade_frota'] +
                                        avaliacao['metas_producao'] + avaliacao['seguranca_trabalho'] +
                                        avaliacao['realizacao_checklist'] + avaliacao['conhecimento_manutencao'] +
@@ -924,66 +971,380 @@ elif menu == "📊 Dashboard":
                         if avaliacao['comentario']:
                             st.write(f"💬 **Comentário:** {avaliacao['comentario']}")
 
+                # Histórico completo, uma página por vez; filtros e paginação reexecutam só o histórico
+                @fragmento("historico_avaliacoes")
+                def secao_historico_avaliacoes(motorista_id):
+                    st.markdown("#### 🗂️ Histórico de Avaliações")
+
+                    col_h1, col_h2, col_h3, col_h4 = st.columns([2, 2, 2, 1])
+                    with col_h1:
+                        periodo = st.date_input("📅 Período", value=(), format="DD/MM/YYYY",
+                                                key=f"historico_periodo_{motorista_id}")
+                    with col_h2:
+                        avaliador_filtro = st.selectbox("👤 Avaliador", listar_avaliadores_motorista(motorista_id),
+                                                        index=None, placeholder="Todos",
+                                                        key=f"historico_avaliador_{motorista_id}")
+                    with col_h3:
+                        nota_min, nota_max = st.slider("⭐ Nota média", 1.0, 5.0, (1.0, 5.0), step=0.1,
+                                                       key=f"historico_nota_{motorista_id}")
+                    with col_h4:
+                        tamanho_historico = st.selectbox("Por página", [10, 20, 50], index=1,
+                                                         key=f"historico_tamanho_{motorista_id}")
+
+                    filtros_historico = {
+                        'data_inicio': periodo[0] if len(periodo) > 0 else None,
+                        'data_fim': periodo[1] if len(periodo) > 1 else None,
+                        'avaliador': avaliador_filtro,
+                        # Limites no extremo da escala não filtram nada
+                        'nota_min': nota_min if nota_min > 1.0 else None,
+                        'nota_max': nota_max if nota_max < 5.0 else None,
+                    }
+
+                    # Pilha de cursores como na lista de motoristas; filtros novos voltam para a primeira página
+                    chave_historico = (motorista_id, tamanho_historico, tuple(filtros_historico.values()))
+                    if st.session_state.get('filtros_historico') != chave_historico:
+                        st.session_state.filtros_historico = chave_historico
+                        st.session_state.cursores_historico = [None]
+                    cursores_historico = st.session_state.cursores_historico
+
+                    historico_df, proximo_historico = listar_avaliacoes_pagina(
+                        motorista_id, cursores_historico[-1], tamanho_historico, **filtros_historico)
+
+                    if historico_df.empty:
+                        st.info("🔎 Nenhuma avaliação encontrada com esses filtros.")
+                    else:
+                        quantidade, exata = estimar_avaliacoes(motorista_id, **filtros_historico)
+                        st.caption(f"{quantidade}{'' if exata else '+'} avaliação(ões) • "
+                                   f"página {len(cursores_historico)}")
+
+                        historico_df = historico_df.assign(
+                            data_avaliacao=pd.to_datetime(historico_df['data_avaliacao'], format='mixed'))
+                        st.dataframe(
+                            historico_df.drop(columns=['id']),
+                            column_config={
+                                'data_avaliacao': st.column_config.DatetimeColumn('Data', format='DD/MM/YYYY HH:mm'),
+                                'avaliador': 'Avaliador',
+                                'media': st.column_config.NumberColumn('Média', format='%.2f'),
+                                'custo_manutencao': 'Custo Manut.',
+                                'disponibilidade_frota': 'Disp. Frota',
+                                'metas_producao': 'Metas',
+                                'seguranca_trabalho': 'Segurança',
+                                'realizacao_checklist': 'Checklist',
+                                'conhecimento_manutencao': 'Conhec. Manut.',
+                                'comunicacao_assertiva': 'Comunicação',
+                                'comentario': 'Comentário'
+                            },
+                            hide_index=True,
+                            use_container_width=True
+                        )
+
+                        col_anterior, _, col_proxima = st.columns([1, 3, 1])
+                        with col_anterior:
+                            st.button("⬅️ Anterior", disabled=len(cursores_historico) == 1,
+                                      key="pagina_anterior_historico", on_click=cursores_historico.pop)
+                        with col_proxima:
+                            st.button("Próxima ➡️", disabled=proximo_historico is None,
+                                      key="pagina_proxima_historico", on_click=cursores_historico.append,
+                                      args=(proximo_historico,))
+
+                secao_historico_avaliacoes(motorista_id)
+
 # Página Ranking
 elif menu == "🏆 Ranking":
+    import plotly.express as px
+
     st.markdown("### 🏆 Ranking Geral dos Motoristas")
 
-    ranking_df = obter_ranking_geral()
+    periodos_ranking = {"Todo o período": None, "Últimos 30 dias": 30, "Últimos 90 dias": 90,
+                        "Últimos 365 dias": 365}
+    dias_ranking = periodos_ranking[st.selectbox("📅 Período", list(periodos_ranking), key="periodo_ranking")]
 
-    if ranking_df.empty:
+    top_df = obter_ranking_pagina(0, 10, dias_ranking)
+
+    if top_df.empty and dias_ranking:
+        st.info("📊 Nenhuma avaliação neste período.")
+    elif top_df.empty:
         st.info("📊 Ainda não há avaliações suficientes para gerar o ranking.")
     else:
-        st.markdown("#### 🥇 Melhores Motoristas")
-
-        for i, (_, motorista) in enumerate(ranking_df.iterrows()):
-            # Medalhas para o top 3
-            medalha = ""
-            if i == 0:
-                medalha = "🥇"
-            elif i == 1:
-                medalha = "🥈"
-            elif i == 2:
-                medalha = "🥉"
-            else:
-                medalha = f"{i + 1}º"
+        total_ranqueados = int(top_df['total_ranqueados'].iloc[0])
+
+        # Consulta de uma posição sem carregar o ranking inteiro
+        @fragmento("posicao_ranking")
+        def secao_posicao_ranking(dias_ranking, total_ranqueados):
+            busca_posicao = st.text_input("🔎 Encontrar posição do motorista", placeholder="Digite parte do nome")
+            if busca_posicao.strip():
+                encontrados = buscar_posicoes_ranking(busca_posicao, dias=dias_ranking)
+                if encontrados.empty:
+                    st.info("Nenhum motorista ranqueado com esse nome.")
+                for _, motorista in encontrados.iterrows():
+                    st.markdown(f"**{motorista['posicao']}º de {total_ranqueados}** — {motorista['nome']} "
+                                f"({motorista['media_geral']:.2f} ⭐, {motorista['total_avaliacoes']} avaliações)")
+
+        secao_posicao_ranking(dias_ranking, total_ranqueados)
+
+        # Tamanho e número da página reexecutam só a lista
+        @fragmento("lista_ranking")
+        def secao_lista_ranking(dias_ranking, total_ranqueados):
+            st.markdown("#### 🥇 Melhores Motoristas")
+
+            col_tamanho, col_pagina = st.columns(2)
+            with col_tamanho:
+                tamanho_pagina = st.selectbox("Por página", [10, 20, 50, 100], index=1, key="tamanho_pagina_ranking")
+            total_paginas = max(1, -(-total_ranqueados // tamanho_pagina))
+            with col_pagina:
+                pagina_ranking = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1,
+                                                 key=f"pagina_ranking_{dias_ranking}")
+            st.caption(f"{total_ranqueados} motoristas ranqueados • página {pagina_ranking} de {total_paginas}")
+
+            ranking_df = obter_ranking_pagina((pagina_ranking - 1) * tamanho_pagina, tamanho_pagina, dias_ranking)
+
+            for _, motorista in ranking_df.iterrows():
+                # Medalhas para as três primeiras faixas de nota
+                medalha = {1: "🥇", 2: "🥈", 3: "🥉"}.get(motorista['faixa'], f"{motorista['posicao']}º")
+
+                # Card do motorista
+                col1, col2, col3 = st.columns([1, 3, 1])
 
-            # Card do motorista
-            col1, col2, col3 = st.columns([1, 3, 1])
+                with col1:
+                    st.markdown(f"### {medalha}")
 
-            with col1:
-                st.markdown(f"### {medalha}")
+                with col2:
+                    st.markdown(f"**{motorista['nome']}**")
+                    veiculo_info = (f"{motorista['placa']} - {motorista['modelo']}" if motorista['placa']
+                                    else "Sem veículo")
+                    st.markdown(f"🚛 {veiculo_info}")
+                    st.markdown(f"📊 {motorista['total_avaliacoes']} avaliações")
 
-            with col2:
-                st.markdown(f"**{motorista['nome']}**")
-                veiculo_info = f"{motorista['placa']} - {motorista['modelo']}" if motorista['placa'] else "Sem veículo"
-                st.markdown(f"🚛 {veiculo_info}")
-                st.markdown(f"📊 {motorista['total_avaliacoes']} avaliações")
+                with col3:
+                    nota = motorista['media_geral']
+                    st.markdown(f"### {nota:.2f}")
+                    st.markdown("⭐" * int(nota))
 
-            with col3:
-                nota = motorista['media_geral']
-                st.markdown(f"### {nota:.2f}")
-                st.markdown("⭐" * int(nota))
+                st.markdown("---")
 
-            st.markdown("---")
+        secao_lista_ranking(dias_ranking, total_ranqueados)
 
         # Gráfico do ranking
-        if len(ranking_df) > 1:
-            fig_ranking = px.bar(
-                ranking_df.head(10),
-                x='nome',
-                y='media_geral',
-                title='📊 Top 10 Motoristas',
-                labels={'nome': 'Motorista', 'media_geral': 'Nota Média'},
-                color='media_geral',
-                color_continuous_scale='Viridis'
-            )
+        if len(top_df) > 1:
+            with obter_metricas().medir('grafico', 'ranking'):
+                fig_ranking = px.bar(
+                    top_df,
+                    x='nome',
+                    y='media_geral',
+                    title='📊 Top 10 Motoristas',
+                    labels={'nome': 'Motorista', 'media_geral': 'Nota Média'},
+                    color='media_geral',
+                    color_continuous_scale='Viridis'
+                )
+
+                fig_ranking.update_layout(
+                    xaxis_tickangle=-45,
+                    height=500
+                )
+
+                st.plotly_chart(fig_ranking, use_container_width=True)
+
+# Página Segmentos
+elif menu == "🗺️ Segmentos":
+    import plotly.express as px
+
+    st.markdown("### 🗺️ Análise por Segmento")
+
+    frota_df = obter_segmentos(())
+
+    if frota_df.empty:
+        st.info("📊 Ainda não há avaliações para comparar segmentos.")
+    else:
+        frota = frota_df.iloc[0]
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("⭐ Média da Frota", f"{frota['media_geral']:.2f}")
+        with col2:
+            st.metric("📊 Avaliações", int(frota['total']))
+
+        # O agrupamento reexecuta só o gráfico e a tabela
+        @fragmento("segmentos")
+        def secao_segmentos(media_frota):
+            rotulos_dimensoes = {'cidade': 'Cidade', 'tipo_veiculo': 'Tipo de Veículo', 'proprio_alugado': 'Status'}
+            dimensoes = st.multiselect("📐 Agrupar por", list(rotulos_dimensoes), default=['cidade'],
+                                       format_func=rotulos_dimensoes.get)
+
+            if dimensoes:
+                # Ordem das colunas segue a das dimensões do cubo
+                dimensoes = [d for d in DIMENSOES_SEGMENTO if d in dimensoes]
+                segmentos_df = obter_segmentos(tuple(dimensoes))
+                # O DataFrame vem do cache compartilhado entre sessões: monta uma cópia com o rótulo
+                segmentos_df = segmentos_df.assign(segmento=segmentos_df[dimensoes].agg(' • '.join, axis=1))
+
+                with obter_metricas().medir('grafico', 'segmentos'):
+                    fig_segmentos = px.bar(
+                        segmentos_df,
+                        x='segmento',
+                        y='media_geral',
+                        title='📊 Nota Média por Segmento',
+                        labels={'segmento': 'Segmento', 'media_geral': 'Nota Média'},
+                        color='media_geral',
+                        color_continuous_scale='Viridis',
+                        hover_data={'total': True}
+                    )
+                    fig_segmentos.add_hline(y=media_frota, line_dash='dash', annotation_text='Frota')
+                    fig_segmentos.update_layout(xaxis_tickangle=-45, height=450)
+                    st.plotly_chart(fig_segmentos, use_container_width=True)
+
+                st.dataframe(
+                    segmentos_df[dimensoes + ['total', 'media_geral'] + [f'media_{c}' for c in CRITERIOS]],
+                    column_config={
+                        **rotulos_dimensoes,
+                        'total': 'Avaliações',
+                        'media_geral': st.column_config.NumberColumn('Média Geral', format='%.2f'),
+                        **{f'media_{criterio}': st.column_config.NumberColumn(nome, format='%.2f')
+                           for nome, criterio in COLUNAS_EXCEL_AVALIACOES.items()}
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+
+        secao_segmentos(frota['media_geral'])
+
+# Página Análises
+elif menu == "🧮 Análises":
+    import plotly.express as px
+
+    st.markdown("### 🧮 Análises")
+
+    motor = motor_analitico()
 
-            fig_ranking.update_layout(
-                xaxis_tickangle=-45,
-                height=500
+    if motor.total == 0:
+        st.info("📊 Ainda não há avaliações para analisar.")
+    else:
+        st.caption(f"{motor.total} avaliações em memória • {motor.bytes_por_avaliacao} bytes por avaliação")
+
+        # Pesos e filtros reexecutam só o ranking ponderado; a correlação não depende deles
+        @fragmento("ranking_ponderado")
+        def secao_ranking_ponderado():
+            with st.expander("⚖️ Pesos dos critérios"):
+                col1, col2 = st.columns(2)
+                pesos = {}
+                for i, (nome, criterio) in enumerate(COLUNAS_EXCEL_AVALIACOES.items()):
+                    with col1 if i % 2 == 0 else col2:
+                        pesos[criterio] = st.slider(nome, 0.0, 5.0, 1.0, step=0.5, key=f"peso_{criterio}")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                minimo_avaliacoes = st.number_input("Mínimo de avaliações", min_value=1, value=5, step=1)
+            with col2:
+                quantidade_top = st.selectbox("Motoristas exibidos", [10, 20, 50, 100], index=1)
+
+            if sum(pesos.values()) == 0:
+                st.warning("⚠️ Defina ao menos um peso maior que zero.")
+            else:
+                contagens = motor.contagens()
+                notas = motor.notas_ponderadas_por_motorista(pesos)[contagens >= minimo_avaliacoes]
+                top = notas.nlargest(quantidade_top)
+
+                if top.empty:
+                    st.info("Nenhum motorista com avaliações suficientes.")
+                else:
+                    percentis = motor.percentis_por_motorista(pesos=pesos).loc[top.index]
+                    desvios = np.sqrt(motor.variancias_por_motorista().loc[top.index]).mean(axis=1)
+                    nomes = obter_nomes_motoristas(tuple(top.index.tolist()))
+
+                    tabela = pd.DataFrame({
+                        'nome': nomes['nome'].reindex(top.index),
+                        'placa': nomes['placa'].reindex(top.index),
+                        'nota': top,
+                        'avaliacoes': contagens.loc[top.index],
+                        'p25': percentis['p25'],
+                        'p50': percentis['p50'],
+                        'p75': percentis['p75'],
+                        'desvio': desvios,
+                    })
+                    st.markdown("#### ⚖️ Ranking Ponderado")
+                    st.dataframe(
+                        tabela,
+                        column_config={
+                            'nome': 'Motorista',
+                            'placa': 'Placa',
+                            'nota': st.column_config.NumberColumn('Nota Ponderada', format='%.2f'),
+                            'avaliacoes': 'Avaliações',
+                            'p25': st.column_config.NumberColumn('P25', format='%.2f'),
+                            'p50': st.column_config.NumberColumn('Mediana', format='%.2f'),
+                            'p75': st.column_config.NumberColumn('P75', format='%.2f'),
+                            'desvio': st.column_config.NumberColumn('Desvio Padrão Médio', format='%.2f'),
+                        },
+                        hide_index=True,
+                        use_container_width=True
+                    )
+
+        secao_ranking_ponderado()
+
+        # Correlação entre critérios em todas as avaliações
+        nomes_criterios = {criterio: nome for nome, criterio in COLUNAS_EXCEL_AVALIACOES.items()}
+        correlacoes = motor.correlacoes().rename(index=nomes_criterios, columns=nomes_criterios)
+        with obter_metricas().medir('grafico', 'correlacao'):
+            fig_correlacao = px.imshow(
+                correlacoes,
+                text_auto='.2f',
+                zmin=-1,
+                zmax=1,
+                color_continuous_scale='RdBu',
+                title='🔗 Correlação entre Critérios'
             )
+            fig_correlacao.update_layout(height=550)
+            st.plotly_chart(fig_correlacao, use_container_width=True)
+
+# Página Métricas (oculta, ver TOKEN_ADMIN)
+elif menu == "🛠️ Métricas":
+    st.markdown("### 🛠️ Métricas de Desempenho")
+
+    metricas = obter_metricas()
+    st.caption(f"Percentis sobre as últimas {metricas.janela} amostras de cada item, coletadas neste processo "
+               f"desde {metricas.iniciado_em:%d/%m/%Y %H:%M}.")
+
+    st.markdown("#### 📄 Páginas")
+    st.caption("Tempo de cada execução do script dividido em dados (SQLite e pandas, com as esperas por conexão), "
+               "gráficos (plotly) e Streamlit (demais comandos e emissão dos elementos). Reexecuções isoladas de "
+               "um fragmento aparecem como \"fragmento <chave>\".")
+    paginas_df = metricas.resumo_paginas()
+    if paginas_df.empty:
+        st.info("Nenhuma execução registrada ainda.")
+    else:
+        st.dataframe(paginas_df, hide_index=True, use_container_width=True)
+
+    resumo_metricas_df = metricas.resumo()
+    for tipo, titulo in (('dados', "#### 🗄️ Funções de dados"), ('grafico', "#### 📊 Gráficos"),
+                         ('espera', "#### ⏳ Esperas por conexão")):
+        st.markdown(titulo)
+        tipo_df = resumo_metricas_df[resumo_metricas_df['tipo'] == tipo].drop(columns='tipo')
+        if tipo_df.empty:
+            st.info("Sem amostras.")
+        else:
+            st.dataframe(tipo_df.sort_values('p95_ms', ascending=False), hide_index=True, use_container_width=True)
+
+    st.markdown(f"#### 🐢 Chamadas lentas (a partir de {metricas.limite_lento_ms} ms)")
+    lentas = list(metricas.lentas)[::-1]
+    if lentas:
+        lentas_df = pd.DataFrame(lentas)
+        lentas_df['sql'] = lentas_df['sql'].str.join('\n\n')
+        st.dataframe(lentas_df, hide_index=True, use_container_width=True)
+    else:
+        st.info("Nenhuma chamada lenta registrada.")
 
-            st.plotly_chart(fig_ranking, use_container_width=True)
+    st.markdown("#### 🚀 Inicialização do banco")
+    st.json(inicializar_banco())
+
+    st.markdown("#### 📮 Fila de avaliações e cache")
+    extras = {'fila_avaliacoes': obter_fila_avaliacoes().metricas(), 'cache': obter_cache().estatisticas(),
+              'inicializacao': inicializar_banco()}
+    col1, col2 = st.columns(2)
+    with col1:
+        st.json(extras['fila_avaliacoes'])
+    with col2:
+        st.json(extras['cache'])
+
+    if st.button("💾 Exportar métricas"):
+        caminho = metricas.exportar(extras=extras)
+        st.success(f"✅ Métricas gravadas em {os.path.abspath(caminho)}")
 
 # Footer
 st.markdown("---")
@@ -993,3 +1354,5 @@ st.markdown(
     "</div>",
     unsafe_allow_html=True
 )
+
+registrar_execucao(menu, 1000 * (time.perf_counter() - INICIO_EXECUCAO))
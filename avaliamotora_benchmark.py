@@ -0,0 +1,360 @@
+# Benchmarks da camada de dados (avaliamotora_dados) sobre dados sintéticos determinísticos.
+#
+#     python avaliamotora_benchmark.py --tamanho medio --saida base.json
+#     python avaliamotora_benchmark.py --tamanho medio --saida novo.json --comparar base.json
+#     python avaliamotora_benchmark.py --comparar base.json novo.json
+#
+# Cada caso é uma função de dados ou o caminho de dados completo de uma página do app, medido com o cache de
+# consultas vazio. O resultado (p50/p95 em ms e pico de memória Python) sai em JSON; a comparação aponta os
+# casos que ficaram mais lentos ou mais pesados que a base além da tolerância e termina com código 1.
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import avaliamotora_dados as dados
+
+# Tamanhos pré-definidos: (veículos, motoristas, avaliações)
+TAMANHOS = {
+    'pequeno': (100, 200, 1_000),
+    'medio': (2_000, 5_000, 100_000),
+    'grande': (10_000, 20_000, 1_000_000),
+}
+
+DIRETORIO_BANCOS = os.path.join(tempfile.gettempdir(), 'avaliamotora_benchmark')
+
+MODELOS = ['Volkswagen Delivery', 'Mercedes Sprinter', 'Fiat Ducato', 'Iveco Daily', 'Ford Cargo', 'Renault Master',
+           'Volvo FH', 'Scania R450', 'Fiat Strada', 'Toyota Hilux']
+TIPOS_VEICULO = ['Caminhão', 'Van', 'Utilitário', 'Carreta']
+CIDADES = ['São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Recife', 'Belém', 'Salvador', 'Fortaleza', 'Curitiba',
+           'Porto Alegre', 'Manaus', 'Goiânia', 'Campinas', 'Natal', 'São Luís', 'Maceió', 'Teresina']
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João', 'Larissa',
+         'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sabrina', 'Thiago', 'Vanessa', 'William']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+              'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa']
+LOTE_GERACAO = 100_000
+
+
+def _placa(indice):
+    # Placas únicas e estáveis: três letras a cada 10 mil números
+    letras = ''.join(chr(65 + (indice // 10_000 // 26 ** k) % 26) for k in (2, 1, 0))
+    return f'{letras}-{indice % 10_000:04d}'
+
+
+def gerar_dados(veiculos, motoristas, avaliacoes, semente=42, dias=730, fim=None):
+    # Popula o banco configurado em avaliamotora_dados; a mesma semente e o mesmo fim geram os mesmos dados.
+    # As avaliações cobrem os `dias` dias até `fim` e se concentram em parte dos motoristas (pesos log-normais).
+    rng = np.random.default_rng(semente)
+    fim = datetime.combine(fim or date.today(), datetime.min.time()) + timedelta(days=1)
+
+    # Cidades com frotas de tamanhos diferentes: a primeira tem o dobro de veículos da última
+    pesos_cidades = np.linspace(2, 1, len(CIDADES))
+    cidades = rng.choice(len(CIDADES), veiculos, p=pesos_cidades / pesos_cidades.sum())
+    registros_veiculos = [
+        (_placa(i), MODELOS[m], TIPOS_VEICULO[t], 'Próprio' if p else 'Alugado', CIDADES[c], int(a))
+        for i, m, t, p, c, a in zip(range(veiculos), rng.integers(len(MODELOS), size=veiculos),
+                                    rng.integers(len(TIPOS_VEICULO), size=veiculos), rng.random(veiculos) < 0.6,
+                                    cidades, rng.integers(2008, 2025, size=veiculos))
+    ]
+
+    sem_veiculo = rng.random(motoristas) < 0.05
+    registros_motoristas = [
+        (f'{NOMES[n]} {SOBRENOMES[s]} {i + 1:05d}', None if sem else int(v), (fim - timedelta(days=dias + 1)).date())
+        for i, n, s, v, sem in zip(range(motoristas), rng.integers(len(NOMES), size=motoristas),
+                                   rng.integers(len(SOBRENOMES), size=motoristas),
+                                   rng.integers(1, veiculos + 1, size=motoristas), sem_veiculo)
+    ]
+
+    with dados.obter_conexoes().escrita() as conn:
+        conn.executemany('''
+            INSERT INTO veiculos (placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', registros_veiculos)
+        conn.executemany('INSERT INTO motoristas (nome, veiculo_id, data_cadastro) VALUES (?, ?, ?)',
+                         registros_motoristas)
+
+    pesos = rng.lognormal(0, 1, motoristas)
+    base_motorista = rng.normal(3.3, 0.6, motoristas)
+    avaliadores = [f'Supervisor {i:02d}' for i in range(1, 51)]
+    # Datas em ordem crescente, como chegam pelo formulário
+    segundos = np.sort(rng.integers(1, dias * 86400 + 1, size=avaliacoes))[::-1]
+    datas = np.datetime64(fim, 's') - segundos.astype('timedelta64[s]')
+    for inicio in range(0, avaliacoes, LOTE_GERACAO):
+        n = min(LOTE_GERACAO, avaliacoes - inicio)
+        ids = rng.choice(motoristas, n, p=pesos / pesos.sum())
+        notas = np.clip(np.rint(base_motorista[ids, None] + rng.normal(0, 0.9, (n, len(dados.CRITERIOS)))), 1, 5)
+        comentarios = np.where(rng.random(n) < 0.2, 'Sem observações', None)
+        quem = rng.integers(len(avaliadores), size=n)
+        texto_datas = np.char.replace(np.datetime_as_string(datas[inicio:inicio + n], unit='s'), 'T', ' ')
+        with dados.obter_conexoes().escrita() as conn:
+            conn.executemany(dados.SQL_INSERIR_AVALIACAO, [
+                (int(m) + 1, *map(int, linha), c, avaliadores[q], str(d))
+                for m, linha, c, q, d in zip(ids, notas, comentarios, quem, texto_datas)
+            ])
+    dados.reconstruir_estatisticas()
+
+
+def preparar_banco(veiculos, motoristas, avaliacoes, semente=42, regerar=False):
+    # Gera (ou reaproveita) o banco sintético e devolve uma cópia de trabalho, pois os casos de escrita o alteram
+    os.makedirs(DIRETORIO_BANCOS, exist_ok=True)
+    fim = date.today()
+    nome = f'sintetico_{veiculos}_{motoristas}_{avaliacoes}_s{semente}_{fim.isoformat()}'
+    origem = os.path.join(DIRETORIO_BANCOS, nome + '.db')
+    if regerar or not os.path.exists(origem):
+        temporario = origem + '.gerando'
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(temporario + sufixo):
+                os.remove(temporario + sufixo)
+        dados.configurar_banco(temporario)
+        dados.init_database()
+        gerar_dados(veiculos, motoristas, avaliacoes, semente, fim=fim)
+        with dados.obter_conexoes().escrita() as conn:
+            conn.execute('ANALYZE')
+        # Fecha as conexões (o último fechamento integra o WAL ao arquivo) antes de publicar o banco
+        dados.configurar_banco(origem)
+        os.replace(temporario, origem)
+
+    trabalho = os.path.join(DIRETORIO_BANCOS, nome + '.trabalho.db')
+    for sufixo in ('-wal', '-shm'):
+        if os.path.exists(trabalho + sufixo):
+            os.remove(trabalho + sufixo)
+    shutil.copyfile(origem, trabalho)
+    dados.configurar_banco(trabalho)
+    dados.init_database()
+    return trabalho
+
+
+def _contexto():
+    # Parâmetros reais para os casos: o motorista com mais avaliações, um nome e uma cidade existentes
+    with dados.obter_conexoes().leitura() as conn:
+        motorista_id, = conn.execute('SELECT motorista_id FROM motorista_stats ORDER BY total DESC LIMIT 1').fetchone()
+        nome, = conn.execute('SELECT nome FROM motoristas WHERE id = ?', (motorista_id,)).fetchone()
+        cidade, = conn.execute('SELECT cidade FROM veiculos ORDER BY id LIMIT 1').fetchone()
+        placas = [linha[0] for linha in conn.execute('SELECT placa FROM veiculos ORDER BY id LIMIT 1000')]
+    veiculos_df = pd.DataFrame({
+        'Placa': placas, 'Modelo': 'Modelo atualizado', 'Tipo de veículo': 'Van', 'Próprio ou alugado': 'Alugado',
+        'Cidade': cidade, 'Ano': 2022,
+    })
+    return {'motorista_id': motorista_id, 'nome': nome.split()[0], 'cidade': cidade, 'veiculos_df': veiculos_df}
+
+
+def _recarregar_motor():
+    dados.obter_motor_analitico.descartar()
+    return dados.motor_analitico()
+
+
+def casos_funcoes(ctx):
+    m = ctx['motorista_id']
+    return {
+        'listar_motoristas': lambda: dados.listar_motoristas(),
+        'listar_motoristas_pagina': lambda: dados.listar_motoristas_pagina(tamanho=20),
+        'listar_motoristas_pagina_filtro': lambda: dados.listar_motoristas_pagina(tamanho=20, cidade=ctx['cidade']),
+        'contar_motoristas': lambda: dados.contar_motoristas(cidade=ctx['cidade']),
+        'listar_veiculos': lambda: dados.listar_veiculos(),
+        'buscar_veiculos': lambda: dados.buscar_veiculos('a'),
+        'buscar_motoristas': lambda: dados.buscar_motoristas(ctx['nome']),
+        'obter_motorista_por_id': lambda: dados.obter_motorista_por_id(m),
+        'calcular_estatisticas_motorista': lambda: dados.calcular_estatisticas_motorista(m),
+        'obter_avaliacoes_motorista': lambda: dados.obter_avaliacoes_motorista(m),
+        'obter_dashboard_motorista': lambda: dados.obter_dashboard_motorista(m),
+        'listar_avaliacoes_pagina': lambda: dados.listar_avaliacoes_pagina(m, tamanho=20),
+        'listar_avaliacoes_pagina_filtro': lambda: dados.listar_avaliacoes_pagina(m, tamanho=20, nota_min=4),
+        'estimar_avaliacoes_filtro': lambda: dados.estimar_avaliacoes(m, nota_min=4),
+        'listar_avaliadores_motorista': lambda: dados.listar_avaliadores_motorista(m),
+        'obter_resumo_sistema': lambda: dados.obter_resumo_sistema(),
+        'obter_ranking_pagina': lambda: dados.obter_ranking_pagina(0, 20),
+        'obter_ranking_pagina_30_dias': lambda: dados.obter_ranking_pagina(0, 20, 30),
+        'obter_ranking_pagina_365_dias': lambda: dados.obter_ranking_pagina(0, 20, 365),
+        'obter_posicao_motorista': lambda: dados.obter_posicao_motorista(m),
+        'buscar_posicoes_ranking': lambda: dados.buscar_posicoes_ranking(ctx['nome']),
+        'obter_segmentos_cidade': lambda: dados.obter_segmentos(('cidade',)),
+        'obter_segmentos_todas_dimensoes': lambda: dados.obter_segmentos(tuple(dados.DIMENSOES_SEGMENTO)),
+        'obter_tendencia_frota_mes': lambda: dados.obter_tendencia(dados.ID_FROTA, 'mes'),
+        'obter_tendencia_motorista_semana': lambda: dados.obter_tendencia(m, 'semana'),
+        'motor_analitico_carga': _recarregar_motor,
+        'importar_veiculos_excel_1000': lambda: dados.importar_veiculos_excel(ctx['veiculos_df'], 'atualizar'),
+        'adicionar_avaliacao': lambda: dados.adicionar_avaliacao(m, 5, 4, 4, 5, 3, 4, 5, '', 'Benchmark'),
+    }
+
+
+def _pagina_analises():
+    motor = dados.motor_analitico()
+    contagens = motor.contagens()
+    notas = motor.notas_ponderadas_por_motorista()[contagens >= 5]
+    top = notas.sort_values(ascending=False).head(20)
+    motor.percentis_por_motorista().loc[top.index]
+    motor.variancias_por_motorista().loc[top.index]
+    motor.correlacoes()
+    return dados.obter_nomes_motoristas(tuple(top.index.tolist()))
+
+
+def casos_paginas(ctx):
+    # Sequência de chamadas de dados que cada página do app faz ao abrir com os filtros padrão
+    m = ctx['motorista_id']
+    return {
+        'pagina_inicio': lambda: (dados.obter_resumo_sistema(), dados.obter_tendencia(dados.ID_FROTA, 'mes')),
+        'pagina_cadastrar_veiculos': lambda: dados.listar_veiculos(),
+        'pagina_cadastrar_motorista': lambda: (
+            dados.obter_resumo_sistema(), dados.buscar_veiculos(''), dados.listar_motoristas_pagina(tamanho=20),
+            dados.contar_motoristas()),
+        'pagina_editar_motorista': lambda: (
+            dados.obter_resumo_sistema(), dados.buscar_motoristas(''), dados.obter_motorista_por_id(m),
+            dados.buscar_veiculos('', incluir_id=dados.obter_motorista_por_id(m).veiculo_id),
+            dados.calcular_estatisticas_motorista(m)),
+        'pagina_avaliar_motorista': lambda: (dados.obter_resumo_sistema(), dados.buscar_motoristas('')),
+        'pagina_dashboard': lambda: (
+            dados.obter_resumo_sistema(), dados.buscar_motoristas(''), dados.obter_dashboard_motorista(m),
+            dados.obter_tendencia(m, 'mes'), dados.estimar_avaliacoes(m), dados.listar_avaliacoes_pagina(m),
+            dados.listar_avaliadores_motorista(m)),
+        'pagina_ranking': lambda: (dados.obter_ranking_pagina(0, 10), dados.obter_ranking_pagina(0, 20)),
+        'pagina_segmentos': lambda: (dados.obter_segmentos(()), dados.obter_segmentos(('cidade',))),
+        'pagina_analises': _pagina_analises,
+    }
+
+
+def medir(funcao, repeticoes=20, aquecimento=1):
+    # Cada execução começa com o cache de consultas vazio; o pico de memória é medido numa execução à parte,
+    # pois o tracemalloc deixa as alocações mais lentas
+    cache = dados.obter_cache()
+    for _ in range(aquecimento):
+        cache.limpar()
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        cache.limpar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(1000 * (time.perf_counter() - inicio))
+    cache.limpar()
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    p50, p95 = np.percentile(tempos, [50, 95])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'min_ms': round(min(tempos), 3),
+            'max_ms': round(max(tempos), 3), 'repeticoes': repeticoes, 'pico_memoria_kb': round(pico / 1024, 1)}
+
+
+def executar(veiculos, motoristas, avaliacoes, semente=42, repeticoes=20, filtro=None, regerar=False, progresso=None):
+    inicio = time.perf_counter()
+    banco = preparar_banco(veiculos, motoristas, avaliacoes, semente, regerar)
+    preparo_s = time.perf_counter() - inicio
+    ctx = _contexto()
+    casos = {**casos_funcoes(ctx), **casos_paginas(ctx)}
+    resultados = {}
+    for nome, funcao in casos.items():
+        if filtro and filtro not in nome:
+            continue
+        resultados[nome] = medir(funcao, repeticoes)
+        if progresso:
+            progresso(nome, resultados[nome])
+    return {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'veiculos': veiculos, 'motoristas': motoristas, 'avaliacoes': avaliacoes, 'semente': semente,
+            'repeticoes': repeticoes, 'banco': banco, 'preparo_s': round(preparo_s, 2),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'pandas': pd.__version__,
+            'numpy': np.__version__, 'plataforma': platform.platform(),
+        },
+        'resultados': resultados,
+    }
+
+
+def comparar(base, novo, tolerancia=0.2, minimo_ms=1.0, minimo_kb=1024):
+    # Regressão: p50 ou pico de memória acima de (1 + tolerância) vezes a base e da diferença mínima absoluta,
+    # para que oscilações de casos de microssegundos não sejam apontadas
+    linhas, regressoes = [], []
+    for nome in sorted(set(base['resultados']) | set(novo['resultados'])):
+        a, b = base['resultados'].get(nome), novo['resultados'].get(nome)
+        if a is None or b is None:
+            linhas.append((nome, a and a['p50_ms'], b and b['p50_ms'], None, 'novo' if a is None else 'removido'))
+            continue
+        razao = b['p50_ms'] / a['p50_ms'] if a['p50_ms'] else math.inf
+        motivos = []
+        if razao > 1 + tolerancia and b['p50_ms'] - a['p50_ms'] > minimo_ms:
+            motivos.append('tempo')
+        if (b['pico_memoria_kb'] > (1 + tolerancia) * a['pico_memoria_kb']
+                and b['pico_memoria_kb'] - a['pico_memoria_kb'] > minimo_kb):
+            motivos.append('memória')
+        if motivos:
+            regressoes.append(nome)
+        situacao = f"REGRESSÃO ({', '.join(motivos)})" if motivos else ''
+        linhas.append((nome, a['p50_ms'], b['p50_ms'], razao, situacao))
+    return linhas, regressoes
+
+
+def imprimir_resultados(resultado):
+    meta = resultado['meta']
+    print(f"{meta['veiculos']} veículos, {meta['motoristas']} motoristas, {meta['avaliacoes']} avaliações "
+          f"(semente {meta['semente']}, preparo {meta['preparo_s']} s)")
+    print(f"{'caso':<36} {'p50 ms':>10} {'p95 ms':>10} {'pico KB':>12}")
+    for nome, r in resultado['resultados'].items():
+        print(f"{nome:<36} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} {r['pico_memoria_kb']:>12.1f}")
+
+
+def _coluna(valor, formato='.2f', largura=10):
+    return f'{valor:>{largura}{formato}}' if valor is not None else f"{'-':>{largura}}"
+
+
+def imprimir_comparacao(linhas, regressoes):
+    print(f"{'caso':<36} {'base p50':>10} {'novo p50':>10} {'razão':>7}")
+    for nome, a, b, razao, situacao in linhas:
+        print(f"{nome:<36} {_coluna(a)} {_coluna(b)} {_coluna(razao, largura=7)} {situacao}")
+    print(f"{len(regressoes)} regressão(ões)")
+
+
+def _ler(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks da camada de dados com dados sintéticos')
+    parser.add_argument('--tamanho', choices=TAMANHOS, default='pequeno')
+    parser.add_argument('--veiculos', type=int)
+    parser.add_argument('--motoristas', type=int)
+    parser.add_argument('--avaliacoes', type=int)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--filtro', help='executa apenas os casos cujo nome contém este texto')
+    parser.add_argument('--regerar', action='store_true', help='gera o banco sintético mesmo se já existir')
+    parser.add_argument('--saida', help='arquivo JSON para os resultados')
+    parser.add_argument('--comparar', nargs='+', metavar='JSON',
+                        help='BASE compara esta execução com a base; BASE NOVO compara dois arquivos sem executar')
+    parser.add_argument('--tolerancia', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.comparar and len(args.comparar) > 2:
+        parser.error('--comparar aceita BASE ou BASE NOVO')
+    if args.comparar and len(args.comparar) == 2:
+        novo = _ler(args.comparar[1])
+    else:
+        veiculos, motoristas, avaliacoes = TAMANHOS[args.tamanho]
+        novo = executar(args.veiculos or veiculos, args.motoristas or motoristas, args.avaliacoes or avaliacoes,
+                        args.semente, args.repeticoes, args.filtro, args.regerar,
+                        progresso=lambda nome, r: print(f'  {nome}: {r["p50_ms"]:.2f} ms', file=sys.stderr))
+        imprimir_resultados(novo)
+        if args.saida:
+            with open(args.saida, 'w', encoding='utf-8') as arquivo:
+                json.dump(novo, arquivo, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        linhas, regressoes = comparar(_ler(args.comparar[0]), novo, args.tolerancia)
+        imprimir_comparacao(linhas, regressoes)
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+# Teste de carga: sessões simultâneas (supervisores avaliando, gestores abrindo painéis) sobre uma cópia do banco.
+#
+#     python avaliamotora_carga.py --sessoes 20 --duracao 30
+#     python avaliamotora_carga.py --sintetico medio --sessoes 40 --processos 4 --escritas 0.3 --saida carga.json
+#     python avaliamotora_carga.py --mix dashboard=3,ranking=2,avaliar=1
+#
+# Cada sessão é uma thread que repete ações sorteadas pelo mix (o caminho de dados de uma página ou uma gravação),
+# com pausas entre elas, chamando as funções de avaliamotora_dados como o app: cache, pool de conexões e fila de
+# avaliações são compartilhados pelas sessões do processo. Com --processos as sessões se dividem entre processos
+# que disputam o mesmo arquivo, como réplicas do app. O relatório traz vazão e latências (p50/p95/p99) por ação,
+# as esperas por conexão de leitura e pela trava de escrita e as falhas "database is locked"; havendo alguma
+# dessas falhas, termina com código 1.
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+from datetime import datetime
+import numpy as np
+import avaliamotora_benchmark as benchmark
+import avaliamotora_dados as dados
+
+DIRETORIO_COPIAS = os.path.join(tempfile.gettempdir(), 'avaliamotora_carga')
+
+# Espera por conexão ou trava acima deste tempo conta como disputa no relatório
+LIMITE_ESPERA_MS = 1.0
+ERRO_BLOQUEIO = 'database is locked'
+
+
+def _acao_inicio(rng, motoristas, sessao):
+    dados.obter_resumo_sistema()
+    dados.obter_tendencia(dados.ID_FROTA, 'mes')
+
+
+def _acao_dashboard(rng, motoristas, sessao):
+    m = rng.choice(motoristas)[0]
+    dados.obter_resumo_sistema()
+    dados.buscar_motoristas('')
+    dados.obter_dashboard_motorista(m)
+    dados.obter_tendencia(m, 'mes')
+    dados.estimar_avaliacoes(m)
+    dados.listar_avaliacoes_pagina(m)
+    dados.listar_avaliadores_motorista(m)
+
+
+def _acao_ranking(rng, motoristas, sessao):
+    dias = rng.choice([None, 30, 90, 365])
+    dados.obter_ranking_pagina(0, 10, dias)
+    dados.obter_ranking_pagina(20 * rng.randrange(max(len(motoristas) // 20, 1)), 20, dias)
+
+
+def _acao_segmentos(rng, motoristas, sessao):
+    dados.obter_segmentos(())
+    dados.obter_segmentos(('cidade',))
+
+
+def _acao_cadastro(rng, motoristas, sessao):
+    dados.buscar_veiculos('')
+    dados.listar_motoristas_pagina(tamanho=20)
+    dados.contar_motoristas()
+
+
+def _acao_avaliar(rng, motoristas, sessao):
+    dados.obter_resumo_sistema()
+    dados.buscar_motoristas('')
+    notas = [rng.randint(1, 5) for _ in dados.CRITERIOS]
+    dados.adicionar_avaliacao(rng.choice(motoristas)[0], *notas, '', f'Carga {sessao:03d}')
+
+
+def _acao_editar_motorista(rng, motoristas, sessao):
+    m, nome, veiculo_id = rng.choice(motoristas)
+    dados.obter_motorista_por_id(m)
+    dados.atualizar_motorista(m, nome, veiculo_id)
+
+
+# Ação -> função(rng, motoristas, sessão); as de ACOES_ESCRITA gravam no banco
+ACOES = {
+    'inicio': _acao_inicio,
+    'dashboard': _acao_dashboard,
+    'ranking': _acao_ranking,
+    'segmentos': _acao_segmentos,
+    'cadastro': _acao_cadastro,
+    'avaliar': _acao_avaliar,
+    'editar_motorista': _acao_editar_motorista,
+}
+ACOES_ESCRITA = {'avaliar', 'editar_motorista'}
+MIX_PADRAO = {'inicio': 15, 'dashboard': 30, 'ranking': 20, 'segmentos': 5, 'cadastro': 5, 'avaliar': 20,
+              'editar_motorista': 5}
+
+
+def ler_mix(texto):
+    # "dashboard=3,ranking=2,avaliar=1" -> {'dashboard': 3.0, ...}
+    mix = {}
+    for item in texto.split(','):
+        nome, _, peso = item.partition('=')
+        nome = nome.strip()
+        if nome not in ACOES:
+            raise ValueError(f"ação desconhecida: {nome!r} (disponíveis: {', '.join(ACOES)})")
+        mix[nome] = float(peso) if peso else 1.0
+    return mix
+
+
+def ajustar_escritas(mix, fracao):
+    # Reescala os pesos para que as ações de escrita sejam `fracao` do total, mantendo as proporções internas
+    escrita = sum(peso for nome, peso in mix.items() if nome in ACOES_ESCRITA)
+    leitura = sum(mix.values()) - escrita
+    if (fracao > 0 and not escrita) or (fracao < 1 and not leitura):
+        raise ValueError('o mix não tem ações de leitura ou de escrita para a fração pedida')
+    return {nome: peso * (fracao / escrita if nome in ACOES_ESCRITA else (1 - fracao) / leitura) if peso else 0.0
+            for nome, peso in mix.items()}
+
+
+def copiar_banco(origem):
+    # Cópia consistente (inclui o conteúdo do WAL) para que a carga não altere o banco original
+    if not os.path.exists(origem):
+        raise FileNotFoundError(f'banco não encontrado: {origem}')
+    os.makedirs(DIRETORIO_COPIAS, exist_ok=True)
+    destino = os.path.join(DIRETORIO_COPIAS, 'carga_' + os.path.basename(origem))
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(destino + sufixo):
+            os.remove(destino + sufixo)
+    with closing(sqlite3.connect(origem)) as fonte, closing(sqlite3.connect(destino)) as copia:
+        fonte.backup(copia)
+    dados.configurar_banco(destino)
+    dados.init_database()
+    return destino
+
+
+def _motoristas():
+    with dados.obter_conexoes().leitura() as conn:
+        return conn.execute('SELECT id, nome, veiculo_id FROM motoristas ORDER BY id').fetchall()
+
+
+def _classificar_erro(erro):
+    if isinstance(erro, sqlite3.OperationalError) and 'locked' in str(erro):
+        return ERRO_BLOQUEIO
+    if isinstance(erro, queue.Full):
+        return 'fila de avaliações cheia'
+    if isinstance(erro, concurrent.futures.TimeoutError):
+        return 'tempo de gravação esgotado'
+    return f'{type(erro).__name__}: {str(erro)[:200]}'
+
+
+def _sessao(sessao, mix, semente, motoristas, inicio, fim, pausa_ms, amostras):
+    rng = random.Random(semente * 100_003 + sessao)
+    nomes, pesos = list(mix), list(mix.values())
+    while time.perf_counter() < fim:
+        nome = rng.choices(nomes, pesos)[0]
+        antes = time.perf_counter()
+        erro = None
+        try:
+            ACOES[nome](rng, motoristas, sessao)
+        except Exception as e:
+            erro = _classificar_erro(e)
+        amostras.append((nome, antes - inicio, 1000 * (time.perf_counter() - antes), erro))
+        if pausa_ms:
+            # Tempo de "leitura da tela" entre interações, exponencial com a média pedida
+            time.sleep(min(rng.expovariate(1000 / pausa_ms), max(fim - time.perf_counter(), 0)))
+
+
+def executar_processo(banco, sessoes, mix, semente=42, duracao=30, aquecimento=2, pausa_ms=500, barreira=None):
+    # Roda as sessões indicadas neste processo; devolve as amostras de cada ação, as esperas por conexão e trava
+    # de escrita (após o aquecimento) e as métricas da fila de avaliações
+    dados.obter_metricas.descartar()
+    metricas = dados.obter_metricas()
+    metricas.janela = None  # guarda todas as esperas da execução, não só as últimas
+    dados.configurar_banco(banco)
+    motoristas = _motoristas()
+    if barreira is not None:
+        barreira.wait()
+
+    amostras = []
+    inicio = time.perf_counter()
+    fim = inicio + aquecimento + duracao
+    threads = [threading.Thread(target=_sessao, args=(n, mix, semente, motoristas, inicio, fim, pausa_ms, amostras),
+                                daemon=True) for n in sessoes]
+    for thread in threads:
+        thread.start()
+    time.sleep(aquecimento)
+    descartar = {tipo: len(metricas.duracoes('espera', tipo)) for tipo in ('leitura', 'escrita')}
+    for thread in threads:
+        thread.join()
+
+    fila = dados.obter_fila_avaliacoes.atual()
+    resultado = {
+        'amostras': amostras,
+        'esperas': {tipo: metricas.duracoes('espera', tipo)[n:] for tipo, n in descartar.items()},
+        'fila': fila.metricas() if fila is not None else None,
+    }
+    # Encerra a fila e fecha as conexões deste processo
+    dados.configurar_banco(banco)
+    return resultado
+
+
+def _estatisticas(duracoes, duracao):
+    if not duracoes:
+        return {'execucoes': 0, 'vazao_por_s': 0.0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(duracoes, [50, 95, 99])
+    return {'execucoes': len(duracoes), 'vazao_por_s': round(len(duracoes) / duracao, 2), 'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2), 'max_ms': round(max(duracoes), 2)}
+
+
+def resumir(resultados, duracao, aquecimento):
+    # Junta as amostras dos processos, descartando as ações iniciadas durante o aquecimento
+    amostras = [a for r in resultados for a in r['amostras'] if a[1] >= aquecimento]
+    erros = Counter(erro for _, _, _, erro in amostras if erro)
+
+    def grupo(filtro):
+        selecionadas = [a for a in amostras if filtro(a[0])]
+        estatisticas = _estatisticas([d for _, _, d, _ in selecionadas], duracao)
+        estatisticas['falhas'] = sum(1 for *_, erro in selecionadas if erro)
+        estatisticas['bloqueios'] = sum(1 for *_, erro in selecionadas if erro == ERRO_BLOQUEIO)
+        return estatisticas
+
+    esperas = {}
+    for tipo in ('leitura', 'escrita'):
+        duracoes = [d for r in resultados for d in r['esperas'][tipo]]
+        esperas[tipo] = {'total': len(duracoes), 'acima_limite': sum(1 for d in duracoes if d > LIMITE_ESPERA_MS),
+                         'tempo_total_ms': round(sum(duracoes), 1),
+                         'p95_ms': round(float(np.percentile(duracoes, 95)), 2) if duracoes else None,
+                         'max_ms': round(max(duracoes), 2) if duracoes else None}
+    return {
+        'acoes': {nome: grupo(lambda n, nome=nome: n == nome) for nome in sorted({a[0] for a in amostras})},
+        'leituras': grupo(lambda n: n not in ACOES_ESCRITA),
+        'escritas': grupo(lambda n: n in ACOES_ESCRITA),
+        'total': grupo(lambda n: True),
+        'esperas': esperas,
+        'fila': [r['fila'] for r in resultados if r['fila'] is not None],
+        'erros': dict(erros.most_common()),
+    }
+
+
+def executar(banco, sessoes=20, processos=1, mix=None, semente=42, duracao=30, aquecimento=2, pausa_ms=500):
+    mix = mix or MIX_PADRAO
+    parametros = dict(mix=mix, semente=semente, duracao=duracao, aquecimento=aquecimento, pausa_ms=pausa_ms)
+    grupos = [list(range(i, sessoes, processos)) for i in range(min(processos, sessoes))]
+    if len(grupos) == 1:
+        resultados = [executar_processo(banco, grupos[0], **parametros)]
+    else:
+        # Processos novos (spawn), cada um com suas conexões, cache e fila, liberados juntos após o preparo
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Manager() as gerenciador, concurrent.futures.ProcessPoolExecutor(
+                len(grupos), mp_context=contexto) as executor:
+            barreira = gerenciador.Barrier(len(grupos))
+            futuros = [executor.submit(executar_processo, banco, grupo, barreira=barreira, **parametros)
+                       for grupo in grupos]
+            resultados = [futuro.result() for futuro in futuros]
+    return {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'), 'banco': banco, 'sessoes': sessoes,
+            'processos': len(grupos), 'duracao_s': duracao, 'aquecimento_s': aquecimento, 'pausa_ms': pausa_ms,
+            'semente': semente, 'mix': {nome: round(peso / sum(mix.values()), 3) for nome, peso in mix.items()},
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'plataforma': platform.platform(),
+        },
+        **resumir(resultados, duracao, aquecimento),
+    }
+
+
+def _coluna(valor, formato='.1f', largura=9):
+    return f'{valor:>{largura}{formato}}' if valor is not None else f"{'-':>{largura}}"
+
+
+def imprimir_resultado(resultado):
+    meta = resultado['meta']
+    print(f"{meta['sessoes']} sessões em {meta['processos']} processo(s), {meta['duracao_s']} s "
+          f"(+{meta['aquecimento_s']} s de aquecimento), pausa média {meta['pausa_ms']} ms")
+    print('mix: ' + ', '.join(f'{nome} {peso:.0%}' for nome, peso in meta['mix'].items() if peso))
+    print(f"{'ação':<20} {'execuções':>9} {'por s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+          f"{'falhas':>7} {'bloqueios':>9}")
+    linhas = [*resultado['acoes'].items(), ('', None), ('(leituras)', resultado['leituras']),
+              ('(escritas)', resultado['escritas']), ('(total)', resultado['total'])]
+    for nome, r in linhas:
+        if r is None:
+            print()
+            continue
+        print(f"{nome:<20} {r['execucoes']:>9} {_coluna(r['vazao_por_s'], '.2f')} {_coluna(r['p50_ms'])} "
+              f"{_coluna(r['p95_ms'])} {_coluna(r['p99_ms'])} {_coluna(r['max_ms'])} {r['falhas']:>7} "
+              f"{r['bloqueios']:>9}")
+    print()
+    for tipo, e in resultado['esperas'].items():
+        print(f"espera por {tipo}: {e['total']} ({e['acima_limite']} acima de {LIMITE_ESPERA_MS:g} ms), "
+              f"p95 {_coluna(e['p95_ms'], '.2f', 0)} ms, máx {_coluna(e['max_ms'], '.2f', 0)} ms, "
+              f"total {e['tempo_total_ms']:.0f} ms")
+    for i, fila in enumerate(resultado['fila'], 1):
+        print(f"fila de avaliações (processo {i}): {fila['avaliacoes_gravadas']} avaliações em {fila['lotes']} lotes "
+              f"(média {fila['tamanho_medio_lote']:.1f}, maior {fila['maior_lote']}), {fila['falhas']} falhas")
+    for erro, quantidade in resultado['erros'].items():
+        print(f'erro: {quantidade}x {erro}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga com sessões simultâneas sobre uma cópia do banco')
+    parser.add_argument('--banco', default=dados.CAMINHO_BANCO, help='banco de origem, copiado antes da carga')
+    parser.add_argument('--sintetico', choices=benchmark.TAMANHOS,
+                        help='usa um banco sintético do benchmark em vez de copiar --banco')
+    parser.add_argument('--sessoes', type=int, default=20)
+    parser.add_argument('--processos', type=int, default=1, help='divide as sessões entre processos (réplicas)')
+    parser.add_argument('--duracao', type=float, default=30, help='segundos medidos, após o aquecimento')
+    parser.add_argument('--aquecimento', type=float, default=2)
+    parser.add_argument('--pausa-ms', type=float, default=500, help='pausa média entre ações de uma sessão')
+    parser.add_argument('--mix', help=f"pesos das ações, ex.: dashboard=3,avaliar=1 (ações: {', '.join(ACOES)})")
+    parser.add_argument('--escritas', type=float, help='fração das ações que gravam (0 a 1), mantendo o mix')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON para os resultados')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = ler_mix(args.mix) if args.mix else MIX_PADRAO
+        if args.escritas is not None:
+            mix = ajustar_escritas(mix, args.escritas)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.sessoes < 1 or args.processos < 1:
+        parser.error('--sessoes e --processos devem ser positivos')
+
+    if args.sintetico:
+        banco = benchmark.preparar_banco(*benchmark.TAMANHOS[args.sintetico], args.semente)
+    else:
+        try:
+            banco = copiar_banco(args.banco)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+    if not _motoristas():
+        parser.error(f'{banco} não tem motoristas; use --sintetico para gerar dados')
+    dados.configurar_banco(banco)
+
+    resultado = executar(banco, args.sessoes, args.processos, mix, args.semente, args.duracao, args.aquecimento,
+                         args.pausa_ms)
+    imprimir_resultado(resultado)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    return 1 if resultado['total']['bloqueios'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
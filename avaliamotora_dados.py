@@ -0,0 +1,2458 @@
+# Camada de dados do sistema de avaliação de motoristas: esquema, migrações, agregados, consultas e gravações.
+# Não depende do Streamlit e não toca o banco ao ser importada, para uso em scripts, jobs e benchmarks:
+#
+#     import avaliamotora_dados as dados
+#     dados.configurar_banco('copia.db')
+#     dados.init_database()
+#     ranking = dados.obter_ranking_pagina(tamanho=10)
+#
+# O app (avaliamotora.py) é apenas a interface sobre estas funções.
+import os
+import sqlite3
+import sys
+import threading
+import queue
+import time
+import functools
+import concurrent.futures
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from typing import NamedTuple, Optional, TypedDict
+import hashlib
+import json
+import logging
+import itertools
+import pandas as pd
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+# Recursos compartilhados pelo processo (conexões, cache, fila de gravação, motor analítico): uma instância,
+# criada no primeiro uso e preservada entre as execuções do script do Streamlit, como em st.cache_resource
+def _recurso_do_processo(funcao):
+    lock = threading.Lock()
+    instancia = []
+
+    @functools.wraps(funcao)
+    def obter():
+        if not instancia:
+            with lock:
+                if not instancia:
+                    instancia.append(funcao())
+        return instancia[0]
+
+    obter.atual = lambda: instancia[0] if instancia else None
+    obter.descartar = instancia.clear
+    return obter
+
+
+# Métricas de desempenho do processo, em janelas das últimas JANELA_METRICAS amostras por (tipo, nome):
+# 'dados' (funções de dados, com linhas devolvidas), 'espera' (conexão de leitura ou trava de escrita),
+# 'grafico' (montagem e envio de figuras) e as execuções de cada página, com o tempo dividido entre as partes.
+# Chamadas de dados acima de LIMITE_CONSULTA_LENTA_MS vão para o log de lentas com as consultas que executaram.
+JANELA_METRICAS = 1000
+LIMITE_CONSULTA_LENTA_MS = 200
+MAX_CONSULTAS_LENTAS = 200
+MAX_SQL_POR_CHAMADA = 20
+MAX_TAMANHO_SQL = 2000
+CAMINHO_METRICAS = os.environ.get('AVALIAMOTORA_METRICAS', 'metricas.json')
+
+
+class Metricas:
+    def __init__(self, janela=JANELA_METRICAS, limite_lento_ms=LIMITE_CONSULTA_LENTA_MS,
+                 max_lentas=MAX_CONSULTAS_LENTAS):
+        self.janela = janela
+        self.limite_lento_ms = limite_lento_ms
+        self.iniciado_em = datetime.now()
+
+        self._lock = threading.Lock()
+        self._amostras = {}  # (tipo, nome) -> deque de (duração ms, linhas)
+        self._chamadas = Counter()
+        self._paginas = {}  # página -> deque de {parte: ms}
+        self.lentas = deque(maxlen=max_lentas)
+        # Por thread (cada sessão do Streamlit executa o script em sua thread): SQL da chamada de dados em
+        # curso e tempos acumulados por tipo durante a execução da página
+        self._local = threading.local()
+
+    def registrar(self, tipo, nome, duracao_ms, linhas=None):
+        with self._lock:
+            amostras = self._amostras.get((tipo, nome))
+            if amostras is None:
+                amostras = self._amostras[(tipo, nome)] = deque(maxlen=self.janela)
+            amostras.append((duracao_ms, linhas))
+            self._chamadas[(tipo, nome)] += 1
+        acumulado = getattr(self._local, 'acumulado', None)
+        if acumulado is not None:
+            acumulado[tipo] = acumulado.get(tipo, 0.0) + duracao_ms
+
+    @contextmanager
+    def medir(self, tipo, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(tipo, nome, 1000 * (time.perf_counter() - inicio))
+
+    def duracoes(self, tipo, nome):
+        # Durações (ms) guardadas na janela de (tipo, nome)
+        with self._lock:
+            return [duracao for duracao, _ in self._amostras.get((tipo, nome), ())]
+
+    def rastreando_sql(self):
+        return getattr(self._local, 'sql', None) is not None
+
+    def rastrear_sql(self, sql):
+        # Callback de set_trace_callback: guarda o SQL da chamada instrumentada em curso
+        comandos = getattr(self._local, 'sql', None)
+        if comandos is not None and len(comandos) < MAX_SQL_POR_CHAMADA:
+            comandos.append(sql[:MAX_TAMANHO_SQL])
+
+    def iniciar_chamada(self):
+        # Retorna se é a chamada de dados mais externa da thread; as internas contam dentro dela
+        if getattr(self._local, 'sql', None) is not None:
+            return False
+        self._local.sql = []
+        return True
+
+    def concluir_chamada(self, nome, duracao_ms, linhas, args, kwargs):
+        sql, self._local.sql = self._local.sql, None
+        self.registrar('dados', nome, duracao_ms, linhas)
+        if duracao_ms >= self.limite_lento_ms:
+            self.lentas.append({'data': datetime.now().isoformat(timespec='seconds'), 'funcao': nome,
+                                'duracao_ms': round(duracao_ms, 1), 'linhas': linhas,
+                                'argumentos': repr((args, kwargs))[:MAX_TAMANHO_SQL], 'sql': sql})
+
+    def iniciar_execucao(self):
+        self._local.acumulado = {}
+
+    def em_execucao(self):
+        # Se há uma execução de página em curso nesta thread (entre iniciar_execucao e concluir_execucao)
+        return getattr(self._local, 'acumulado', None) is not None
+
+    def concluir_execucao(self, pagina, total_ms):
+        # Divide o tempo da página: dados (SQLite + conversão para pandas, incluindo esperas por conexão),
+        # gráficos (plotly) e o restante, gasto no script e na emissão dos elementos do Streamlit
+        acumulado, self._local.acumulado = getattr(self._local, 'acumulado', None) or {}, None
+        partes = {'total': total_ms, 'dados': acumulado.get('dados', 0.0), 'espera': acumulado.get('espera', 0.0),
+                  'grafico': acumulado.get('grafico', 0.0)}
+        partes['streamlit'] = max(total_ms - partes['dados'] - partes['grafico'], 0.0)
+        with self._lock:
+            execucoes = self._paginas.get(pagina)
+            if execucoes is None:
+                execucoes = self._paginas[pagina] = deque(maxlen=self.janela)
+            execucoes.append(partes)
+        return partes
+
+    def resumo(self):
+        with self._lock:
+            amostras = {chave: list(valores) for chave, valores in self._amostras.items()}
+            chamadas = dict(self._chamadas)
+        linhas = []
+        for (tipo, nome), valores in sorted(amostras.items()):
+            duracoes = np.array([duracao for duracao, _ in valores])
+            contagens = [n for _, n in valores if n is not None]
+            p50, p95, p99 = np.percentile(duracoes, [50, 95, 99])
+            linhas.append({'tipo': tipo, 'nome': nome, 'chamadas': chamadas[(tipo, nome)], 'p50_ms': p50,
+                           'p95_ms': p95, 'p99_ms': p99, 'max_ms': duracoes.max(),
+                           'linhas_media': sum(contagens) / len(contagens) if contagens else None})
+        return pd.DataFrame(linhas, columns=['tipo', 'nome', 'chamadas', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+                                             'linhas_media'])
+
+    def resumo_paginas(self):
+        with self._lock:
+            paginas = {pagina: list(execucoes) for pagina, execucoes in self._paginas.items()}
+        linhas = []
+        for pagina, execucoes in sorted(paginas.items()):
+            partes = pd.DataFrame(execucoes)
+            linha = {'pagina': pagina, 'execucoes': len(execucoes),
+                     'p95_ms': float(np.percentile(partes['total'], 95))}
+            linha.update({f'{parte}_p50_ms': float(partes[parte].median()) for parte in partes.columns})
+            linhas.append(linha)
+        return pd.DataFrame(linhas)
+
+    def exportar(self, caminho=None, extras=None):
+        # Grava as métricas em JSON (arquivo local) e retorna o caminho
+        caminho = caminho or CAMINHO_METRICAS
+        conteudo = {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'iniciado_em': self.iniciado_em.isoformat(timespec='seconds'),
+            'limite_lento_ms': self.limite_lento_ms,
+            'metricas': self.resumo().to_dict('records'),
+            'paginas': self.resumo_paginas().to_dict('records'),
+            'lentas': list(self.lentas),
+            **(extras or {}),
+        }
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(conteudo, arquivo, ensure_ascii=False, indent=2, default=float)
+        return caminho
+
+
+@_recurso_do_processo
+def obter_metricas():
+    return Metricas()
+
+
+def _contar_linhas(valor):
+    # Linhas devolvidas por uma função de dados; None quando o resultado não é um conjunto de linhas
+    if isinstance(valor, Pagina):
+        valor = valor.linhas
+    elif isinstance(valor, PainelMotorista):
+        valor = valor.ultimas
+    if isinstance(valor, (pd.DataFrame, list)):
+        return len(valor)
+    if isinstance(valor, (dict, MotoristaCadastro)):
+        return 1
+    return 0 if valor is None else None
+
+
+def instrumentado(funcao):
+    # Mede a função de dados (incluindo acertos do cache) e registra as lentas com o SQL executado
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        metricas = obter_metricas()
+        if not metricas.iniciar_chamada():
+            return funcao(*args, **kwargs)
+        inicio = time.perf_counter()
+        valor = None
+        try:
+            valor = funcao(*args, **kwargs)
+            return valor
+        finally:
+            metricas.concluir_chamada(funcao.__name__, 1000 * (time.perf_counter() - inicio), _contar_linhas(valor),
+                                      args, kwargs)
+    return envoltorio
+
+
+# Gerenciador de conexões compartilhado pelo processo
+# Um único escritor (protegido por lock) e um pool de leitores, todos configurados uma vez com WAL.
+# Arquivo do banco: variável de ambiente AVALIAMOTORA_BANCO ou configurar_banco() antes do primeiro acesso
+CAMINHO_BANCO = os.environ.get('AVALIAMOTORA_BANCO', 'motoristas.db')
+
+
+class GerenciadorConexoes:
+    def __init__(self, caminho, max_leitores=4, busy_timeout_ms=5000, cache_kb=16384, metricas=None,
+                 espera_leitor_s=30):
+        self.caminho = caminho
+        self.metricas = metricas
+        self.max_leitores = max_leitores
+        self.espera_leitor_s = espera_leitor_s
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_kb = cache_kb
+
+        self._lock_escrita = threading.RLock()
+        self._profundidade_escrita = 0
+        self._escritor = None
+
+        # Entidades alteradas na transação corrente (ver registrar_alteracao) e callbacks
+        # chamados com esse conjunto após o COMMIT, usados para invalidar caches locais
+        self._entidades_alteradas = set()
+        self.ouvintes_commit = []
+
+        self._leitores = queue.Queue()
+        self._lock_leitores = threading.Lock()
+        self._leitores_criados = 0
+
+    def _abrir(self, somente_leitura=False):
+        # isolation_level=None: transações controladas explicitamente em escrita()
+        conn = sqlite3.connect(self.caminho, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_kb)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        if somente_leitura:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def _registrar_espera(self, tipo, inicio):
+        if self.metricas is not None:
+            self.metricas.registrar('espera', tipo, 1000 * (time.perf_counter() - inicio))
+
+    def _obter_leitor(self):
+        try:
+            return self._leitores.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock_leitores:
+            criar = self._leitores_criados < self.max_leitores
+            if criar:
+                self._leitores_criados += 1
+        if not criar:
+            # Pool esgotado: aguarda um leitor ser devolvido, mas não para sempre (um leitor que não voltou ou
+            # consultas lentas sob carga travariam todas as sessões sem nenhum erro)
+            try:
+                return self._leitores.get(timeout=self.espera_leitor_s)
+            except queue.Empty:
+                raise sqlite3.OperationalError(
+                    f"Nenhuma conexão de leitura livre após {self.espera_leitor_s} s "
+                    f"(pool de {self.max_leitores} leitores esgotado)") from None
+        try:
+            return self._abrir(somente_leitura=True)
+        except Exception:
+            with self._lock_leitores:
+                self._leitores_criados -= 1
+            raise
+
+    def fechar(self):
+        # Fecha o escritor e os leitores ociosos (ex.: ao trocar de banco em configurar_banco)
+        with self._lock_escrita:
+            if self._escritor is not None:
+                self._escritor.close()
+                self._escritor = None
+        while True:
+            try:
+                self._leitores.get_nowait().close()
+            except queue.Empty:
+                break
+
+    @contextmanager
+    def leitura(self):
+        inicio = time.perf_counter()
+        conn = self._obter_leitor()
+        self._registrar_espera('leitura', inicio)
+        # Consultas feitas dentro de uma função de dados instrumentada são rastreadas para o log de lentas.
+        # Só nos leitores: nas gravações em lote o SQLite expandiria cada comando do executemany.
+        rastrear = self.metricas is not None and self.metricas.rastreando_sql()
+        if rastrear:
+            conn.set_trace_callback(self.metricas.rastrear_sql)
+        try:
+            yield conn
+        finally:
+            if rastrear:
+                conn.set_trace_callback(None)
+            self._leitores.put(conn)
+
+    @contextmanager
+    def escrita(self):
+        # Reentrante: chamadas aninhadas na mesma thread participam da transação externa
+        inicio = time.perf_counter()
+        with self._lock_escrita:
+            if self._escritor is None:
+                self._escritor = self._abrir()
+            conn = self._escritor
+
+            if self._profundidade_escrita > 0:
+                self._profundidade_escrita += 1
+                try:
+                    yield conn
+                finally:
+                    self._profundidade_escrita -= 1
+                return
+
+            conn.execute('BEGIN IMMEDIATE')
+            self._registrar_espera('escrita', inicio)
+            self._profundidade_escrita = 1
+            self._entidades_alteradas = set()
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            finally:
+                entidades = self._entidades_alteradas
+                self._profundidade_escrita = 0
+                self._entidades_alteradas = set()
+
+            # Fora do try: a gravação já foi confirmada, então a falha de um ouvinte não pode chegar a quem
+            # chamou como se a escrita tivesse falhado (quem repete a gravação duplicaria os registros)
+            for ouvinte in self.ouvintes_commit:
+                try:
+                    ouvinte(entidades)
+                except Exception:
+                    logger.exception("Ouvinte de commit %r falhou após o COMMIT", ouvinte)
+
+    def registrar_alteracao(self, conn, entidade, operacao, registro_id=None):
+        # Grava no log de alterações, na mesma transação da mutação, para que todas as réplicas
+        # (processos apontando para o mesmo banco) saibam o que invalidar
+        conn.execute('INSERT INTO alteracoes (entidade, operacao, registro_id, data) VALUES (?, ?, ?, ?)',
+                     (entidade, operacao, registro_id, datetime.now()))
+        self._entidades_alteradas.add(entidade)
+
+
+@_recurso_do_processo
+def obter_conexoes():
+    return GerenciadorConexoes(CAMINHO_BANCO, metricas=obter_metricas())
+
+
+# Entidades registradas no log de alterações; cada leitura em cache declara de quais depende
+ENTIDADES = ('motoristas', 'veiculos', 'avaliacoes')
+
+
+# Cache de resultados das funções de leitura, compartilhado pelo processo.
+# Cada entidade tem um contador de versão local. A chave inclui as versões das entidades de que a
+# consulta depende: uma alteração (local ou vista no log de alterações de outra réplica) descarta
+# apenas as entradas dependentes dela. Os valores são compartilhados entre sessões e não devem ser
+# modificados por quem os recebe.
+class CacheConsultas:
+    def __init__(self, max_entradas=256, max_bytes=256 * 1024 * 1024, ttl_segundos=600,
+                 intervalo_sincronizacao=1.0):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self.intervalo_sincronizacao = intervalo_sincronizacao
+
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (criado_em, tamanho, dependencias, valor)
+        self._bytes = 0
+        self._versoes = dict.fromkeys(ENTIDADES, 0)
+        self._seq_vista = None
+        self._proxima_sincronizacao = 0.0
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def _tamanho(valor):
+        if isinstance(valor, pd.DataFrame):
+            return int(valor.memory_usage(index=True, deep=True).sum())
+        return sys.getsizeof(valor)
+
+    def _remover(self, chave):
+        _, tamanho, _, _ = self._entradas.pop(chave)
+        self._bytes -= tamanho
+
+    def versoes(self, dependencias):
+        with self._lock:
+            return tuple(self._versoes[entidade] for entidade in dependencias)
+
+    def invalidar(self, entidades):
+        entidades = set(entidades)
+        if not entidades:
+            return
+        with self._lock:
+            for entidade in entidades:
+                self._versoes[entidade] = self._versoes.get(entidade, 0) + 1
+            for chave in [c for c, entrada in self._entradas.items() if entidades & entrada[2]]:
+                self._remover(chave)
+
+    def sincronizar(self, gerenciador):
+        # Consulta o log de alterações no máximo uma vez por intervalo; MAX(seq) é uma busca na chave primária
+        with self._lock:
+            agora = time.monotonic()
+            if agora < self._proxima_sincronizacao:
+                return
+            self._proxima_sincronizacao = agora + self.intervalo_sincronizacao
+            seq_vista = self._seq_vista
+
+        with gerenciador.leitura() as conn:
+            seq_min, seq_max = conn.execute(
+                'SELECT (SELECT MIN(seq) FROM alteracoes), (SELECT MAX(seq) FROM alteracoes)').fetchone()
+            if seq_max is None or seq_max == seq_vista:
+                return
+            if seq_vista is None or seq_vista < seq_min - 1:
+                # Primeira sincronização ou log podado além do último visto: invalida tudo
+                entidades = set(ENTIDADES)
+            else:
+                entidades = {linha[0] for linha in conn.execute(
+                    'SELECT DISTINCT entidade FROM alteracoes WHERE seq > ? AND seq <= ?', (seq_vista, seq_max))}
+
+        self.invalidar(entidades)
+        with self._lock:
+            if self._seq_vista is None or seq_max > self._seq_vista:
+                self._seq_vista = seq_max
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or time.monotonic() - entrada[0] > self.ttl_segundos:
+                if entrada is not None:
+                    self._remover(chave)
+                self.falhas += 1
+                return False, None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return True, entrada[3]
+
+    def guardar(self, chave, dependencias, versoes, valor):
+        tamanho = self._tamanho(valor)
+        with self._lock:
+            # Resultado calculado antes de uma invalidação concorrente: não é guardado
+            if tuple(self._versoes[entidade] for entidade in dependencias) != versoes or tamanho > self.max_bytes:
+                return
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (time.monotonic(), tamanho, frozenset(dependencias), valor)
+            self._bytes += tamanho
+            # Despeja as menos usadas recentemente até caber nos limites
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                self._remover(next(iter(self._entradas)))
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas, 'entradas': len(self._entradas),
+                    'bytes': self._bytes}
+
+
+@_recurso_do_processo
+def obter_cache():
+    cache = CacheConsultas()
+    obter_conexoes().ouvintes_commit.append(cache.invalidar)
+    return cache
+
+
+def em_cache(*dependencias):
+    # Memoriza o resultado por (função, argumentos, versões das entidades das quais a consulta depende)
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            cache = obter_cache()
+            cache.sincronizar(obter_conexoes())
+            # As versões são lidas antes da consulta: uma escrita concorrente impede que o resultado seja guardado
+            versoes = cache.versoes(dependencias)
+            chave = (funcao.__name__, args, tuple(sorted(kwargs.items())), versoes)
+            encontrado, valor = cache.obter(chave)
+            if encontrado:
+                return valor
+            valor = funcao(*args, **kwargs)
+            cache.guardar(chave, dependencias, versoes, valor)
+            return valor
+        return envoltorio
+    return decorador
+
+
+# Critérios de avaliação (colunas de nota 1 a 5 em avaliacoes)
+CRITERIOS = ['custo_manutencao', 'disponibilidade_frota', 'metas_producao', 'seguranca_trabalho',
+             'realizacao_checklist', 'conhecimento_manutencao', 'comunicacao_assertiva']
+
+
+# Tipos de retorno das funções públicas. Dicionários são TypedDict e pares são NamedTuple, de modo que o
+# acesso por chave, índice ou desempacotamento continua funcionando.
+class EstatisticasMotorista(TypedDict):
+    media_geral: float
+    media_custo_manutencao: float
+    media_disponibilidade_frota: float
+    media_metas_producao: float
+    media_seguranca_trabalho: float
+    media_realizacao_checklist: float
+    media_conhecimento_manutencao: float
+    media_comunicacao_assertiva: float
+    total_avaliacoes: int
+    ultima_avaliacao: Optional[str]
+
+
+class ResumoSistema(TypedDict):
+    total_motoristas: int
+    total_veiculos: int
+    total_avaliacoes: int
+    media_sistema: float
+
+
+class PosicaoRanking(TypedDict):
+    id: int
+    nome: str
+    placa: Optional[str]
+    modelo: Optional[str]
+    media_geral: float
+    total_avaliacoes: int
+    posicao: int
+    faixa: int
+    total_ranqueados: int
+
+
+class MotoristaCadastro(NamedTuple):
+    id: int
+    nome: str
+    veiculo_id: Optional[int]
+    placa: Optional[str]
+    modelo: Optional[str]
+    data_cadastro: str
+
+
+# Opção dos seletores com busca
+class Opcao(NamedTuple):
+    id: int
+    rotulo: str
+
+
+# Página de uma listagem por chave; proximo_cursor é o `apos` da página seguinte (None na última)
+class Pagina(NamedTuple):
+    linhas: pd.DataFrame
+    proximo_cursor: Optional[tuple]
+
+
+class Estimativa(NamedTuple):
+    total: int
+    exata: bool
+
+
+class PainelMotorista(NamedTuple):
+    estatisticas: Optional[EstatisticasMotorista]
+    ultimas: pd.DataFrame
+
+
+class ResultadoImportacao(TypedDict):
+    inseridos: int
+    atualizados: int
+    ignorados: int
+    erros: list[str]
+
+
+class CheckpointImportacao(TypedDict):
+    linhas_processadas: int
+    inseridos: int
+    atualizados: int
+    ignorados: int
+    total_erros: int
+
+
+class ResultadoImportacaoStreaming(CheckpointImportacao):
+    erros: list[str]
+    retomada_de: int
+
+
+class ResultadoImportacaoAvaliacoes(TypedDict):
+    inseridos: int
+    erros: list[str]
+
+
+class MetricasFila(TypedDict):
+    profundidade_fila: int
+    lotes: int
+    avaliacoes_gravadas: int
+    falhas: int
+    tamanho_medio_lote: float
+    maior_lote: int
+    ultimo_lote: int
+    tempo_medio_lote_ms: float
+
+
+class RelatorioInicializacao(TypedDict):
+    banco: str
+    concluida_em: str
+    versao_anterior: int
+    versao_esquema: int
+    etapas_ms: dict[str, float]
+    total_ms: float
+
+
+# Inicialização do banco de dados
+@instrumentado
+def init_database() -> None:
+    with obter_conexoes().escrita() as conn:
+        cursor = conn.cursor()
+
+        # Tabela de motoristas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS motoristas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                veiculo_id INTEGER,
+                data_cadastro DATE NOT NULL,
+                FOREIGN KEY (veiculo_id) REFERENCES veiculos (id)
+            )
+        ''')
+
+        # Tabela de veículos
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS veiculos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                placa TEXT NOT NULL UNIQUE,
+                modelo TEXT NOT NULL,
+                tipo_veiculo TEXT NOT NULL,
+                proprio_alugado TEXT NOT NULL,
+                cidade TEXT NOT NULL,
+                ano INTEGER NOT NULL
+            )
+        ''')
+
+        # Tabela de avaliações
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS avaliacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                motorista_id INTEGER,
+                custo_manutencao INTEGER NOT NULL,
+                disponibilidade_frota INTEGER NOT NULL,
+                metas_producao INTEGER NOT NULL,
+                seguranca_trabalho INTEGER NOT NULL,
+                realizacao_checklist INTEGER NOT NULL,
+                conhecimento_manutencao INTEGER NOT NULL,
+                comunicacao_assertiva INTEGER NOT NULL,
+                comentario TEXT,
+                avaliador TEXT,
+                data_avaliacao DATETIME NOT NULL,
+                FOREIGN KEY (motorista_id) REFERENCES motoristas (id)
+            )
+        ''')
+
+        # Controle de versão do esquema
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                versao INTEGER PRIMARY KEY,
+                descricao TEXT NOT NULL,
+                aplicada_em DATETIME NOT NULL
+            )
+        ''')
+
+    aplicar_migracoes()
+    podar_alteracoes()
+
+
+# Migrações do esquema: (versão, descrição, passos). Cada passo é um SQL ou uma função que recebe a conexão.
+# Os passos devem ser idempotentes; cada migração roda em sua própria transação.
+MIGRACOES = [
+    (1, 'Índices para avaliações por motorista, motoristas por veículo e ordenação por nome', [
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_motorista_data ON avaliacoes (motorista_id, data_avaliacao)',
+        '''CREATE INDEX IF NOT EXISTS idx_avaliacoes_motorista_notas ON avaliacoes (
+               motorista_id, custo_manutencao, disponibilidade_frota, metas_producao, seguranca_trabalho,
+               realizacao_checklist, conhecimento_manutencao, comunicacao_assertiva)''',
+        'CREATE INDEX IF NOT EXISTS idx_motoristas_veiculo ON motoristas (veiculo_id)',
+        'CREATE INDEX IF NOT EXISTS idx_motoristas_nome ON motoristas (nome)',
+    ]),
+    (2, 'Estatísticas do planejador de consultas', [
+        'ANALYZE',
+    ]),
+    (3, 'Agregados materializados por motorista (motorista_stats)', [
+        f'''CREATE TABLE IF NOT EXISTS motorista_stats (
+               motorista_id INTEGER PRIMARY KEY,
+               total INTEGER NOT NULL,
+               {', '.join(f'soma_{c} INTEGER NOT NULL' for c in CRITERIOS)},
+               ultima_avaliacao DATETIME,
+               FOREIGN KEY (motorista_id) REFERENCES motoristas (id)
+           )''',
+        lambda conn: _reconstruir_totais(conn),
+    ]),
+    (4, 'Checkpoints de importações em streaming', [
+        '''CREATE TABLE IF NOT EXISTS importacao_checkpoint (
+               chave TEXT PRIMARY KEY,
+               linhas_processadas INTEGER NOT NULL,
+               inseridos INTEGER NOT NULL,
+               atualizados INTEGER NOT NULL,
+               ignorados INTEGER NOT NULL,
+               total_erros INTEGER NOT NULL,
+               atualizado_em DATETIME NOT NULL
+           )''',
+    ]),
+    (5, 'Log de alterações para invalidação de cache entre processos', [
+        '''CREATE TABLE IF NOT EXISTS alteracoes (
+               seq INTEGER PRIMARY KEY AUTOINCREMENT,
+               entidade TEXT NOT NULL,
+               operacao TEXT NOT NULL,
+               registro_id INTEGER,
+               data DATETIME NOT NULL
+           )''',
+        'CREATE INDEX IF NOT EXISTS idx_alteracoes_data ON alteracoes (data)',
+    ]),
+    (6, 'Índices de busca textual (FTS5) para os seletores de veículo e motorista', [
+        # Índices de conteúdo externo: guardam só os termos e são mantidos pelos gatilhos abaixo
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS busca_veiculos USING fts5(
+               placa, modelo, cidade, content='veiculos', content_rowid='id',
+               tokenize='unicode61 remove_diacritics 2')''',
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS busca_motoristas USING fts5(
+               nome, content='motoristas', content_rowid='id', tokenize='unicode61 remove_diacritics 2')''',
+        '''CREATE TRIGGER IF NOT EXISTS veiculos_busca_inserir AFTER INSERT ON veiculos BEGIN
+               INSERT INTO busca_veiculos (rowid, placa, modelo, cidade)
+               VALUES (new.id, new.placa, new.modelo, new.cidade);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS veiculos_busca_excluir AFTER DELETE ON veiculos BEGIN
+               INSERT INTO busca_veiculos (busca_veiculos, rowid, placa, modelo, cidade)
+               VALUES ('delete', old.id, old.placa, old.modelo, old.cidade);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS veiculos_busca_atualizar AFTER UPDATE ON veiculos BEGIN
+               INSERT INTO busca_veiculos (busca_veiculos, rowid, placa, modelo, cidade)
+               VALUES ('delete', old.id, old.placa, old.modelo, old.cidade);
+               INSERT INTO busca_veiculos (rowid, placa, modelo, cidade)
+               VALUES (new.id, new.placa, new.modelo, new.cidade);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS motoristas_busca_inserir AFTER INSERT ON motoristas BEGIN
+               INSERT INTO busca_motoristas (rowid, nome) VALUES (new.id, new.nome);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS motoristas_busca_excluir AFTER DELETE ON motoristas BEGIN
+               INSERT INTO busca_motoristas (busca_motoristas, rowid, nome) VALUES ('delete', old.id, old.nome);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS motoristas_busca_atualizar AFTER UPDATE OF nome ON motoristas BEGIN
+               INSERT INTO busca_motoristas (busca_motoristas, rowid, nome) VALUES ('delete', old.id, old.nome);
+               INSERT INTO busca_motoristas (rowid, nome) VALUES (new.id, new.nome);
+           END''',
+        "INSERT INTO busca_veiculos (busca_veiculos) VALUES ('rebuild')",
+        "INSERT INTO busca_motoristas (busca_motoristas) VALUES ('rebuild')",
+    ]),
+    (7, 'Índice para o histórico de avaliações filtrado por avaliador', [
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_motorista_avaliador ON avaliacoes (motorista_id, avaliador, data_avaliacao)',
+        'ANALYZE idx_avaliacoes_motorista_avaliador',
+    ]),
+    (8, 'Agregados diários e mensais por motorista e da frota', [
+        *(f'''CREATE TABLE IF NOT EXISTS {tabela} (
+                  motorista_id INTEGER NOT NULL,
+                  periodo TEXT NOT NULL,
+                  total INTEGER NOT NULL,
+                  {', '.join(f'soma_{c} INTEGER NOT NULL' for c in CRITERIOS)},
+                  PRIMARY KEY (motorista_id, periodo)
+              ) WITHOUT ROWID''' for tabela in ('avaliacoes_diario', 'avaliacoes_mensal')),
+        # Rankings por janela leem todos os motoristas de um intervalo de períodos
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_diario_periodo ON avaliacoes_diario (periodo)',
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_mensal_periodo ON avaliacoes_mensal (periodo)',
+        lambda conn: _reconstruir_periodos(conn),
+    ]),
+    (9, 'Cubo de médias por cidade, tipo de veículo e próprio/alugado', [
+        f'''CREATE TABLE IF NOT EXISTS segmentos_stats (
+               cidade TEXT NOT NULL,
+               tipo_veiculo TEXT NOT NULL,
+               proprio_alugado TEXT NOT NULL,
+               total INTEGER NOT NULL,
+               {', '.join(f'soma_{c} INTEGER NOT NULL' for c in CRITERIOS)},
+               PRIMARY KEY (cidade, tipo_veiculo, proprio_alugado)
+           ) WITHOUT ROWID''',
+        lambda conn: _reconstruir_segmentos(conn),
+    ]),
+]
+
+
+def versao_esquema(conn) -> int:
+    return conn.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version').fetchone()[0]
+
+
+VERSAO_ESQUEMA = max(versao for versao, _, _ in MIGRACOES)
+
+
+def ler_versao_esquema() -> int:
+    # Verificação só de leitura; 0 num banco novo, ainda sem schema_version
+    with obter_conexoes().leitura() as conn:
+        try:
+            return versao_esquema(conn)
+        except sqlite3.OperationalError:
+            return 0
+
+
+def aplicar_migracoes() -> list[int]:
+    aplicadas = []
+    for versao, descricao, passos in MIGRACOES:
+        with obter_conexoes().escrita() as conn:
+            # Reverifica dentro da transação: outro processo pode ter aplicado a migração
+            if versao <= versao_esquema(conn):
+                continue
+            for passo in passos:
+                if callable(passo):
+                    passo(conn)
+                else:
+                    conn.execute(passo)
+            conn.execute('INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (?, ?, ?)',
+                         (versao, descricao, datetime.now()))
+            aplicadas.append(versao)
+    return aplicadas
+
+
+# Agregados por período: tabela -> expressão do período sobre data_avaliacao (texto ISO).
+# Cada tabela guarda uma linha por motorista e período, mais a linha da frota inteira (motorista_id = ID_FROTA).
+AGREGADOS_PERIODO = {
+    'avaliacoes_diario': 'substr(a.data_avaliacao, 1, 10)',
+    'avaliacoes_mensal': 'substr(a.data_avaliacao, 1, 7)',
+}
+
+ID_FROTA = 0
+
+# Cubo de segmentos: uma linha por combinação de cidade, tipo de veículo e próprio/alugado, incluindo os
+# subtotais em que uma ou mais dimensões valem TODOS_SEGMENTOS. As avaliações contam no segmento do
+# veículo atual do motorista.
+DIMENSOES_SEGMENTO = ['cidade', 'tipo_veiculo', 'proprio_alugado']
+TODOS_SEGMENTOS = '*'
+SEM_VEICULO = 'Sem veículo'
+
+# Consultas SQL de leitura
+SQL_LISTAR_MOTORISTAS = '''
+    SELECT m.id, m.nome, v.placa, v.modelo, v.tipo_veiculo, v.cidade, m.data_cadastro
+    FROM motoristas m
+    LEFT JOIN veiculos v ON m.veiculo_id = v.id
+    ORDER BY m.nome
+'''
+
+SQL_LISTAR_VEICULOS = 'SELECT * FROM veiculos ORDER BY placa'
+
+# Listagem paginada por chave (nome, id): cada página continua a partir da última linha da anterior
+SQL_PAGINA_MOTORISTAS = '''
+    SELECT m.id, m.nome, v.placa, v.modelo, v.tipo_veiculo, v.cidade, m.data_cadastro
+    FROM motoristas m
+    LEFT JOIN veiculos v ON m.veiculo_id = v.id
+    WHERE {filtros}
+    ORDER BY m.nome, m.id
+    LIMIT ?
+'''
+
+SQL_CONTAR_MOTORISTAS = '''
+    SELECT COUNT(*)
+    FROM motoristas m
+    LEFT JOIN veiculos v ON m.veiculo_id = v.id
+    WHERE {filtros}
+'''
+
+SQL_MOTORISTA_POR_ID = '''
+    SELECT m.id, m.nome, m.veiculo_id, v.placa, v.modelo, m.data_cadastro
+    FROM motoristas m
+    LEFT JOIN veiculos v ON m.veiculo_id = v.id
+    WHERE m.id = ?
+'''
+
+SQL_AVALIACOES_MOTORISTA = '''
+    SELECT * FROM avaliacoes 
+    WHERE motorista_id = ? 
+    ORDER BY data_avaliacao DESC
+'''
+
+# Histórico paginado por chave (data_avaliacao, id), do mais recente para o mais antigo
+MEDIA_AVALIACAO = f"({' + '.join(CRITERIOS)}) / 7.0"
+
+SQL_HISTORICO_AVALIACOES = f'''
+    SELECT id, data_avaliacao, avaliador, {MEDIA_AVALIACAO} AS media, {', '.join(CRITERIOS)}, comentario
+    FROM avaliacoes
+    WHERE {{filtros}}
+    ORDER BY data_avaliacao DESC, id DESC
+    LIMIT ?
+'''
+
+# Contagem limitada: lê no máximo `limite` entradas do índice e informa se parou antes do fim
+SQL_CONTAR_HISTORICO = '''
+    SELECT COUNT(*) FROM (
+        SELECT 1 FROM avaliacoes
+        WHERE {filtros}
+        LIMIT ?
+    )
+'''
+
+SQL_AVALIADORES_MOTORISTA = '''
+    SELECT DISTINCT avaliador FROM avaliacoes
+    WHERE motorista_id = ? AND avaliador IS NOT NULL
+    ORDER BY avaliador
+'''
+
+# Busca dos seletores: no máximo N opções (id, rótulo), com o rótulo montado no próprio SQL
+ROTULO_VEICULO = "v.placa || ' - ' || v.modelo || ' (' || v.cidade || ')'"
+
+ROTULO_MOTORISTA = "m.nome || COALESCE(' - ' || v.placa || ' ' || v.modelo, '')"
+
+FILTRO_BUSCA_VEICULOS = 'v.id IN (SELECT rowid FROM busca_veiculos WHERE busca_veiculos MATCH ?)'
+
+# Motorista encontrado pelo nome ou pela placa/modelo/cidade do veículo
+FILTRO_BUSCA_MOTORISTAS = '''(m.id IN (SELECT rowid FROM busca_motoristas WHERE busca_motoristas MATCH ?)
+           OR m.veiculo_id IN (SELECT rowid FROM busca_veiculos WHERE busca_veiculos MATCH ?))'''
+
+SQL_BUSCAR_VEICULOS = f'''
+    SELECT v.id, {ROTULO_VEICULO} AS rotulo
+    FROM veiculos v
+    WHERE {{filtro}}
+    ORDER BY v.placa
+    LIMIT ?
+'''
+
+SQL_BUSCAR_MOTORISTAS = f'''
+    SELECT m.id, {ROTULO_MOTORISTA} AS rotulo
+    FROM motoristas m
+    LEFT JOIN veiculos v ON m.veiculo_id = v.id
+    WHERE {{filtro}}
+    ORDER BY m.nome, m.id
+    LIMIT ?
+'''
+
+# Expressões sobre motorista_stats
+SOMA_NOTAS_STATS = ' + '.join(f's.soma_{c}' for c in CRITERIOS)
+
+SQL_ESTATISTICAS_MOTORISTA = f'''
+    SELECT total, {', '.join(f'soma_{c}' for c in CRITERIOS)}, ultima_avaliacao
+    FROM motorista_stats
+    WHERE motorista_id = ?
+'''
+
+# Painel do motorista em uma ida ao banco: agregados de motorista_stats repetidos em cada uma das últimas K
+# avaliações, lidas pelo índice (motorista_id, data_avaliacao) de trás para frente
+SQL_DASHBOARD_MOTORISTA = f'''
+    SELECT s.total, {', '.join(f's.soma_{c}' for c in CRITERIOS)}, s.ultima_avaliacao,
+           a.id, {', '.join(f'a.{c}' for c in CRITERIOS)}, a.comentario, a.avaliador, a.data_avaliacao
+    FROM motorista_stats s
+    LEFT JOIN (
+        SELECT * FROM avaliacoes
+        WHERE motorista_id = ?
+        ORDER BY data_avaliacao DESC
+        LIMIT ?
+    ) a
+    WHERE s.motorista_id = ?
+    ORDER BY a.data_avaliacao DESC
+'''
+
+# Posições calculadas no banco: RANK() para a colocação (empates dividem a posição e pulam as seguintes)
+# e DENSE_RANK() para a faixa de medalhas; só a fatia pedida é devolvida ao Python
+SQL_RANKING_BASE = f'''
+    WITH medias AS (
+        SELECT 
+            m.id,
+            m.nome,
+            v.placa,
+            v.modelo,
+            ({SOMA_NOTAS_STATS}) / (7.0 * s.total) as media_geral,
+            s.total as total_avaliacoes
+        FROM {{origem}} s
+        JOIN motoristas m ON m.id = s.motorista_id
+        LEFT JOIN veiculos v ON m.veiculo_id = v.id
+        WHERE s.total > 0
+    ), ranking AS (
+        SELECT medias.*,
+            RANK() OVER (ORDER BY media_geral DESC) AS posicao,
+            DENSE_RANK() OVER (ORDER BY media_geral DESC) AS faixa,
+            COUNT(*) OVER () AS total_ranqueados
+        FROM medias
+    )
+    SELECT * FROM ranking
+'''
+
+SQL_RANKING_GERAL = SQL_RANKING_BASE.format(origem='motorista_stats')
+
+# Ranking dos últimos N dias: meses inteiros da janela vêm de avaliacoes_mensal e só as pontas
+# (início parcial e mês corrente) de avaliacoes_diario
+SQL_RANKING_JANELA = SQL_RANKING_BASE.format(origem=f'''(
+            SELECT motorista_id, SUM(total) AS total, {', '.join(f'SUM(soma_{c}) AS soma_{c}' for c in CRITERIOS)}
+            FROM (
+                SELECT * FROM avaliacoes_diario WHERE periodo >= ? AND periodo < ?
+                UNION ALL
+                SELECT * FROM avaliacoes_mensal WHERE periodo >= ? AND periodo < ?
+                UNION ALL
+                SELECT * FROM avaliacoes_diario WHERE periodo >= ? AND periodo <= ?
+            )
+            WHERE motorista_id <> {ID_FROTA}
+            GROUP BY motorista_id
+        )''')
+
+ORDEM_RANKING_PAGINA = '    ORDER BY posicao, nome, id\n    LIMIT ? OFFSET ?\n'
+
+FILTRO_RANKING_POSICAO = '    WHERE id = ?\n'
+
+FILTRO_RANKING_BUSCA = "    WHERE nome LIKE ? ESCAPE '\\'\n    ORDER BY posicao, nome, id\n    LIMIT ?\n"
+
+SQL_RANKING_PAGINA = SQL_RANKING_GERAL + ORDEM_RANKING_PAGINA
+
+SQL_RANKING_POSICAO = SQL_RANKING_GERAL + FILTRO_RANKING_POSICAO
+
+SQL_RANKING_BUSCA = SQL_RANKING_GERAL + FILTRO_RANKING_BUSCA
+
+# Séries de tendência: granularidade -> (tabela, expressão do período). Semanas começam na segunda-feira.
+GRANULARIDADES = {
+    'dia': ('avaliacoes_diario', 'periodo'),
+    'semana': ('avaliacoes_diario', "date(periodo, '-6 days', 'weekday 1')"),
+    'mes': ('avaliacoes_mensal', 'periodo'),
+}
+
+SQL_SEGMENTOS = f'''
+    SELECT {', '.join(DIMENSOES_SEGMENTO)}, total,
+           ({' + '.join(f'soma_{c}' for c in CRITERIOS)}) / (7.0 * total) AS media_geral,
+           {', '.join(f'1.0 * soma_{c} / total AS media_{c}' for c in CRITERIOS)}
+    FROM segmentos_stats
+    WHERE {{filtro}}
+    ORDER BY media_geral DESC
+'''
+
+SQL_TENDENCIA = f'''
+    SELECT {{periodo}} AS periodo,
+           SUM(total) AS total,
+           ({' + '.join(f'SUM(soma_{c})' for c in CRITERIOS)}) / (7.0 * SUM(total)) AS media_geral,
+           {', '.join(f'1.0 * SUM(soma_{c}) / SUM(total) AS media_{c}' for c in CRITERIOS)}
+    FROM {{tabela}}
+    WHERE motorista_id = ? AND periodo >= ?
+    GROUP BY 1
+    ORDER BY 1
+'''
+
+# Indicadores da página inicial em uma única consulta: a partir dos agregados ou, sem eles, das avaliações
+SQL_RESUMO_SISTEMA = f'''
+    SELECT
+        (SELECT COUNT(*) FROM motoristas) AS total_motoristas,
+        (SELECT COUNT(*) FROM veiculos) AS total_veiculos,
+        COALESCE(SUM(s.total), 0) AS total_avaliacoes,
+        SUM({SOMA_NOTAS_STATS}) / (7.0 * SUM(s.total)) AS media_sistema
+    FROM motorista_stats s
+'''
+
+SQL_RESUMO_SISTEMA_AVALIACOES = f'''
+    SELECT
+        (SELECT COUNT(*) FROM motoristas) AS total_motoristas,
+        (SELECT COUNT(*) FROM veiculos) AS total_veiculos,
+        COUNT(*) AS total_avaliacoes,
+        AVG(({' + '.join(CRITERIOS)}) / 7.0) AS media_sistema
+    FROM avaliacoes
+'''
+
+# Consultas embutidas com parâmetros de exemplo, usadas para inspecionar os planos de execução
+CONSULTAS = {
+    'listar_motoristas': (SQL_LISTAR_MOTORISTAS, ()),
+    'listar_veiculos': (SQL_LISTAR_VEICULOS, ()),
+    'listar_motoristas_pagina': (SQL_PAGINA_MOTORISTAS.format(
+        filtros="(m.nome, m.id) > (?, ?) AND m.nome LIKE ? ESCAPE '\\'"), ('A', 1, '%a%', 20)),
+    'buscar_veiculos': (SQL_BUSCAR_VEICULOS.format(filtro=FILTRO_BUSCA_VEICULOS), ('"abc"*', 20)),
+    'buscar_motoristas': (SQL_BUSCAR_MOTORISTAS.format(filtro=FILTRO_BUSCA_MOTORISTAS), ('"jo"*', '"jo"*', 20)),
+    'obter_motorista_por_id': (SQL_MOTORISTA_POR_ID, (1,)),
+    'obter_avaliacoes_motorista': (SQL_AVALIACOES_MOTORISTA, (1,)),
+    'calcular_estatisticas_motorista': (SQL_ESTATISTICAS_MOTORISTA, (1,)),
+    'obter_dashboard_motorista': (SQL_DASHBOARD_MOTORISTA, (1, 5, 1)),
+    'listar_avaliacoes_pagina': (SQL_HISTORICO_AVALIACOES.format(
+        filtros='motorista_id = ? AND (data_avaliacao, id) < (?, ?) AND data_avaliacao >= ?'),
+        (1, '2030-01-01', 0, '2024-01-01', 20)),
+    'listar_avaliacoes_pagina_avaliador': (SQL_HISTORICO_AVALIACOES.format(
+        filtros='motorista_id = ? AND avaliador = ?'), (1, 'Ana', 20)),
+    'listar_avaliadores_motorista': (SQL_AVALIADORES_MOTORISTA, (1,)),
+    'obter_ranking_pagina': (SQL_RANKING_PAGINA, (20, 0)),
+    'obter_posicao_motorista': (SQL_RANKING_POSICAO, (1,)),
+    'buscar_posicoes_ranking': (SQL_RANKING_BUSCA, ('%a%', 5)),
+    'obter_ranking_pagina_janela': (SQL_RANKING_JANELA + ORDEM_RANKING_PAGINA,
+                                    ('2024-01-10', '2024-02-01', '2024-02', '2024-04', '2024-04-01', '2024-04-09', 20, 0)),
+    'obter_segmentos': (SQL_SEGMENTOS.format(filtro=' AND '.join(f'{d} <> ?' for d in DIMENSOES_SEGMENTO)),
+                        (TODOS_SEGMENTOS,) * len(DIMENSOES_SEGMENTO)),
+    'obter_tendencia_semanal': (SQL_TENDENCIA.format(**dict(zip(('tabela', 'periodo'), GRANULARIDADES['semana']))),
+                                (1, '')),
+    'obter_tendencia_mensal_frota': (SQL_TENDENCIA.format(**dict(zip(('tabela', 'periodo'), GRANULARIDADES['mes']))),
+                                     (ID_FROTA, '')),
+    'obter_resumo_sistema': (SQL_RESUMO_SISTEMA, ()),
+}
+
+
+def explicar_consultas() -> dict[str, list[str]]:
+    planos = {}
+    with obter_conexoes().leitura() as conn:
+        for nome, (sql, params) in CONSULTAS.items():
+            planos[nome] = [linha[3] for linha in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    return planos
+
+
+def varredura_completa(detalhe):
+    # "SCAN tabela" sem índice percorre a tabela inteira
+    return detalhe.startswith('SCAN') and 'USING' not in detalhe
+
+
+def imprimir_planos_consultas():
+    for nome, detalhes in explicar_consultas().items():
+        alerta = any(varredura_completa(d) for d in detalhes)
+        print(f"{'⚠️ ' if alerta else ''}{nome}")
+        for detalhe in detalhes:
+            print(f"    {detalhe}")
+
+
+# Manutenção dos agregados materializados em motorista_stats
+def _acumular_totais(conn, id_inicial, id_final=None):
+    somas = ', '.join(f'soma_{c}' for c in CRITERIOS)
+    conn.execute(f'''
+        INSERT INTO motorista_stats (motorista_id, total, {somas}, ultima_avaliacao)
+        SELECT a.motorista_id, COUNT(*), {', '.join(f'SUM(a.{c})' for c in CRITERIOS)}, MAX(a.data_avaliacao)
+        FROM avaliacoes a
+        JOIN motoristas m ON m.id = a.motorista_id
+        WHERE a.id BETWEEN ? AND ?
+        GROUP BY a.motorista_id
+        ON CONFLICT (motorista_id) DO UPDATE SET
+            total = total + excluded.total,
+            {', '.join(f'soma_{c} = soma_{c} + excluded.soma_{c}' for c in CRITERIOS)},
+            ultima_avaliacao = MAX(COALESCE(ultima_avaliacao, ''), excluded.ultima_avaliacao)
+    ''', (id_inicial, id_final if id_final is not None else sys.maxsize))
+
+
+def _acumular_periodos(conn, id_inicial, id_final=None):
+    somas = ', '.join(f'soma_{c}' for c in CRITERIOS)
+    intervalo = (id_inicial, id_final if id_final is not None else sys.maxsize)
+    for tabela, periodo in AGREGADOS_PERIODO.items():
+        for motorista in ('a.motorista_id', str(ID_FROTA)):
+            conn.execute(f'''
+                INSERT INTO {tabela} (motorista_id, periodo, total, {somas})
+                SELECT {motorista}, {periodo}, COUNT(*), {', '.join(f'SUM(a.{c})' for c in CRITERIOS)}
+                FROM avaliacoes a
+                JOIN motoristas m ON m.id = a.motorista_id
+                WHERE a.id BETWEEN ? AND ?
+                GROUP BY 1, 2
+                ON CONFLICT (motorista_id, periodo) DO UPDATE SET
+                    total = total + excluded.total,
+                    {', '.join(f'soma_{c} = soma_{c} + excluded.soma_{c}' for c in CRITERIOS)}
+            ''', intervalo)
+
+
+def _descontar_periodos_motorista(conn, motorista_id):
+    # Retira da linha da frota a contribuição do motorista e apaga as linhas dele
+    for tabela in AGREGADOS_PERIODO:
+        conn.execute(f'''
+            UPDATE {tabela} AS f SET
+                total = f.total - d.total,
+                {', '.join(f'soma_{c} = f.soma_{c} - d.soma_{c}' for c in CRITERIOS)}
+            FROM {tabela} AS d
+            WHERE d.motorista_id = ? AND f.motorista_id = ? AND f.periodo = d.periodo
+        ''', (motorista_id, ID_FROTA))
+        conn.execute(f'DELETE FROM {tabela} WHERE motorista_id = ? OR (motorista_id = ? AND total = 0)',
+                     (motorista_id, ID_FROTA))
+
+
+def _sql_cubo_segmentos(origem):
+    # origem: SELECT com motorista_id, total e soma_<critério> (negativos para retirar do cubo). Retorna
+    # (WITH, SELECT) com as 2^3 combinações de dimensões, separados para que o INSERT possa ficar entre eles.
+    somas = [f'soma_{c}' for c in CRITERIOS]
+    conjuntos = []
+    for mantidas in itertools.product([True, False], repeat=len(DIMENSOES_SEGMENTO)):
+        colunas = [d if manter else f"'{TODOS_SEGMENTOS}'" for d, manter in zip(DIMENSOES_SEGMENTO, mantidas)]
+        agrupamento = [d for d, manter in zip(DIMENSOES_SEGMENTO, mantidas) if manter]
+        conjuntos.append(
+            f"SELECT {', '.join(colunas)}, SUM(total), {', '.join(f'SUM({s})' for s in somas)} FROM base"
+            + (f" GROUP BY {', '.join(agrupamento)}" if agrupamento else '') + ' HAVING SUM(total) <> 0')
+    cte = f'''
+        WITH base AS (
+            SELECT {', '.join(f"COALESCE(v.{d}, '{SEM_VEICULO}') AS {d}" for d in DIMENSOES_SEGMENTO)},
+                   o.total, {', '.join(f'o.{s}' for s in somas)}
+            FROM ({origem}) o
+            JOIN motoristas m ON m.id = o.motorista_id
+            LEFT JOIN veiculos v ON v.id = m.veiculo_id
+        )'''
+    return cte, f"SELECT * FROM ({' UNION ALL '.join(conjuntos)}) WHERE 1"
+
+
+ORIGEM_SEGMENTOS_AVALIACOES = f'''
+    SELECT a.motorista_id, 1 AS total, {', '.join(f'a.{c} AS soma_{c}' for c in CRITERIOS)}
+    FROM avaliacoes a'''
+
+
+def _somar_segmentos(conn, origem, parametros):
+    somas = ', '.join(f'soma_{c}' for c in CRITERIOS)
+    cte, consulta = _sql_cubo_segmentos(origem)
+    conn.execute(f'''
+        {cte}
+        INSERT INTO segmentos_stats ({', '.join(DIMENSOES_SEGMENTO)}, total, {somas})
+        {consulta}
+        ON CONFLICT ({', '.join(DIMENSOES_SEGMENTO)}) DO UPDATE SET
+            total = total + excluded.total,
+            {', '.join(f'soma_{c} = soma_{c} + excluded.soma_{c}' for c in CRITERIOS)}
+    ''', parametros)
+
+
+def _acumular_segmentos(conn, id_inicial, id_final=None):
+    _somar_segmentos(conn, ORIGEM_SEGMENTOS_AVALIACOES + ' WHERE a.id BETWEEN ? AND ?',
+                     (id_inicial, id_final if id_final is not None else sys.maxsize))
+
+
+def _deslocar_segmentos(conn, filtro, parametros, sinal):
+    # Soma (sinal=1) ou retira (sinal=-1) do cubo a linha de motorista_stats dos motoristas em filtro, nos
+    # segmentos do veículo atual de cada um. Trocar o veículo de um motorista, ou mudar os dados de um veículo,
+    # é retirar antes da alteração e somar depois, sem recalcular o cubo inteiro.
+    origem = f'''
+        SELECT motorista_id, {sinal} * total AS total, {', '.join(f'{sinal} * soma_{c} AS soma_{c}' for c in CRITERIOS)}
+        FROM motorista_stats
+        WHERE {filtro}'''
+    _somar_segmentos(conn, origem, parametros)
+    if sinal < 0:
+        conn.execute('DELETE FROM segmentos_stats WHERE total = 0')
+
+
+def _reconstruir_segmentos(conn):
+    # Recalcula o cubo inteiro a partir de motorista_stats (uma linha por motorista, sem ler as avaliações).
+    # Usado pela migração e pela reconstrução completa dos agregados.
+    somas = ', '.join(f'soma_{c}' for c in CRITERIOS)
+    cte, consulta = _sql_cubo_segmentos(f'SELECT motorista_id, total, {somas} FROM motorista_stats')
+    conn.execute('DELETE FROM segmentos_stats')
+    conn.execute(f"{cte} INSERT INTO segmentos_stats ({', '.join(DIMENSOES_SEGMENTO)}, total, {somas}) {consulta}")
+
+
+def _acumular_estatisticas(conn, id_inicial, id_final=None):
+    # Soma aos agregados as avaliações com id entre id_inicial e id_final (por padrão, todas a partir
+    # de id_inicial, ou seja, as inseridas na transação corrente)
+    _acumular_totais(conn, id_inicial, id_final)
+    _acumular_periodos(conn, id_inicial, id_final)
+    _acumular_segmentos(conn, id_inicial, id_final)
+
+
+def _reconstruir_totais(conn):
+    conn.execute('DELETE FROM motorista_stats')
+    _acumular_totais(conn, 0)
+
+
+def _reconstruir_periodos(conn):
+    for tabela in AGREGADOS_PERIODO:
+        conn.execute(f'DELETE FROM {tabela}')
+    _acumular_periodos(conn, 0)
+
+
+@instrumentado
+def reconstruir_estatisticas() -> None:
+    with obter_conexoes().escrita() as conn:
+        _reconstruir_totais(conn)
+        _reconstruir_periodos(conn)
+        _reconstruir_segmentos(conn)
+        _registrar_alteracao(conn, 'avaliacoes', 'reconstruir_agregados')
+
+
+def _sql_recalculo(agrupamento, ultima_avaliacao=False):
+    return f'''
+        SELECT {', '.join(agrupamento)}, COUNT(*), {', '.join(f'SUM(a.{c})' for c in CRITERIOS)}
+            {', MAX(a.data_avaliacao)' if ultima_avaliacao else ''}
+        FROM avaliacoes a
+        JOIN motoristas m ON m.id = a.motorista_id
+        GROUP BY {', '.join(str(i + 1) for i in range(len(agrupamento)))}
+    '''
+
+
+def _comparar_agregado(conn, tabela, chaves, colunas, sql_esperado):
+    # Divergências entre o agregado armazenado e o recalculado a partir das avaliações
+    esperado = {linha[:len(chaves)]: linha[len(chaves):] for linha in conn.execute(sql_esperado)}
+    armazenado = {linha[:len(chaves)]: linha[len(chaves):] for linha in conn.execute(
+        f"SELECT {', '.join(chaves)}, {', '.join(colunas)} FROM {tabela}")}
+
+    divergencias = []
+    for chave in sorted(esperado.keys() | armazenado.keys()):
+        valores_esperados = esperado.get(chave)
+        valores_armazenados = armazenado.get(chave)
+        if valores_esperados != valores_armazenados:
+            divergencias.append({
+                'tabela': tabela,
+                **dict(zip(chaves, chave)),
+                'esperado': dict(zip(colunas, valores_esperados)) if valores_esperados else None,
+                'armazenado': dict(zip(colunas, valores_armazenados)) if valores_armazenados else None,
+            })
+    return divergencias
+
+
+@instrumentado
+def verificar_estatisticas() -> list[dict]:
+    # Recalcula os agregados a partir das avaliações e retorna as divergências encontradas
+    somas = [f'soma_{c}' for c in CRITERIOS]
+    with obter_conexoes().leitura() as conn:
+        divergencias = _comparar_agregado(conn, 'motorista_stats', ['motorista_id'],
+                                          ['total'] + somas + ['ultima_avaliacao'],
+                                          _sql_recalculo(['a.motorista_id'], ultima_avaliacao=True))
+        for tabela, periodo in AGREGADOS_PERIODO.items():
+            for motorista in ('a.motorista_id', str(ID_FROTA)):
+                divergencias += [
+                    divergencia for divergencia in _comparar_agregado(
+                        conn, tabela, ['motorista_id', 'periodo'], ['total'] + somas,
+                        _sql_recalculo([motorista, periodo]))
+                    # Cada passada recalcula só um dos lados (motoristas ou frota)
+                    if (divergencia['motorista_id'] == ID_FROTA) == (motorista != 'a.motorista_id')
+                ]
+        cte, consulta = _sql_cubo_segmentos(ORIGEM_SEGMENTOS_AVALIACOES)
+        divergencias += _comparar_agregado(conn, 'segmentos_stats', DIMENSOES_SEGMENTO, ['total'] + somas,
+                                           f'{cte} {consulta}')
+    return divergencias
+
+
+def imprimir_verificacao_estatisticas():
+    divergencias = verificar_estatisticas()
+    for divergencia in divergencias:
+        chave = ' '.join(f'{k}={v}' for k, v in divergencia.items() if k not in ('esperado', 'armazenado'))
+        print(f"{chave}: esperado={divergencia['esperado']} armazenado={divergencia['armazenado']}")
+    print(f"{len(divergencias)} divergência(s) nos agregados")
+    return divergencias
+
+
+def imprimir_reconstrucao_estatisticas():
+    divergencias = verificar_estatisticas()
+    reconstruir_estatisticas()
+    print(f"Agregados reconstruídos ({len(divergencias)} divergência(s) corrigida(s))")
+
+
+# Log de alterações
+DIAS_RETENCAO_ALTERACOES = 7
+
+
+def _registrar_alteracao(conn, entidade, operacao, registro_id=None):
+    obter_conexoes().registrar_alteracao(conn, entidade, operacao, registro_id)
+
+
+@instrumentado
+def podar_alteracoes(dias=DIAS_RETENCAO_ALTERACOES) -> None:
+    # Réplicas que ficarem atrás do trecho podado invalidam todo o cache na próxima sincronização
+    limite = datetime.now() - timedelta(days=dias)
+    with obter_conexoes().escrita() as conn:
+        conn.execute('''
+            DELETE FROM alteracoes
+            WHERE data < ? AND seq < (SELECT MAX(seq) FROM alteracoes)
+        ''', (limite,))
+
+
+# Funções do banco de dados
+@instrumentado
+def cadastrar_motorista(nome, veiculo_id) -> None:
+    with obter_conexoes().escrita() as conn:
+        cursor = conn.execute('''
+            INSERT INTO motoristas (nome, veiculo_id, data_cadastro)
+            VALUES (?, ?, ?)
+        ''', (nome, veiculo_id, date.today()))
+        _registrar_alteracao(conn, 'motoristas', 'inserir', cursor.lastrowid)
+
+
+@instrumentado
+@em_cache('motoristas', 'veiculos')
+def listar_motoristas() -> pd.DataFrame:
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(SQL_LISTAR_MOTORISTAS, conn)
+
+
+def _padrao_like(texto):
+    # Busca por trecho, tratando % e _ digitados como caracteres literais
+    texto = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{texto}%'
+
+
+def _filtros_motoristas(nome, cidade, placa):
+    condicoes, parametros = [], []
+    for coluna, valor in (('m.nome', nome), ('v.cidade', cidade), ('v.placa', placa)):
+        if valor and valor.strip():
+            condicoes.append(f"{coluna} LIKE ? ESCAPE '\\'")
+            parametros.append(_padrao_like(valor.strip()))
+    return condicoes, parametros
+
+
+@instrumentado
+@em_cache('motoristas', 'veiculos')
+def listar_motoristas_pagina(apos=None, tamanho=20, nome=None, cidade=None, placa=None) -> Pagina:
+    # Retorna a página e o cursor (nome, id) da próxima, ou None quando não há mais linhas
+    condicoes, parametros = _filtros_motoristas(nome, cidade, placa)
+    if apos is not None:
+        condicoes.insert(0, '(m.nome, m.id) > (?, ?)')
+        parametros[:0] = apos
+    sql = SQL_PAGINA_MOTORISTAS.format(filtros=' AND '.join(condicoes) or '1')
+    with obter_conexoes().leitura() as conn:
+        pagina = pd.read_sql_query(sql, conn, params=parametros + [tamanho + 1])
+    if len(pagina) <= tamanho:
+        return Pagina(pagina, None)
+    pagina = pagina.iloc[:tamanho]
+    ultima = pagina.iloc[-1]
+    return Pagina(pagina, (ultima['nome'], int(ultima['id'])))
+
+
+def _consulta_fts(termo):
+    # Cada palavra digitada vira um prefixo entre aspas ("jo"* "sil"*); palavras sem letras nem dígitos são ignoradas
+    palavras = [palavra for palavra in termo.split() if any(c.isalnum() for c in palavra)]
+    return ' '.join('"' + palavra.replace('"', '""') + '"*' for palavra in palavras)
+
+
+def _buscar_opcoes(sql, filtro, termo, limite, incluir_id):
+    consulta = _consulta_fts(termo)
+    if consulta:
+        parametros = [consulta] * filtro.count('?')
+    else:
+        filtro, parametros = '1', []
+    with obter_conexoes().leitura() as conn:
+        opcoes = conn.execute(sql.format(filtro=filtro), parametros + [limite]).fetchall()
+        # Mantém a opção já escolhida (ex.: veículo atual na edição) mesmo fora das correspondências
+        if incluir_id is not None and all(opcao[0] != incluir_id for opcao in opcoes):
+            id_coluna = 'v.id' if sql is SQL_BUSCAR_VEICULOS else 'm.id'
+            opcoes = conn.execute(sql.format(filtro=f'{id_coluna} = ?'), (incluir_id, 1)).fetchall() + opcoes
+    return [Opcao._make(opcao) for opcao in opcoes]
+
+
+@instrumentado
+@em_cache('veiculos')
+def buscar_veiculos(termo='', limite=20, incluir_id=None) -> list[Opcao]:
+    return _buscar_opcoes(SQL_BUSCAR_VEICULOS, FILTRO_BUSCA_VEICULOS, termo, limite, incluir_id)
+
+
+@instrumentado
+@em_cache('motoristas', 'veiculos')
+def buscar_motoristas(termo='', limite=20, incluir_id=None) -> list[Opcao]:
+    return _buscar_opcoes(SQL_BUSCAR_MOTORISTAS, FILTRO_BUSCA_MOTORISTAS, termo, limite, incluir_id)
+
+
+@instrumentado
+@em_cache('motoristas', 'veiculos')
+def contar_motoristas(nome=None, cidade=None, placa=None) -> int:
+    condicoes, parametros = _filtros_motoristas(nome, cidade, placa)
+    sql = SQL_CONTAR_MOTORISTAS.format(filtros=' AND '.join(condicoes) or '1')
+    with obter_conexoes().leitura() as conn:
+        return conn.execute(sql, parametros).fetchone()[0]
+
+
+@instrumentado
+@em_cache('veiculos')
+def listar_veiculos() -> pd.DataFrame:
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(SQL_LISTAR_VEICULOS, conn)
+
+
+@instrumentado
+def cadastrar_veiculo(placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano) -> bool:
+    try:
+        with obter_conexoes().escrita() as conn:
+            cursor = conn.execute('''
+                INSERT INTO veiculos (placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (placa, modelo, tipo_veiculo, proprio_alugado, cidade, ano))
+            _registrar_alteracao(conn, 'veiculos', 'inserir', cursor.lastrowid)
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+# Importação de veículos: coluna da planilha -> coluna da tabela
+COLUNAS_EXCEL_VEICULOS = {
+    'Placa': 'placa',
+    'Modelo': 'modelo',
+    'Tipo de veículo': 'tipo_veiculo',
+    'Próprio ou alugado': 'proprio_alugado',
+    'Cidade': 'cidade',
+    'Ano': 'ano',
+}
+
+# Tratamento de placas já cadastradas
+MODOS_IMPORTACAO = {
+    'inserir': 'Somente inserir (placas já cadastradas viram erro)',
+    'atualizar': 'Inserir ou atualizar (upsert pela placa)',
+    'ignorar': 'Inserir e ignorar placas já cadastradas',
+}
+
+
+def normalizar_veiculos_excel(df_excel, linha_inicial=2):
+    # Normaliza e valida todas as linhas de uma vez.
+    # Retorna (DataFrame com as linhas válidas e a coluna 'linha', lista de erros (linha, motivo)).
+    df = pd.DataFrame({'linha': np.arange(len(df_excel)) + linha_inicial}, index=df_excel.index)
+    for coluna_excel, coluna in COLUNAS_EXCEL_VEICULOS.items():
+        if coluna != 'ano':
+            df[coluna] = df_excel[coluna_excel].astype('string').str.strip()
+    df['placa'] = df['placa'].str.upper()
+    df['ano'] = pd.to_numeric(df_excel['Ano'], errors='coerce')
+
+    colunas_texto = [c for c in COLUNAS_EXCEL_VEICULOS.values() if c != 'ano']
+    texto_vazio = (df[colunas_texto].isna() | (df[colunas_texto] == '')).to_numpy(dtype=bool)
+    ano_invalido = (df['ano'].isna() | (df['ano'] % 1 != 0)).to_numpy(dtype=bool)
+    repetida = (df['placa'].duplicated(keep='first') & df['placa'].notna()).to_numpy(dtype=bool)
+
+    nomes_excel = np.array([c for c, coluna in COLUNAS_EXCEL_VEICULOS.items() if coluna != 'ano'])
+    motivos = np.select(
+        [texto_vazio.any(axis=1), ano_invalido, repetida],
+        ['campo obrigatório vazio', 'ano inválido', 'placa repetida no arquivo'],
+        default=''
+    )
+    invalidas = motivos != ''
+
+    erros = []
+    for linha, motivo, vazios, placa in zip(df['linha'].to_numpy()[invalidas], motivos[invalidas],
+                                           texto_vazio[invalidas], df['placa'].to_numpy()[invalidas]):
+        if motivo == 'campo obrigatório vazio':
+            motivo = f"{motivo} ({', '.join(nomes_excel[vazios])})"
+        elif motivo == 'placa repetida no arquivo':
+            motivo = f"{motivo} ({placa})"
+        erros.append((int(linha), motivo))
+
+    validas = df[~invalidas].copy()
+    validas['ano'] = validas['ano'].astype(int)
+    return validas, erros
+
+
+def _importar_lote_veiculos(conn, df_excel, modo='inserir', linha_inicial=2, placas_existentes=None):
+    # placas_existentes pode ser reaproveitado entre lotes; é atualizado com as placas gravadas
+    validas, erros = normalizar_veiculos_excel(df_excel, linha_inicial)
+    resultado = {'inseridos': 0, 'atualizados': 0, 'ignorados': 0, 'erros': []}
+    if validas.empty:
+        resultado['erros'] = [f"Linha {linha}: {motivo}" for linha, motivo in erros]
+        return resultado
+
+    if placas_existentes is None:
+        placas_existentes = {linha[0] for linha in conn.execute('SELECT placa FROM veiculos')}
+    existente = validas['placa'].isin(placas_existentes).to_numpy()
+
+    if modo == 'inserir':
+        for linha, placa in zip(validas['linha'].to_numpy()[existente], validas['placa'].to_numpy()[existente]):
+            erros.append((int(linha), f"placa {placa} já cadastrada"))
+        validas = validas[~existente]
+    elif modo == 'ignorar':
+        resultado['ignorados'] = int(existente.sum())
+        validas = validas[~existente]
+    elif modo == 'atualizar':
+        resultado['atualizados'] = int(existente.sum())
+    else:
+        raise ValueError(f"Modo de importação desconhecido: {modo}")
+
+    colunas = list(COLUNAS_EXCEL_VEICULOS.values())
+    registros = list(zip(*(validas[c].tolist() for c in colunas)))
+    sql = f"INSERT INTO veiculos ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    if modo == 'atualizar':
+        sql += ' ON CONFLICT (placa) DO UPDATE SET ' + ', '.join(
+            f'{c} = excluded.{c}' for c in colunas if c != 'placa')
+    if resultado['atualizados']:
+        # Cidade, tipo ou propriedade de veículos já em uso podem mudar: os motoristas desses veículos saem
+        # dos segmentos antigos antes da gravação e entram nos novos depois dela
+        filtro_placas = '''motorista_id IN (
+            SELECT m.id FROM motoristas m JOIN veiculos v ON v.id = m.veiculo_id
+            WHERE v.placa IN (SELECT value FROM json_each(?)))'''
+        placas_atualizadas = (json.dumps(validas['placa'].to_numpy()[existente].tolist()),)
+        _deslocar_segmentos(conn, filtro_placas, placas_atualizadas, -1)
+    conn.executemany(sql, registros)
+    placas_existentes.update(validas['placa'].tolist())
+    if resultado['atualizados']:
+        _deslocar_segmentos(conn, filtro_placas, placas_atualizadas, 1)
+    if registros:
+        _registrar_alteracao(conn, 'veiculos', 'importar')
+
+    resultado['inseridos'] = len(registros) - resultado['atualizados']
+    resultado['erros'] = [f"Linha {linha}: {motivo}" for linha, motivo in sorted(erros)]
+    return resultado
+
+
+@instrumentado
+def importar_veiculos_excel(df_excel, modo='inserir') -> ResultadoImportacao:
+    # Importa todas as linhas válidas em uma única transação
+    with obter_conexoes().escrita() as conn:
+        return _importar_lote_veiculos(conn, df_excel, modo)
+
+
+# Importação em streaming (openpyxl read-only) para planilhas grandes
+TAMANHO_LOTE_STREAMING = 5000
+MAX_ERROS_RELATADOS = 1000
+
+
+def _abrir_planilha(arquivo):
+    # openpyxl só é importado por quem lê planilhas
+    import openpyxl
+    arquivo.seek(0)
+    return openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+
+
+@instrumentado
+def ler_cabecalho_excel(arquivo, linhas_preview=10) -> tuple[list[str], pd.DataFrame]:
+    # Lê apenas o cabeçalho e as primeiras linhas, sem carregar a planilha inteira
+    wb = _abrir_planilha(arquivo)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [str(c).strip() if c is not None else '' for c in next(linhas, ())]
+        preview = [linha[:len(cabecalho)] for linha in itertools.islice(linhas, linhas_preview)]
+    finally:
+        wb.close()
+    return cabecalho, pd.DataFrame(preview, columns=cabecalho)
+
+
+def chave_importacao(arquivo, modo) -> str:
+    # Identifica a importação pelo conteúdo do arquivo e pelo modo, para retomada
+    sha = hashlib.sha256()
+    arquivo.seek(0)
+    for bloco in iter(lambda: arquivo.read(1 << 20), b''):
+        sha.update(bloco)
+    arquivo.seek(0)
+    return f"veiculos:{modo}:{sha.hexdigest()}"
+
+
+@instrumentado
+def obter_checkpoint_importacao(chave) -> Optional[CheckpointImportacao]:
+    with obter_conexoes().leitura() as conn:
+        linha = conn.execute('''
+            SELECT linhas_processadas, inseridos, atualizados, ignorados, total_erros
+            FROM importacao_checkpoint WHERE chave = ?
+        ''', (chave,)).fetchone()
+    if linha is None:
+        return None
+    return dict(zip(['linhas_processadas', 'inseridos', 'atualizados', 'ignorados', 'total_erros'], linha))
+
+
+@instrumentado
+def importar_veiculos_excel_streaming(arquivo, modo='inserir', tamanho_lote=TAMANHO_LOTE_STREAMING,
+                                      progresso=None) -> ResultadoImportacaoStreaming:
+    # Processa a planilha em lotes de tamanho fixo; cada lote é gravado em sua própria transação
+    # junto com o checkpoint, de modo que uma importação interrompida retoma do último lote gravado.
+    chave = chave_importacao(arquivo, modo)
+    checkpoint = obter_checkpoint_importacao(chave) or {
+        'linhas_processadas': 0, 'inseridos': 0, 'atualizados': 0, 'ignorados': 0, 'total_erros': 0}
+    resultado = dict(checkpoint, erros=[], retomada_de=checkpoint['linhas_processadas'])
+
+    with obter_conexoes().leitura() as conn:
+        placas_existentes = {linha[0] for linha in conn.execute('SELECT placa FROM veiculos')}
+
+    wb = _abrir_planilha(arquivo)
+    try:
+        ws = wb.worksheets[0]
+        total_estimado = max((ws.max_row or 1) - 1, 0)
+        linhas = ws.iter_rows(values_only=True)
+        cabecalho = [str(c).strip() if c is not None else '' for c in next(linhas, ())]
+        colunas_faltando = [c for c in COLUNAS_EXCEL_VEICULOS if c not in cabecalho]
+        if colunas_faltando:
+            raise ValueError(f"Colunas faltando no arquivo: {', '.join(colunas_faltando)}")
+
+        # Pula as linhas já gravadas por uma execução anterior
+        processadas = checkpoint['linhas_processadas']
+        linhas = itertools.islice(linhas, processadas, None)
+
+        while True:
+            lote = [linha[:len(cabecalho)] for linha in itertools.islice(linhas, tamanho_lote)]
+            if not lote:
+                break
+            df_lote = pd.DataFrame(lote, columns=cabecalho)
+            with obter_conexoes().escrita() as conn:
+                parcial = _importar_lote_veiculos(conn, df_lote, modo, processadas + 2, placas_existentes)
+                processadas += len(lote)
+                for campo in ('inseridos', 'atualizados', 'ignorados'):
+                    resultado[campo] += parcial[campo]
+                resultado['total_erros'] += len(parcial['erros'])
+                conn.execute('''
+                    INSERT INTO importacao_checkpoint
+                        (chave, linhas_processadas, inseridos, atualizados, ignorados, total_erros, atualizado_em)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (chave) DO UPDATE SET
+                        linhas_processadas = excluded.linhas_processadas,
+                        inseridos = excluded.inseridos,
+                        atualizados = excluded.atualizados,
+                        ignorados = excluded.ignorados,
+                        total_erros = excluded.total_erros,
+                        atualizado_em = excluded.atualizado_em
+                ''', (chave, processadas, resultado['inseridos'], resultado['atualizados'],
+                      resultado['ignorados'], resultado['total_erros'], datetime.now()))
+
+            espaco = MAX_ERROS_RELATADOS - len(resultado['erros'])
+            resultado['erros'].extend(parcial['erros'][:max(espaco, 0)])
+            if progresso:
+                progresso(processadas, max(total_estimado, processadas))
+    finally:
+        wb.close()
+
+    # Concluída: o checkpoint não é mais necessário
+    with obter_conexoes().escrita() as conn:
+        conn.execute('DELETE FROM importacao_checkpoint WHERE chave = ?', (chave,))
+    resultado['linhas_processadas'] = processadas
+    return resultado
+
+
+@instrumentado
+@em_cache('motoristas', 'veiculos')
+def obter_motorista_por_id(motorista_id) -> Optional[MotoristaCadastro]:
+    with obter_conexoes().leitura() as conn:
+        linha = conn.execute(SQL_MOTORISTA_POR_ID, (motorista_id,)).fetchone()
+    return MotoristaCadastro._make(linha) if linha else None
+
+
+@instrumentado
+def atualizar_motorista(motorista_id, nome, veiculo_id) -> None:
+    with obter_conexoes().escrita() as conn:
+        veiculo_anterior = conn.execute('SELECT veiculo_id FROM motoristas WHERE id = ?', (motorista_id,)).fetchone()
+        # Com troca de veículo, as avaliações do motorista passam para os segmentos do novo veículo
+        trocou_veiculo = veiculo_anterior is not None and veiculo_anterior[0] != veiculo_id
+        if trocou_veiculo:
+            _deslocar_segmentos(conn, 'motorista_id = ?', (motorista_id,), -1)
+        conn.execute('''
+            UPDATE motoristas 
+            SET nome = ?, veiculo_id = ?
+            WHERE id = ?
+        ''', (nome, veiculo_id, motorista_id))
+        if trocou_veiculo:
+            _deslocar_segmentos(conn, 'motorista_id = ?', (motorista_id,), 1)
+        _registrar_alteracao(conn, 'motoristas', 'atualizar', motorista_id)
+
+
+@instrumentado
+def excluir_motorista(motorista_id) -> None:
+    with obter_conexoes().escrita() as conn:
+        # Primeiro exclui todas as avaliações do motorista e seus agregados
+        _deslocar_segmentos(conn, 'motorista_id = ?', (motorista_id,), -1)
+        conn.execute('DELETE FROM avaliacoes WHERE motorista_id = ?', (motorista_id,))
+        conn.execute('DELETE FROM motorista_stats WHERE motorista_id = ?', (motorista_id,))
+        _descontar_periodos_motorista(conn, motorista_id)
+        # Depois exclui o motorista
+        conn.execute('DELETE FROM motoristas WHERE id = ?', (motorista_id,))
+        _registrar_alteracao(conn, 'avaliacoes', 'excluir_motorista', motorista_id)
+        _registrar_alteracao(conn, 'motoristas', 'excluir', motorista_id)
+
+
+SQL_INSERIR_AVALIACAO = f'''
+    INSERT INTO avaliacoes (motorista_id, {', '.join(CRITERIOS)}, comentario, avaliador, data_avaliacao)
+    VALUES ({', '.join('?' * (len(CRITERIOS) + 4))})
+'''
+
+
+# Fila de gravação das avaliações (group commit). Envios que chegam juntos (troca de turno) disputariam a
+# trava de escrita um a um, cada um com seu COMMIT. Uma thread escritora grava em uma única transação tudo
+# o que se acumulou na fila enquanto o lote anterior era gravado; cada remetente é liberado após o COMMIT.
+# Não há espera para formar lotes: um envio isolado é gravado assim que chega.
+class FilaAvaliacoes:
+    def __init__(self, gerenciador, capacidade=1000, max_lote=200):
+        self.gerenciador = gerenciador
+        self.max_lote = max_lote
+
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._lock_metricas = threading.Lock()
+        self.lotes = 0
+        self.gravadas = 0
+        self.falhas = 0
+        self.maior_lote = 0
+        self.ultimo_lote = 0
+        self._tempo_lotes = 0.0
+
+        self._thread = threading.Thread(target=self._executar, name='fila-avaliacoes', daemon=True)
+        self._thread.start()
+
+    def enviar(self, registro, timeout=None):
+        # Fila cheia por mais que timeout segundos: queue.Full
+        futuro = concurrent.futures.Future()
+        self._fila.put((registro, futuro), timeout=timeout)
+        return futuro
+
+    def encerrar(self):
+        # Grava o que já está na fila e termina a thread escritora
+        self._fila.put(None)
+        self._thread.join()
+
+    def _coletar(self):
+        # Retorna o lote e se a fila foi encerrada (None na fila)
+        item = self._fila.get()
+        if item is None:
+            return [], True
+        lote = [item]
+        while len(lote) < self.max_lote:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return lote, True
+            lote.append(item)
+        return lote, False
+
+    def _gravar(self, registros):
+        with self.gerenciador.escrita() as conn:
+            conn.executemany(SQL_INSERIR_AVALIACAO, registros)
+            # Único escritor na transação: os ids do lote são consecutivos
+            ultimo_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            primeiro_id = ultimo_id - len(registros) + 1
+            _acumular_estatisticas(conn, primeiro_id, ultimo_id)
+            self.gerenciador.registrar_alteracao(conn, 'avaliacoes', 'inserir',
+                                                 ultimo_id if len(registros) == 1 else None)
+        return range(primeiro_id, ultimo_id + 1)
+
+    def _executar(self):
+        encerrada = False
+        while not encerrada:
+            lote, encerrada = self._coletar()
+            if not lote:
+                continue
+            try:
+                self._gravar_lote(lote)
+            except Exception as erro:
+                # A thread escritora não pode morrer: sem ela, todo envio seguinte esperaria o tempo máximo
+                # e a fila encheria. Os envios ainda pendentes do lote recebem o erro.
+                logger.exception("Falha ao gravar lote de %d avaliações", len(lote))
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(erro)
+                        with self._lock_metricas:
+                            self.falhas += 1
+
+    def _gravar_lote(self, lote):
+        # Envios cancelados por quem desistiu de esperar (ver adicionar_avaliacao) não são gravados; os demais
+        # passam a "em execução" e não podem mais ser cancelados
+        lote = [item for item in lote if item[1].set_running_or_notify_cancel()]
+        if not lote:
+            return
+        inicio = time.perf_counter()
+        try:
+            resultados = list(zip(lote, self._gravar([registro for registro, _ in lote])))
+        except sqlite3.Error:
+            # Um envio inválido (ex.: motorista excluído) não derruba os demais: regrava um a um. Só erros do
+            # banco, levantados antes do COMMIT (escrita() não repassa falhas de depois dele), então nenhum
+            # registro do lote foi gravado e a regravação não duplica nada.
+            resultados = []
+            for item in lote:
+                try:
+                    resultados.append((item, self._gravar([item[0]])[0]))
+                except Exception as erro:
+                    item[1].set_exception(erro)
+                    with self._lock_metricas:
+                        self.falhas += 1
+        with self._lock_metricas:
+            self.lotes += 1
+            self.gravadas += len(resultados)
+            self.ultimo_lote = len(lote)
+            self.maior_lote = max(self.maior_lote, len(lote))
+            self._tempo_lotes += time.perf_counter() - inicio
+        for (_, futuro), avaliacao_id in resultados:
+            futuro.set_result(avaliacao_id)
+
+    def metricas(self) -> MetricasFila:
+        with self._lock_metricas:
+            return {
+                'profundidade_fila': self._fila.qsize(),
+                'lotes': self.lotes,
+                'avaliacoes_gravadas': self.gravadas,
+                'falhas': self.falhas,
+                'tamanho_medio_lote': self.gravadas / self.lotes if self.lotes else 0.0,
+                'maior_lote': self.maior_lote,
+                'ultimo_lote': self.ultimo_lote,
+                'tempo_medio_lote_ms': 1000 * self._tempo_lotes / self.lotes if self.lotes else 0.0,
+            }
+
+
+@_recurso_do_processo
+def obter_fila_avaliacoes():
+    return FilaAvaliacoes(obter_conexoes())
+
+
+# Tempo máximo de espera por uma vaga na fila e pela gravação do lote
+TEMPO_MAXIMO_GRAVACAO = 30
+
+
+@instrumentado
+def adicionar_avaliacao(motorista_id, custo_manutencao, disponibilidade_frota, metas_producao, seguranca_trabalho,
+                        realizacao_checklist, conhecimento_manutencao, comunicacao_assertiva, comentario, avaliador) -> int:
+    registro = (
+        motorista_id, custo_manutencao, disponibilidade_frota, metas_producao, seguranca_trabalho, realizacao_checklist,
+        conhecimento_manutencao, comunicacao_assertiva, comentario, avaliador, datetime.now())
+    futuro = obter_fila_avaliacoes().enviar(registro, timeout=TEMPO_MAXIMO_GRAVACAO)
+    try:
+        return futuro.result(timeout=TEMPO_MAXIMO_GRAVACAO)
+    except concurrent.futures.TimeoutError:
+        # Ainda na fila: cancelado, nunca será gravado e a tela pode dizer isso. Se o lote dele já está sendo
+        # gravado, o resultado sai em instantes (a transação espera no máximo o busy_timeout)
+        if futuro.cancel():
+            raise
+        return futuro.result()
+
+
+# Importação do histórico de avaliações: coluna da planilha -> critério
+COLUNAS_EXCEL_AVALIACOES = {
+    'Custo de Manutenção': 'custo_manutencao',
+    'Disponibilidade de Frota': 'disponibilidade_frota',
+    'Metas de Produção': 'metas_producao',
+    'Segurança do Trabalho': 'seguranca_trabalho',
+    'Realização de Checklist': 'realizacao_checklist',
+    'Conhecimento Básico de Manutenção': 'conhecimento_manutencao',
+    'Comunicação Assertiva': 'comunicacao_assertiva',
+}
+TAMANHO_LOTE_AVALIACOES = 5000
+
+
+def _mapa_motoristas(conn):
+    # Dicionários de resolução montados com uma única consulta. Chaves ambíguas apontam para None.
+    por_nome, por_placa, por_nome_placa = {}, {}, {}
+    for motorista_id, nome, placa in conn.execute('''
+        SELECT m.id, m.nome, v.placa FROM motoristas m LEFT JOIN veiculos v ON m.veiculo_id = v.id
+    '''):
+        nome = nome.strip().casefold()
+        chaves = [(por_nome, nome)]
+        if placa:
+            placa = placa.strip().upper()
+            chaves += [(por_placa, placa), (por_nome_placa, (nome, placa))]
+        for mapa, chave in chaves:
+            mapa[chave] = None if chave in mapa else motorista_id
+    return por_nome, por_placa, por_nome_placa
+
+
+def normalizar_avaliacoes_excel(conn, df_excel, linha_inicial=2):
+    # Resolve motoristas e valida notas e datas de todas as linhas de uma vez.
+    # Retorna (registros prontos para SQL_INSERIR_AVALIACAO, lista de erros "Linha N: motivo").
+    n = len(df_excel)
+    linhas = np.arange(n) + linha_inicial
+    vazio = pd.Series([pd.NA] * n, index=df_excel.index, dtype='string')
+
+    nomes = df_excel['Motorista'].astype('string').str.strip() if 'Motorista' in df_excel else vazio
+    placas = df_excel['Placa'].astype('string').str.strip().str.upper() if 'Placa' in df_excel else vazio
+    nomes = nomes.where(nomes != '')
+    placas = placas.where(placas != '')
+
+    por_nome, por_placa, por_nome_placa = _mapa_motoristas(conn)
+    chave_nome = nomes.str.casefold()
+    ids = pd.Series(
+        [por_nome_placa.get((nome, placa), -1) for nome, placa in zip(chave_nome.fillna(''), placas.fillna(''))],
+        index=df_excel.index, dtype=object
+    )
+    so_nome = nomes.notna() & placas.isna()
+    so_placa = nomes.isna() & placas.notna()
+    ids[so_nome] = chave_nome[so_nome].map(lambda chave: por_nome.get(chave, -1))
+    ids[so_placa] = placas[so_placa].map(lambda chave: por_placa.get(chave, -1))
+    ids[nomes.isna() & placas.isna()] = -1
+    nao_encontrado = (ids == -1).to_numpy(dtype=bool)
+    ambiguo = ids.isna().to_numpy(dtype=bool)
+
+    # Notas: uma única passada em NumPy sobre a matriz n x 7
+    notas = df_excel[list(COLUNAS_EXCEL_AVALIACOES)].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    nota_invalida = ~(np.isfinite(notas) & (notas >= 1) & (notas <= 5) & (notas % 1 == 0)).all(axis=1)
+
+    datas = pd.to_datetime(df_excel['Data'], errors='coerce', dayfirst=True, format='mixed')
+    data_invalida = datas.isna().to_numpy(dtype=bool)
+
+    motivos = np.select(
+        [nao_encontrado, ambiguo, nota_invalida, data_invalida],
+        ['motorista não encontrado', 'motorista ambíguo (informe nome e placa)',
+         'notas devem ser inteiros de 1 a 5', 'data inválida'],
+        default=''
+    )
+    invalidas = motivos != ''
+    erros = [f"Linha {linha}: {motivo}" for linha, motivo in zip(linhas[invalidas], motivos[invalidas])]
+
+    validas = ~invalidas
+    comentarios = (df_excel['Comentário'].astype('string').str.strip() if 'Comentário' in df_excel else vazio)
+    avaliadores = (df_excel['Avaliador'].astype('string').str.strip() if 'Avaliador' in df_excel else vazio)
+    avaliadores = avaliadores.where(avaliadores.notna() & (avaliadores != ''), 'Anônimo')
+
+    registros = list(zip(
+        ids[validas].astype(int).tolist(),
+        *notas[validas].astype(int).T.tolist(),
+        comentarios[validas].astype(object).where(comentarios[validas].notna(), None).tolist(),
+        avaliadores[validas].tolist(),
+        datas[validas].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+    ))
+    return registros, erros
+
+
+@instrumentado
+def importar_avaliacoes_excel(df_excel, tamanho_lote=TAMANHO_LOTE_AVALIACOES,
+                              progresso=None) -> ResultadoImportacaoAvaliacoes:
+    # Insere o histórico em transações por lote; cada lote soma suas próprias linhas aos agregados na
+    # mesma transação, então uma falha no meio (ou o processo morrendo) nunca deixa avaliações gravadas
+    # fora de motorista_stats, dos rollups e do cubo. Os ids de cada lote são contíguos (o escritor é
+    # exclusivo durante a transação), então o refresh soma só a faixa inserida, sem contar avaliações
+    # de outros usuários.
+    with obter_conexoes().leitura() as conn:
+        registros, erros = normalizar_avaliacoes_excel(conn, df_excel)
+
+    for inicio in range(0, len(registros), tamanho_lote):
+        lote = registros[inicio:inicio + tamanho_lote]
+        with obter_conexoes().escrita() as conn:
+            conn.executemany(SQL_INSERIR_AVALIACAO, lote)
+            ultimo_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            _acumular_estatisticas(conn, ultimo_id - len(lote) + 1, ultimo_id)
+            _registrar_alteracao(conn, 'avaliacoes', 'importar')
+        if progresso:
+            progresso(inicio + len(lote), len(registros))
+
+    return {'inseridos': len(registros), 'erros': erros}
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def obter_avaliacoes_motorista(motorista_id) -> pd.DataFrame:
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(SQL_AVALIACOES_MOTORISTA, conn, params=[motorista_id])
+
+
+def _filtros_avaliacoes(motorista_id, data_inicio, data_fim, avaliador, nota_min, nota_max):
+    condicoes, parametros = ['motorista_id = ?'], [motorista_id]
+    if data_inicio is not None:
+        condicoes.append('data_avaliacao >= ?')
+        parametros.append(data_inicio.isoformat())
+    if data_fim is not None:
+        # Datas gravadas como texto ISO: o dia final inteiro fica abaixo do dia seguinte
+        condicoes.append('data_avaliacao < ?')
+        parametros.append((data_fim + timedelta(days=1)).isoformat())
+    if avaliador:
+        condicoes.append('avaliador = ?')
+        parametros.append(avaliador)
+    if nota_min is not None:
+        condicoes.append(f'{MEDIA_AVALIACAO} >= ?')
+        parametros.append(nota_min)
+    if nota_max is not None:
+        condicoes.append(f'{MEDIA_AVALIACAO} <= ?')
+        parametros.append(nota_max)
+    return condicoes, parametros
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def listar_avaliacoes_pagina(motorista_id, apos=None, tamanho=20, data_inicio=None, data_fim=None, avaliador=None,
+                             nota_min=None, nota_max=None) -> Pagina:
+    # Retorna a página e o cursor (data_avaliacao, id) da próxima, ou None quando não há mais linhas
+    condicoes, parametros = _filtros_avaliacoes(motorista_id, data_inicio, data_fim, avaliador, nota_min, nota_max)
+    if apos is not None:
+        condicoes.append('(data_avaliacao, id) < (?, ?)')
+        parametros.extend(apos)
+    sql = SQL_HISTORICO_AVALIACOES.format(filtros=' AND '.join(condicoes))
+    with obter_conexoes().leitura() as conn:
+        pagina = pd.read_sql_query(sql, conn, params=parametros + [tamanho + 1])
+    if len(pagina) <= tamanho:
+        return Pagina(pagina, None)
+    pagina = pagina.iloc[:tamanho]
+    ultima = pagina.iloc[-1]
+    return Pagina(pagina, (ultima['data_avaliacao'], int(ultima['id'])))
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def estimar_avaliacoes(motorista_id, data_inicio=None, data_fim=None, avaliador=None, nota_min=None, nota_max=None,
+                       limite=1000) -> Estimativa:
+    # Retorna (quantidade, exata); sem filtros a contagem vem direto de motorista_stats
+    condicoes, parametros = _filtros_avaliacoes(motorista_id, data_inicio, data_fim, avaliador, nota_min, nota_max)
+    with obter_conexoes().leitura() as conn:
+        if len(condicoes) == 1:
+            linha = conn.execute('SELECT total FROM motorista_stats WHERE motorista_id = ?', (motorista_id,)).fetchone()
+            return Estimativa(linha[0] if linha else 0, True)
+        quantidade = conn.execute(SQL_CONTAR_HISTORICO.format(filtros=' AND '.join(condicoes)),
+                                  parametros + [limite]).fetchone()[0]
+    return Estimativa(quantidade, quantidade < limite)
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def listar_avaliadores_motorista(motorista_id) -> list[str]:
+    with obter_conexoes().leitura() as conn:
+        return [linha[0] for linha in conn.execute(SQL_AVALIADORES_MOTORISTA, (motorista_id,))]
+
+
+def montar_estatisticas(total, somas, ultima_avaliacao) -> Optional[EstatisticasMotorista]:
+    # Converte uma linha agregada (contagem + somas por critério) no dicionário de médias
+    if not total:
+        return None
+
+    medias = [soma / total for soma in somas]
+    stats = {'media_geral': sum(medias) / len(CRITERIOS)}
+    for criterio, media in zip(CRITERIOS, medias):
+        stats[f'media_{criterio}'] = media
+    stats['total_avaliacoes'] = total
+    stats['ultima_avaliacao'] = ultima_avaliacao
+    return stats
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def calcular_estatisticas_motorista(motorista_id) -> Optional[EstatisticasMotorista]:
+    with obter_conexoes().leitura() as conn:
+        linha = conn.execute(SQL_ESTATISTICAS_MOTORISTA, (motorista_id,)).fetchone()
+    if linha is None:
+        return None
+    total, *somas, ultima_avaliacao = linha
+    return montar_estatisticas(total, somas, ultima_avaliacao)
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def obter_dashboard_motorista(motorista_id, ultimas=5) -> PainelMotorista:
+    # Retorna (estatísticas, últimas avaliações); o custo não depende do tamanho do histórico
+    with obter_conexoes().leitura() as conn:
+        dados = pd.read_sql_query(SQL_DASHBOARD_MOTORISTA, conn, params=(motorista_id, ultimas, motorista_id))
+    if dados.empty:
+        return PainelMotorista(None, dados)
+    primeira = dados.iloc[0]
+    # Somas como int do Python: as médias saem float, os mesmos tipos de calcular_estatisticas_motorista
+    stats = montar_estatisticas(int(primeira['total']), [int(primeira[f'soma_{c}']) for c in CRITERIOS],
+                                primeira['ultima_avaliacao'])
+    ultimas_df = dados.loc[dados['id'].notna(), ['id', *CRITERIOS, 'comentario', 'avaliador', 'data_avaliacao']]
+    return PainelMotorista(stats, ultimas_df.reset_index(drop=True))
+
+
+@instrumentado
+@em_cache('avaliacoes', 'motoristas', 'veiculos')
+def obter_resumo_sistema() -> ResumoSistema:
+    with obter_conexoes().leitura() as conn:
+        try:
+            cursor = conn.execute(SQL_RESUMO_SISTEMA)
+        except sqlite3.OperationalError:
+            # Banco ainda sem motorista_stats
+            cursor = conn.execute(SQL_RESUMO_SISTEMA_AVALIACOES)
+        colunas = [descricao[0] for descricao in cursor.description]
+        resumo = dict(zip(colunas, cursor.fetchone()))
+    resumo['media_sistema'] = resumo['media_sistema'] or 0
+    return resumo
+
+
+def _janela_periodos(dias, hoje=None):
+    # Parâmetros de SQL_RANKING_JANELA para os últimos `dias` dias até hoje, inclusive:
+    # dias soltos do início, meses completos e dias do mês corrente
+    hoje = hoje or date.today()
+    inicio = hoje - timedelta(days=dias - 1)
+    primeiro_mes = inicio if inicio.day == 1 else (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+    mes_atual = hoje.replace(day=1)
+    if primeiro_mes >= mes_atual:
+        return (inicio.isoformat(), inicio.isoformat(), '', '', inicio.isoformat(), hoje.isoformat())
+    return (inicio.isoformat(), primeiro_mes.isoformat(), primeiro_mes.isoformat()[:7], mes_atual.isoformat()[:7],
+            mes_atual.isoformat(), hoje.isoformat())
+
+
+def _consulta_ranking(complemento, dias):
+    # Ranking de todo o período (motorista_stats) ou dos últimos `dias` dias (agregados por período)
+    if dias is None:
+        return SQL_RANKING_GERAL + complemento, ()
+    return SQL_RANKING_JANELA + complemento, _janela_periodos(dias)
+
+
+@instrumentado
+@em_cache('avaliacoes', 'motoristas', 'veiculos')
+def obter_ranking_pagina(inicio=0, tamanho=20, dias=None) -> pd.DataFrame:
+    sql, parametros = _consulta_ranking(ORDEM_RANKING_PAGINA, dias)
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(sql, conn, params=parametros + (tamanho, inicio))
+
+
+@instrumentado
+@em_cache('avaliacoes', 'motoristas', 'veiculos')
+def obter_posicao_motorista(motorista_id, dias=None) -> Optional[PosicaoRanking]:
+    sql, parametros = _consulta_ranking(FILTRO_RANKING_POSICAO, dias)
+    with obter_conexoes().leitura() as conn:
+        cursor = conn.execute(sql, parametros + (motorista_id,))
+        linha = cursor.fetchone()
+        if linha is None:
+            return None
+        return dict(zip([descricao[0] for descricao in cursor.description], linha))
+
+
+@instrumentado
+@em_cache('avaliacoes', 'motoristas', 'veiculos')
+def buscar_posicoes_ranking(nome, limite=5, dias=None) -> pd.DataFrame:
+    sql, parametros = _consulta_ranking(FILTRO_RANKING_BUSCA, dias)
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(sql, conn, params=parametros + (_padrao_like(nome.strip()), limite))
+
+
+@instrumentado
+@em_cache('avaliacoes', 'motoristas', 'veiculos')
+def obter_segmentos(dimensoes=('cidade',)) -> pd.DataFrame:
+    # Fatia do cubo: as dimensões pedidas detalhadas e as demais agregadas; () devolve só a frota inteira
+    filtro = ' AND '.join(f"{d} {'<>' if d in dimensoes else '='} ?" for d in DIMENSOES_SEGMENTO)
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(SQL_SEGMENTOS.format(filtro=filtro), conn,
+                                 params=(TODOS_SEGMENTOS,) * len(DIMENSOES_SEGMENTO))
+
+
+@instrumentado
+@em_cache('avaliacoes')
+def obter_tendencia(motorista_id=ID_FROTA, granularidade='mes', desde=None) -> pd.DataFrame:
+    # Série de médias por período a partir dos agregados; desde: date ou None para todo o histórico
+    tabela, periodo = GRANULARIDADES[granularidade]
+    inicio = desde.isoformat()[:len('AAAA-MM') if tabela == 'avaliacoes_mensal' else None] if desde else ''
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(SQL_TENDENCIA.format(tabela=tabela, periodo=periodo), conn,
+                                 params=(motorista_id, inicio))
+
+
+# Motor analítico em memória: as notas das avaliações em uma matriz int8 contígua (avaliações x critérios) e
+# a posição do motorista de cada linha em int32, cerca de 11 bytes por avaliação. As estatísticas são reduções
+# vetorizadas do NumPy sobre essas matrizes. Novas avaliações são anexadas; exclusões forçam uma recarga.
+class MotorAnalitico:
+    def __init__(self, capacidade_inicial=1024, tamanho_lote=50000):
+        self.tamanho_lote = tamanho_lote
+        self._lock = threading.Lock()
+        self._reiniciar(capacidade_inicial)
+
+    def _reiniciar(self, capacidade):
+        self._notas = np.empty((capacidade, len(CRITERIOS)), dtype=np.int8)
+        self._posicoes = np.empty(capacidade, dtype=np.int32)
+        self._n = 0
+        self._ultimo_id = 0
+        self._seq_alteracoes = 0  # último seq do log de alterações visto na sincronização
+        self._indice = {}  # motorista_id -> posição em motorista_ids
+        self.motorista_ids = np.empty(0, dtype=np.int64)
+
+    @property
+    def total(self):
+        return self._n
+
+    @property
+    def bytes_por_avaliacao(self):
+        return self._notas.itemsize * len(CRITERIOS) + self._posicoes.itemsize
+
+    def _anexar(self, linhas):
+        # linhas: matriz (k, 2 + critérios) com id, motorista_id e as notas, em ordem de id
+        k = len(linhas)
+        if self._n + k > len(self._notas):
+            # Dobra a capacidade; visões já entregues continuam válidas sobre as matrizes antigas
+            capacidade = max(self._n + k, 2 * len(self._notas))
+            notas = np.empty((capacidade, len(CRITERIOS)), dtype=np.int8)
+            posicoes = np.empty(capacidade, dtype=np.int32)
+            notas[:self._n] = self._notas[:self._n]
+            posicoes[:self._n] = self._posicoes[:self._n]
+            self._notas, self._posicoes = notas, posicoes
+
+        unicos, inversos = np.unique(linhas[:, 1], return_inverse=True)
+        novos = [m for m in unicos.tolist() if m not in self._indice]
+        if novos:
+            for motorista_id in novos:
+                self._indice[motorista_id] = len(self._indice)
+            self.motorista_ids = np.concatenate([self.motorista_ids, np.array(novos, dtype=np.int64)])
+        mapa = np.array([self._indice[m] for m in unicos.tolist()], dtype=np.int32)
+
+        self._notas[self._n:self._n + k] = linhas[:, 2:]
+        self._posicoes[self._n:self._n + k] = mapa[inversos]
+        self._n += k
+        self._ultimo_id = int(linhas[-1, 0])
+
+    def _carregar(self, conn, apos_id):
+        cursor = conn.execute(f'''
+            SELECT a.id, a.motorista_id, {', '.join(f'a.{c}' for c in CRITERIOS)}
+            FROM avaliacoes a
+            JOIN motoristas m ON m.id = a.motorista_id
+            WHERE a.id > ?
+            ORDER BY a.id
+        ''', (apos_id,))
+        while True:
+            lote = cursor.fetchmany(self.tamanho_lote)
+            if not lote:
+                return
+            self._anexar(np.array(lote, dtype=np.int64))
+
+    def sincronizar(self, gerenciador):
+        with self._lock, gerenciador.leitura() as conn:
+            # Transação de leitura: novas linhas e log de alterações vêm do mesmo instantâneo
+            conn.execute('BEGIN')
+            try:
+                seq_min, seq_max = conn.execute(
+                    'SELECT (SELECT MIN(seq) FROM alteracoes), (SELECT COALESCE(MAX(seq), 0) FROM alteracoes)'
+                ).fetchone()
+                # Avaliações só são removidas com a exclusão do motorista; se o log foi podado além do último
+                # seq visto, não há como saber, e a matriz também é recarregada
+                removidas = (seq_min is not None and self._seq_alteracoes < seq_min - 1) or conn.execute('''
+                    SELECT 1 FROM alteracoes
+                    WHERE seq > ? AND entidade = 'avaliacoes' AND operacao = 'excluir_motorista'
+                    LIMIT 1
+                ''', (self._seq_alteracoes,)).fetchone() is not None
+                if removidas:
+                    self._reiniciar(max(len(self._notas), 1024))
+                self._carregar(conn, self._ultimo_id)
+                self._seq_alteracoes = seq_max
+            finally:
+                conn.execute('COMMIT')
+
+    def _instantaneo(self):
+        with self._lock:
+            return self._notas[:self._n], self._posicoes[:self._n], self.motorista_ids
+
+    def contagens(self):
+        _, posicoes, ids = self._instantaneo()
+        return pd.Series(np.bincount(posicoes, minlength=len(ids)), index=pd.Index(ids, name='motorista_id'))
+
+    def medias_por_motorista(self):
+        notas, posicoes, ids = self._instantaneo()
+        contagens = np.bincount(posicoes, minlength=len(ids))
+        somas = np.column_stack([np.bincount(posicoes, weights=notas[:, j], minlength=len(ids))
+                                 for j in range(len(CRITERIOS))])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            medias = somas / contagens[:, None]
+        return pd.DataFrame(medias, columns=CRITERIOS, index=pd.Index(ids, name='motorista_id'))
+
+    def variancias_por_motorista(self):
+        # Variância populacional por critério: E[x²] - E[x]²
+        notas, posicoes, ids = self._instantaneo()
+        contagens = np.bincount(posicoes, minlength=len(ids))[:, None]
+        colunas = range(len(CRITERIOS))
+        somas = np.column_stack([np.bincount(posicoes, weights=notas[:, j], minlength=len(ids)) for j in colunas])
+        quadrados = np.column_stack([np.bincount(posicoes, weights=notas[:, j].astype(np.int32) ** 2,
+                                                 minlength=len(ids)) for j in colunas])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variancias = quadrados / contagens - (somas / contagens) ** 2
+        return pd.DataFrame(np.maximum(variancias, 0), columns=CRITERIOS, index=pd.Index(ids, name='motorista_id'))
+
+    def _notas_ponderadas(self, notas, pesos):
+        vetor = np.array([pesos.get(c, 0) if pesos else 1 for c in CRITERIOS], dtype=np.float64)
+        if vetor.sum() <= 0:
+            raise ValueError("Informe ao menos um peso positivo")
+        return notas @ (vetor / vetor.sum())
+
+    def percentis_por_motorista(self, percentis=(25, 50, 75), pesos=None):
+        # Percentis da nota geral (ponderada) de cada avaliação, por motorista, com interpolação linear
+        notas, posicoes, ids = self._instantaneo()
+        geral = self._notas_ponderadas(notas, pesos)
+        ordem = np.lexsort((geral, posicoes))
+        ordenadas = geral[ordem]
+        contagens = np.bincount(posicoes, minlength=len(ids))
+        inicios = np.concatenate([[0], np.cumsum(contagens)[:-1]])
+        resultado = {}
+        for p in percentis:
+            alvo = (contagens - 1).clip(min=0) * (p / 100)
+            baixo = np.floor(alvo).astype(np.int64)
+            fracao = alvo - baixo
+            alto = np.minimum(baixo + 1, (contagens - 1).clip(min=0))
+            if len(ordenadas):
+                valores = (ordenadas[inicios + baixo] * (1 - fracao) + ordenadas[inicios + alto] * fracao)
+            else:
+                valores = np.empty(len(ids))
+            resultado[f'p{p}'] = np.where(contagens > 0, valores, np.nan)
+        return pd.DataFrame(resultado, index=pd.Index(ids, name='motorista_id'))
+
+    def correlacoes(self):
+        notas, _, _ = self._instantaneo()
+        if len(notas) < 2:
+            return pd.DataFrame(np.nan, index=CRITERIOS, columns=CRITERIOS)
+        return pd.DataFrame(np.corrcoef(notas, rowvar=False), index=CRITERIOS, columns=CRITERIOS)
+
+    def notas_ponderadas_por_motorista(self, pesos=None):
+        # pesos: critério -> peso (ausentes valem 0); None usa pesos iguais, como a média geral
+        medias = self.medias_por_motorista()
+        return pd.Series(self._notas_ponderadas(medias.to_numpy(), pesos), index=medias.index, name='nota')
+
+
+@_recurso_do_processo
+def obter_motor_analitico():
+    return MotorAnalitico()
+
+
+@instrumentado
+def motor_analitico() -> MotorAnalitico:
+    motor = obter_motor_analitico()
+    motor.sincronizar(obter_conexoes())
+    return motor
+
+
+@instrumentado
+@em_cache('motoristas', 'veiculos')
+def obter_nomes_motoristas(motorista_ids) -> pd.DataFrame:
+    with obter_conexoes().leitura() as conn:
+        return pd.read_sql_query(f'''
+            SELECT m.id AS motorista_id, m.nome, v.placa
+            FROM motoristas m
+            LEFT JOIN veiculos v ON m.veiculo_id = v.id
+            WHERE m.id IN ({', '.join('?' * len(motorista_ids))})
+        ''', conn, params=list(motorista_ids)).set_index('motorista_id')
+
+
+@_recurso_do_processo
+def inicializar_banco() -> RelatorioInicializacao:
+    # Bootstrap do banco, uma vez por processo (e de novo após configurar_banco); as reexecuções do script do
+    # Streamlit só recebem este relatório, sem DDL nem gravações. O esquema é criado e migrado apenas se estiver
+    # atrás de VERSAO_ESQUEMA; o log de alterações é podado aqui, não a cada execução; os agregados da página
+    # inicial vão para o cache antes do primeiro acesso.
+    metricas = obter_metricas()
+    etapas = {}
+
+    @contextmanager
+    def etapa(nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            etapas[nome] = round(1000 * (time.perf_counter() - inicio), 1)
+            metricas.registrar('inicializacao', nome, etapas[nome])
+
+    inicio = time.perf_counter()
+    with etapa('conexao'):
+        # Primeira conexão: PRAGMAs e modo WAL (persistente no arquivo)
+        with obter_conexoes().leitura():
+            pass
+    with etapa('verificacao_esquema'):
+        versao_anterior = ler_versao_esquema()
+    if versao_anterior < VERSAO_ESQUEMA:
+        with etapa('esquema_migracoes'):
+            init_database()
+    else:
+        with etapa('poda_alteracoes'):
+            podar_alteracoes()
+    with etapa('aquecimento'):
+        obter_resumo_sistema()
+        obter_tendencia(ID_FROTA, 'mes')
+
+    relatorio = RelatorioInicializacao(
+        banco=CAMINHO_BANCO, concluida_em=datetime.now().isoformat(timespec='seconds'),
+        versao_anterior=versao_anterior, versao_esquema=VERSAO_ESQUEMA, etapas_ms=etapas,
+        total_ms=round(1000 * (time.perf_counter() - inicio), 1))
+    logger.info("Banco %s inicializado em %.0f ms (esquema v%d -> v%d): %s", CAMINHO_BANCO, relatorio['total_ms'],
+                versao_anterior, VERSAO_ESQUEMA, etapas)
+    return relatorio
+
+
+def configurar_banco(caminho) -> None:
+    # Aponta a camada de dados para outro arquivo; conexões, cache, fila, motor analítico e a inicialização do banco
+    # são refeitos no próximo uso
+    global CAMINHO_BANCO
+    fila, conexoes = obter_fila_avaliacoes.atual(), obter_conexoes.atual()
+    if fila is not None:
+        fila.encerrar()
+    if conexoes is not None:
+        conexoes.fechar()
+    for recurso in (inicializar_banco, obter_fila_avaliacoes, obter_motor_analitico, obter_cache, obter_conexoes):
+        recurso.descartar()
+    CAMINHO_BANCO = caminho
+
+
+# Comandos de manutenção, ex.: `python avaliamotora_dados.py --explicar`
+COMANDOS = {
+    '--explicar': imprimir_planos_consultas,
+    '--verificar-estatisticas': imprimir_verificacao_estatisticas,
+    '--reconstruir-estatisticas': imprimir_reconstrucao_estatisticas,
+}
+
+
+def executar_comando(argv) -> bool:
+    # Executa o primeiro comando de manutenção presente em argv; retorna se algum foi executado
+    for comando, funcao in COMANDOS.items():
+        if comando in argv:
+            funcao()
+            return True
+    return False
+
+
+if __name__ == '__main__':
+    init_database()
+    if not executar_comando(sys.argv):
+        sys.exit(f"uso: python {sys.argv[0]} {{{' | '.join(COMANDOS)}}}")
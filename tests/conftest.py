@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Os módulos ficam na raiz do repositório, sem pacote instalável
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import avaliamotora_dados as dados  # noqa: E402
+
+
+@pytest.fixture
+def banco(tmp_path):
+    # Banco novo por teste; a camada de dados volta ao caminho original ao final
+    original = dados.CAMINHO_BANCO
+    caminho = str(tmp_path / 'motoristas.db')
+    dados.configurar_banco(caminho)
+    dados.init_database()
+    yield caminho
+    dados.configurar_banco(original)
+
+
+@pytest.fixture
+def frota(banco):
+    # Três veículos em segmentos diferentes e quatro motoristas (ids 1 a 4); o 4 começa sem veículo
+    dados.cadastrar_veiculo('AAA-0001', 'Sprinter', 'Van', 'Próprio', 'Belém', 2020)
+    dados.cadastrar_veiculo('AAA-0002', 'Delivery', 'Caminhão', 'Alugado', 'Manaus', 2019)
+    dados.cadastrar_veiculo('AAA-0003', 'Master', 'Van', 'Alugado', 'Belém', 2021)
+    for nome, veiculo_id in [('Ana', 1), ('Bruno', 2), ('Carla', 3), ('Davi', None)]:
+        dados.cadastrar_motorista(nome, veiculo_id)
+    return banco
+
+
+def planilha_avaliacoes(motoristas, nota=3, data='05/03/2024'):
+    df = pd.DataFrame({'Motorista': motoristas, 'Data': data})
+    for coluna in dados.COLUNAS_EXCEL_AVALIACOES:
+        df[coluna] = nota
+    return df
+
+
+def avaliar(motorista_id, nota=3, comentario=''):
+    return dados.adicionar_avaliacao(motorista_id, *[nota] * len(dados.CRITERIOS), comentario, 'Teste')
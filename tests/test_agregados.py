@@ -0,0 +1,101 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import avaliamotora_dados as dados
+from conftest import avaliar, planilha_avaliacoes
+
+
+def segmentos_cidade():
+    segmentos = dados.obter_segmentos(('cidade',))
+    return dict(zip(segmentos['cidade'], segmentos['total']))
+
+
+@pytest.fixture
+def avaliada(frota):
+    dados.importar_avaliacoes_excel(planilha_avaliacoes(['Ana'] * 3 + ['Bruno'] * 2 + ['Carla'] * 4 + ['Davi']))
+    return frota
+
+
+def test_importacao_atualiza_agregados(avaliada):
+    assert dados.verificar_estatisticas() == []
+    assert segmentos_cidade() == {'Belém': 7, 'Manaus': 2, dados.SEM_VEICULO: 1}
+
+
+def test_importacao_interrompida_mantem_lotes_gravados_nos_agregados(frota):
+    def excluir_bruno(feitas, total):
+        # Exclusão concorrente, sem passar pela camada de dados: o lote seguinte falha por chave estrangeira
+        if feitas == 2:
+            with dados.obter_conexoes().escrita() as conn:
+                conn.execute('DELETE FROM motoristas WHERE id = 2')
+
+    with pytest.raises(sqlite3.IntegrityError):
+        dados.importar_avaliacoes_excel(planilha_avaliacoes(['Ana', 'Ana', 'Bruno', 'Ana']), tamanho_lote=2,
+                                        progresso=excluir_bruno)
+
+    assert dados.calcular_estatisticas_motorista(1)['total_avaliacoes'] == 2
+    assert dados.verificar_estatisticas() == []
+
+
+def test_troca_de_veiculo_move_o_motorista_entre_segmentos(avaliada):
+    dados.atualizar_motorista(1, 'Ana', 2)
+    assert segmentos_cidade() == {'Belém': 4, 'Manaus': 5, dados.SEM_VEICULO: 1}
+
+    dados.atualizar_motorista(1, 'Ana', None)
+    dados.atualizar_motorista(4, 'Davi', 3)
+    assert segmentos_cidade() == {'Belém': 5, 'Manaus': 2, dados.SEM_VEICULO: 3}
+    assert dados.verificar_estatisticas() == []
+
+
+def test_troca_so_de_nome_nao_mexe_no_cubo(avaliada):
+    antes = dados.obter_segmentos(tuple(dados.DIMENSOES_SEGMENTO))
+    dados.atualizar_motorista(2, 'Bruno Silva', 2)
+
+    pd.testing.assert_frame_equal(dados.obter_segmentos(tuple(dados.DIMENSOES_SEGMENTO)), antes)
+    assert dados.obter_motorista_por_id(2)[1] == 'Bruno Silva'
+
+
+def test_exclusao_retira_motorista_de_todos_os_agregados(avaliada):
+    dados.excluir_motorista(2)
+
+    assert 'Manaus' not in segmentos_cidade()
+    assert dados.calcular_estatisticas_motorista(2) is None
+    assert dados.verificar_estatisticas() == []
+
+
+def test_atualizacao_de_veiculos_por_planilha_move_segmentos(avaliada):
+    planilha = pd.DataFrame({'Placa': ['AAA-0001', 'AAA-0009'], 'Modelo': 'Sprinter', 'Tipo de veículo': 'Van',
+                             'Próprio ou alugado': 'Próprio', 'Cidade': 'Manaus', 'Ano': 2022})
+    resultado = dados.importar_veiculos_excel(planilha, 'atualizar')
+
+    assert (resultado['inseridos'], resultado['atualizados']) == (1, 1)
+    assert segmentos_cidade() == {'Belém': 4, 'Manaus': 5, dados.SEM_VEICULO: 1}
+    assert dados.verificar_estatisticas() == []
+
+
+def test_fila_e_importacao_juntas_mantem_agregados(avaliada):
+    for motorista_id in (1, 2, 2, 4):
+        avaliar(motorista_id, nota=5)
+    dados.excluir_motorista(3)
+
+    assert dados.verificar_estatisticas() == []
+
+
+def test_painel_e_estatisticas_devolvem_os_mesmos_valores(avaliada):
+    avaliar(1, nota=5)
+    painel = dados.obter_dashboard_motorista(1)
+
+    assert painel[0] == dados.calcular_estatisticas_motorista(1)
+    assert all(type(valor) is float for chave, valor in painel[0].items() if chave.startswith('media_'))
+    assert len(painel[1]) == 4
+
+
+def test_motor_analitico_recarrega_apos_exclusao(avaliada):
+    assert dados.motor_analitico().contagens().to_dict() == {1: 3, 2: 2, 3: 4, 4: 1}
+
+    # Exclusão e chegada de avaliações entre duas sincronizações
+    dados.excluir_motorista(3)
+    dados.importar_avaliacoes_excel(planilha_avaliacoes(['Bruno'] * 4))
+
+    assert dados.motor_analitico().contagens().to_dict() == {1: 3, 2: 6, 4: 1}
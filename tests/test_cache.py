@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+import avaliamotora_dados as dados
+
+
+def alterar_motorista(gerenciador, motorista_id, nome):
+    with gerenciador.escrita() as conn:
+        conn.execute('UPDATE motoristas SET nome = ? WHERE id = ?', (nome, motorista_id))
+        gerenciador.registrar_alteracao(conn, 'motoristas', 'atualizar', motorista_id)
+
+
+def guardar(cache, chave, dependencias, valor):
+    cache.guardar(chave, dependencias, cache.versoes(dependencias), valor)
+
+
+def test_commit_local_invalida_so_as_entidades_alteradas(frota):
+    gerenciador = dados.GerenciadorConexoes(frota)
+    cache = dados.CacheConsultas()
+    gerenciador.ouvintes_commit.append(cache.invalidar)
+    guardar(cache, 'motoristas', ('motoristas',), 'antigo')
+    guardar(cache, 'veiculos', ('veiculos',), 'veiculos')
+
+    alterar_motorista(gerenciador, 1, 'Ana Maria')
+
+    assert cache.obter('motoristas') == (False, None)
+    assert cache.obter('veiculos') == (True, 'veiculos')
+    gerenciador.fechar()
+
+
+def test_alteracao_de_outro_gerenciador_chega_pelo_log(frota):
+    # Dois processos no mesmo banco: cada um com seu gerenciador e seu cache
+    local, remoto = dados.GerenciadorConexoes(frota), dados.GerenciadorConexoes(frota)
+    cache = dados.CacheConsultas(intervalo_sincronizacao=0)
+    local.ouvintes_commit.append(cache.invalidar)
+    cache.sincronizar(local)
+    guardar(cache, 'motoristas', ('motoristas',), 'antigo')
+    guardar(cache, 'veiculos', ('veiculos',), 'veiculos')
+
+    alterar_motorista(remoto, 1, 'Ana Maria')
+    assert cache.obter('motoristas') == (True, 'antigo')
+    cache.sincronizar(local)
+
+    assert cache.obter('motoristas') == (False, None)
+    assert cache.obter('veiculos') == (True, 'veiculos')
+    local.fechar()
+    remoto.fechar()
+
+
+def test_leitura_em_cache_ve_escrita_de_outro_processo(frota):
+    dados.obter_cache().intervalo_sincronizacao = 0
+    assert dados.obter_motorista_por_id(1)[1] == 'Ana'
+
+    remoto = dados.GerenciadorConexoes(frota)
+    alterar_motorista(remoto, 1, 'Ana Maria')
+
+    assert dados.obter_motorista_por_id(1)[1] == 'Ana Maria'
+    remoto.fechar()
+
+
+def test_log_podado_alem_do_visto_invalida_tudo(frota):
+    local, remoto = dados.GerenciadorConexoes(frota), dados.GerenciadorConexoes(frota)
+    cache = dados.CacheConsultas(intervalo_sincronizacao=0)
+    cache.sincronizar(local)
+    guardar(cache, 'veiculos', ('veiculos',), 'veiculos')
+
+    alterar_motorista(remoto, 1, 'Ana Maria')
+    alterar_motorista(remoto, 1, 'Ana')
+    with remoto.escrita() as conn:
+        conn.execute('DELETE FROM alteracoes WHERE seq < (SELECT MAX(seq) FROM alteracoes)')
+    cache.sincronizar(local)
+
+    assert cache.obter('veiculos') == (False, None)
+    local.fechar()
+    remoto.fechar()
+
+
+def test_falha_de_ouvinte_nao_chega_a_quem_gravou(frota):
+    gerenciador = dados.GerenciadorConexoes(frota)
+    chamados = []
+    gerenciador.ouvintes_commit.append(lambda entidades: 1 / 0)
+    gerenciador.ouvintes_commit.append(chamados.append)
+
+    alterar_motorista(gerenciador, 1, 'Ana Maria')
+
+    assert chamados == [{'motoristas'}]
+    gerenciador.fechar()
+
+
+def test_pool_de_leitores_esgotado_levanta_erro(frota):
+    gerenciador = dados.GerenciadorConexoes(frota, max_leitores=1, espera_leitor_s=0.05)
+    with gerenciador.leitura():
+        with pytest.raises(sqlite3.OperationalError, match='esgotado'):
+            with gerenciador.leitura():
+                pass
+    with gerenciador.leitura() as conn:
+        assert conn.execute('SELECT 1').fetchone() == (1,)
+    gerenciador.fechar()
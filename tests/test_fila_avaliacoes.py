@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import avaliamotora_dados as dados
+from conftest import avaliar
+
+
+def contar(caminho, sql):
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute(sql).fetchone()[0]
+
+
+def registro(motorista_id):
+    return (motorista_id, *[3] * len(dados.CRITERIOS), '', 'Teste', datetime.now())
+
+
+def esperar_escritor_ocupado(fila):
+    # O escritor retirou o envio da fila e está parado na trava de escrita
+    while not fila._fila.empty():
+        time.sleep(0.001)
+    time.sleep(0.05)
+
+
+def test_envio_gravado_e_agregado(frota):
+    avaliacao_id = avaliar(1, nota=4)
+
+    assert contar(frota, 'SELECT COUNT(*) FROM avaliacoes') == 1
+    assert avaliacao_id == 1
+    assert dados.calcular_estatisticas_motorista(1)['media_geral'] == 4
+    assert dados.verificar_estatisticas() == []
+
+
+def test_envio_invalido_repassa_erro(frota):
+    with pytest.raises(sqlite3.IntegrityError):
+        avaliar(99)
+
+    assert contar(frota, 'SELECT COUNT(*) FROM avaliacoes') == 0
+    assert dados.obter_fila_avaliacoes().metricas()['falhas'] == 1
+
+
+def test_lote_com_envio_invalido_grava_os_demais(frota):
+    fila = dados.obter_fila_avaliacoes()
+
+    with dados.obter_conexoes().escrita():
+        primeiro = fila.enviar(registro(1))
+        esperar_escritor_ocupado(fila)
+        # Chegam enquanto o primeiro é gravado: formam o próximo lote, que falha inteiro e é regravado um a um
+        invalido, valido = fila.enviar(registro(99)), fila.enviar(registro(2))
+
+    assert primeiro.result(timeout=5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        invalido.result(timeout=5)
+    assert valido.result(timeout=5) == 2
+    metricas = fila.metricas()
+    assert (metricas['lotes'], metricas['maior_lote'], metricas['falhas']) == (2, 2, 1)
+    assert dados.verificar_estatisticas() == []
+
+
+def test_falha_de_ouvinte_apos_commit_nao_duplica(frota):
+    falhas = []
+
+    def ouvinte(entidades):
+        if not falhas:
+            falhas.append(entidades)
+            raise RuntimeError('ouvinte quebrado')
+
+    dados.obter_conexoes().ouvintes_commit.append(ouvinte)
+    assert avaliar(1) == 1
+
+    assert falhas
+    assert contar(frota, 'SELECT COUNT(*) FROM avaliacoes') == 1
+    assert contar(frota, 'SELECT total FROM motorista_stats WHERE motorista_id = 1') == 1
+
+
+def test_envio_expirado_e_cancelado(frota, monkeypatch):
+    monkeypatch.setattr(dados, 'TEMPO_MAXIMO_GRAVACAO', 0.2)
+    fila = dados.obter_fila_avaliacoes()
+    resultados = {}
+    em_andamento = threading.Thread(target=lambda: resultados.setdefault('primeiro', avaliar(1, comentario='A')))
+
+    with dados.obter_conexoes().escrita():
+        em_andamento.start()
+        esperar_escritor_ocupado(fila)
+        # Fica na fila atrás do lote travado: expira, é cancelado e nunca é gravado
+        with pytest.raises(TimeoutError):
+            avaliar(2, comentario='B')
+    em_andamento.join(timeout=5)
+    fila.encerrar()
+
+    assert resultados['primeiro'] == 1
+    with sqlite3.connect(frota) as conn:
+        assert conn.execute('SELECT comentario FROM avaliacoes').fetchall() == [('A',)]
+
+
+def test_escritor_sobrevive_a_erro_inesperado(frota, monkeypatch):
+    fila = dados.obter_fila_avaliacoes()
+    gravar = fila._gravar
+
+    def gravar_com_erro(registros):
+        monkeypatch.setattr(fila, '_gravar', gravar)
+        raise RuntimeError('erro inesperado')
+
+    monkeypatch.setattr(fila, '_gravar', gravar_com_erro)
+    with pytest.raises(RuntimeError):
+        avaliar(1)
+
+    assert fila._thread.is_alive()
+    assert avaliar(1) == 1
+    assert fila.metricas()['falhas'] == 1